@@ -1 +1 @@
-all = [ 'data_source', 'available' ]
+all = [ 'data_source', 'available', 'catalog', 'avail_index' ]
@@ -0,0 +1,231 @@
+''' On-disk Index of the Remote Availability Listings '''
+import os, json, time
+import threading
+from datetime import datetime, timedelta
+
+__all__ = ['AvailabilityIndex', 'getIndex']
+
+INDEX_FILE = os.path.join(os.path.expanduser("~"), ".sharppy", "cache", "availability.json")
+
+## Station listings fetched this long after their cycle are taken as
+## complete and never fetched again
+FINAL_AGE = timedelta(hours=12)
+
+## Listings of cycles older than this are dropped from the index
+MAX_AGE = timedelta(days=30)
+
+_DT_FMT = "%Y%m%d%H%M"
+
+class _FileLock(object):
+    '''
+        An exclusive lock on a file, held by other processes (and other
+        threads of this one) for as long as the with block runs.
+    '''
+    _thread_lock = threading.Lock()
+
+    def __init__(self, path):
+        self._path = path
+
+    def __enter__(self):
+        _FileLock._thread_lock.acquire()
+        try:
+            self._file = open(self._path, 'a')
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        except:
+            _FileLock._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+        finally:
+            _FileLock._thread_lock.release()
+
+def _encode(key):
+    '''
+        Turns a ('times', ds_name, outlet_name) or ('stations', ds_name,
+        outlet_name, cycle) key into the name of its entry, or None for the
+        keys that aren't kept on disk.
+    '''
+    if key[0] == 'times' and len(key) == 3:
+        return "times|%s|%s" % key[1:]
+    if key[0] == 'stations' and len(key) == 4 and isinstance(key[3], datetime):
+        return "stations|%s|%s|%s" % (key[1], key[2], key[3].strftime(_DT_FMT))
+    return None
+
+def _cycle(name):
+    if name.startswith('stations|'):
+        return datetime.strptime(name.rsplit('|', 1)[1], _DT_FMT)
+    return None
+
+class AvailabilityIndex(object):
+    '''
+        A small on-disk index of the availability listings (the cycles each
+        outlet has and the stations it has at each cycle), shared between
+        processes. Every read-modify-write of the file happens under a file
+        lock, and the file is replaced atomically, so readers never see a
+        partial write.
+
+        Refreshes are merged into what's stored: new cycles are appended to
+        the cycle lists (keeping stored cycles inside the window of the new
+        listing) and new stations are added to the station sets. Station
+        sets fetched more than FINAL_AGE after their cycle are final.
+
+        Parameters
+        ----------
+        path : string (default: ~/.sharppy/cache/availability.json)
+        The index file
+    '''
+    def __init__(self, path=INDEX_FILE):
+        self._path = path
+        self._data = {}
+        self._stamp = None
+
+    def _read(self, force=False):
+        '''
+            Returns the contents of the index, only parsing the file again
+            if it changed since it was last read (or if force is set). The
+            file is taken as changed when its mtime, size or inode differ,
+            since the mtime alone can miss writes made within the same
+            second on coarse-grained filesystems.
+        '''
+        try:
+            st = os.stat(self._path)
+        except OSError:
+            return {}
+        stamp = (st.st_mtime, st.st_size, st.st_ino)
+        if force or stamp != self._stamp:
+            try:
+                index_file = open(self._path, 'r')
+                self._data = json.load(index_file)
+                index_file.close()
+            except (IOError, ValueError):
+                self._data = {}
+            self._stamp = stamp
+        return self._data
+
+    def _write(self, data):
+        tmp_name = self._path + ".tmp"
+        index_file = open(tmp_name, 'w')
+        json.dump(data, index_file)
+        index_file.close()
+        if os.name == 'nt' and os.path.exists(self._path):
+            os.remove(self._path)
+        os.rename(tmp_name, self._path)
+
+    def _lock(self):
+        dirname = os.path.dirname(self._path)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        return _FileLock(self._path + ".lock")
+
+    def load(self, key):
+        '''
+            Looks up a listing.
+
+            Returns
+            -------
+            entry : tuple or None
+            The time the listing was fetched (s since the epoch), the
+            listing and whether it's final, or None if the index doesn't
+            have it (or doesn't keep that kind of listing).
+        '''
+        name = _encode(key)
+        if name is None:
+            return None
+        try:
+            with self._lock():
+                entry = self._read().get(name, None)
+        except (IOError, OSError):
+            return None
+        if entry is None:
+            return None
+        return entry['fetched'], self._decode(name, entry['value']), entry.get('final', False)
+
+    def store(self, key, value):
+        '''
+            Merges a freshly fetched listing into the index.
+
+            Returns
+            -------
+            The merged listing (or the listing itself if the index doesn't
+            keep that kind of listing or can't be written)
+        '''
+        name = _encode(key)
+        if name is None:
+            return value
+
+        now = time.time()
+        try:
+            with self._lock():
+                ## Another process may have written the file since it was
+                ## last read, so never merge into the copy in memory
+                data = dict(self._read(force=True))
+                entry = data.get(name, None)
+                if entry is not None:
+                    value = self._merge(name, self._decode(name, entry['value']), value)
+
+                final = False
+                cycle = _cycle(name)
+                if cycle is not None:
+                    final = datetime.utcfromtimestamp(now) - cycle >= FINAL_AGE
+
+                data[name] = {'fetched':now, 'value':self._serialize(name, value), 'final':final}
+
+                ## Drop the station listings of old cycles
+                oldest = datetime.utcfromtimestamp(now) - MAX_AGE
+                for nm in data.keys():
+                    cyc = _cycle(nm)
+                    if cyc is not None and cyc < oldest:
+                        del data[nm]
+
+                self._write(data)
+                self._data = data
+                st = os.stat(self._path)
+                self._stamp = (st.st_mtime, st.st_size, st.st_ino)
+        except (IOError, OSError):
+            pass
+        return value
+
+    def _merge(self, name, old, new):
+        if name.startswith('times|'):
+            if len(new) == 0:
+                return new
+            start = min(new)
+            return sorted(set(new) | set( c for c in old if c >= start ))
+        return frozenset(old) | frozenset(new)
+
+    def _serialize(self, name, value):
+        if name.startswith('times|'):
+            return [ dt.strftime(_DT_FMT) for dt in value ]
+        return sorted(value)
+
+    def _decode(self, name, value):
+        if name.startswith('times|'):
+            return [ datetime.strptime(dt, _DT_FMT) for dt in value ]
+        return frozenset( str(stn) for stn in value )
+
+_index = None
+
+def getIndex():
+    '''
+        Returns the process-wide availability index.
+    '''
+    global _index
+    if _index is None:
+        _index = AvailabilityIndex()
+    return _index
@@ -0,0 +1,238 @@
+''' Compiled Catalog of the Data Source Stations '''
+import numpy as np
+import os, glob, json
+import hashlib
+import time
+import uuid
+
+__all__ = ['StationCatalog', 'getCatalog']
+
+CATALOG_DIR = os.path.join(os.path.expanduser("~"), ".sharppy", "cache", "catalog")
+CATALOG_VERSION = 2
+
+## Types of the CSV columns that aren't strings
+FLOAT_FIELDS = [ 'lat', 'lon' ]
+INT_FIELDS = [ 'elev' ]
+
+def _readCSV(csv_file_name):
+    csv_file = open(csv_file_name, 'r')
+    fields = [ f.lower() for f in csv_file.readline().strip().split(',') ]
+    rows = [ line.strip().split(',') for line in csv_file ]
+    csv_file.close()
+    return fields, rows
+
+def _column(rows, idx):
+    return [ row[idx] if idx < len(row) else "" for row in rows ]
+
+def _compile(csv_file_name, fields):
+    '''
+        Reads a station CSV into the columns of the catalog (a dictionary of
+        arrays), converting the numeric columns. Raises a ValueError if a
+        numeric column doesn't convert.
+    '''
+    csv_fields, rows = _readCSV(csv_file_name)
+    cols = {}
+    for field in fields:
+        if field not in csv_fields:
+            col = [ "" ] * len(rows)
+        else:
+            col = _column(rows, csv_fields.index(field))
+
+        if field in FLOAT_FIELDS:
+            cols[field] = np.array([ float(v) for v in col ], dtype=np.float64)
+        elif field in INT_FIELDS:
+            cols[field] = np.array([ int(v) for v in col ], dtype=np.int32)
+        else:
+            cols[field] = np.array(col, dtype=str)
+    return csv_fields, cols
+
+class StationCatalog(object):
+    '''
+        The stations of every CSV in a data source directory, compiled into
+        a single record array on disk. The file is memory-mapped when it's
+        loaded and is only rebuilt when an XML or CSV file in the directory
+        is added, removed or modified.
+
+        Each data source directory gets its own catalog, named after a hash
+        of the directory. The catalog is made of two files: a .npy file
+        holding the records of all the CSVs one after the other, and a
+        .json file holding the name of the .npy file, the rows and fields
+        of each CSV, the modification times of the source files and the
+        errors of the CSVs that couldn't be compiled. Every build writes a
+        new .npy file, which is only used once the .json naming it is
+        swapped in, so a reader never pairs the records of one build with
+        the rows of another.
+
+        Parameters
+        ----------
+        ds_dir : string
+        The data source directory
+        catalog_dir : string (default: ~/.sharppy/cache/catalog)
+        The directory the catalog is written to
+    '''
+    def __init__(self, ds_dir, catalog_dir=CATALOG_DIR):
+        self._ds_dir = ds_dir
+        self._catalog_dir = catalog_dir
+        self._path = os.path.join(catalog_dir, "stations-%s" % hashlib.md5(ds_dir).hexdigest()[:12])
+        self._records = None
+        self._meta = None
+
+    def _sources(self):
+        files = glob.glob(os.path.join(self._ds_dir, '*.xml')) + glob.glob(os.path.join(self._ds_dir, '*.csv'))
+        return dict( (os.path.basename(f), os.path.getmtime(f)) for f in files )
+
+    def _load(self):
+        if self._meta is not None:
+            return
+
+        sources = self._sources()
+        try:
+            meta_file = open(self._path + ".json", 'r')
+            meta = json.load(meta_file)
+            meta_file.close()
+            if meta['version'] == CATALOG_VERSION and meta['ds_dir'] == self._ds_dir and meta['sources'] == sources:
+                self._records = np.load(os.path.join(self._catalog_dir, meta['records']), mmap_mode='r')
+                self._meta = meta
+                return
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+        self._build(sources)
+
+    def _build(self, sources):
+        '''
+            Compiles every CSV in the data source directory and writes the
+            catalog.
+        '''
+        csv_names = sorted( f for f in sources if f.endswith('.csv') )
+        all_fields = []
+        for csv_name in csv_names:
+            for field in _readCSV(os.path.join(self._ds_dir, csv_name))[0]:
+                if field not in all_fields:
+                    all_fields.append(field)
+
+        meta = {'version':CATALOG_VERSION, 'ds_dir':self._ds_dir, 'sources':sources, 'csvs':{}, 'errors':{}}
+        parts = []
+        start = 0
+        for csv_name in csv_names:
+            try:
+                csv_fields, cols = _compile(os.path.join(self._ds_dir, csv_name), all_fields)
+            except ValueError as exc:
+                meta['errors'][csv_name] = str(exc)
+                continue
+
+            nrows = len(cols[all_fields[0]]) if all_fields else 0
+            meta['csvs'][csv_name] = {'start':start, 'stop':start + nrows, 'fields':csv_fields}
+            parts.append(cols)
+            start += nrows
+
+        ## String columns get the width of their longest value across all
+        ## of the CSVs
+        dtype = []
+        for field in all_fields:
+            if field in FLOAT_FIELDS:
+                dtype.append((field, np.float64))
+            elif field in INT_FIELDS:
+                dtype.append((field, np.int32))
+            else:
+                width = max([ p[field].dtype.itemsize for p in parts ] + [ 1 ])
+                dtype.append((field, 'S%d' % width))
+
+        records = np.empty(start, dtype=dtype)
+        offset = 0
+        for cols in parts:
+            nrows = len(cols[all_fields[0]])
+            for field in all_fields:
+                records[field][offset:offset + nrows] = cols[field]
+            offset += nrows
+
+        ## Names no other writer (thread or process) can be using
+        stamp = uuid.uuid4().hex
+        records_name = "%s.%s.npy" % (os.path.basename(self._path), stamp)
+        records_path = os.path.join(self._catalog_dir, records_name)
+        tmp_records = "%s.%s.tmp.npy" % (self._path, stamp)
+        tmp_meta = "%s.%s.tmp" % (self._path, stamp)
+        meta['records'] = records_name
+
+        try:
+            if not os.path.exists(self._catalog_dir):
+                os.makedirs(self._catalog_dir)
+
+            np.save(tmp_records, records)
+            os.rename(tmp_records, records_path)
+            meta_file = open(tmp_meta, 'w')
+            json.dump(meta, meta_file)
+            meta_file.close()
+            if os.name == 'nt' and os.path.exists(self._path + ".json"):
+                os.remove(self._path + ".json")
+            os.rename(tmp_meta, self._path + ".json")
+
+            records = np.load(records_path, mmap_mode='r')
+        except (IOError, OSError):
+            ## Keep the catalog in memory if it can't be written
+            self._remove(tmp_records, tmp_meta, records_path)
+        else:
+            self._clean(records_name)
+
+        self._records = records
+        self._meta = meta
+
+    def _remove(self, *names):
+        for name in names:
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+    def _clean(self, records_name):
+        '''
+            Removes the .npy files of earlier builds of this catalog. Files
+            younger than a minute are left alone, since another process
+            may have just written them (or may still be loading them).
+        '''
+        now = time.time()
+        for npy in glob.glob(self._path + ".*.npy"):
+            if os.path.basename(npy) == records_name:
+                continue
+            try:
+                if now - os.path.getmtime(npy) > 60:
+                    os.remove(npy)
+            except OSError:
+                pass
+
+    def check(self, csv_name):
+        '''
+            Raises a ValueError if a CSV isn't in the catalog (because it
+            doesn't exist or couldn't be compiled).
+        '''
+        self._load()
+        if csv_name in self._meta['csvs']:
+            return
+        if csv_name in self._meta['errors']:
+            raise ValueError("Unable to compile %s: %s" % (csv_name, self._meta['errors'][csv_name]))
+        raise ValueError("No station file named %s" % csv_name)
+
+    def get(self, csv_name):
+        '''
+            Returns the stations of a CSV.
+
+            Returns
+            -------
+            records : record array
+            The stations (a view of the memory-mapped catalog)
+            fields : list
+            The fields of the CSV, in the order of its header
+        '''
+        self.check(csv_name)
+        info = self._meta['csvs'][csv_name]
+        return self._records[info['start']:info['stop']], [ str(f) for f in info['fields'] ]
+
+_catalogs = {}
+
+def getCatalog(ds_dir):
+    '''
+        Returns the process-wide catalog of a data source directory.
+    '''
+    if ds_dir not in _catalogs:
+        _catalogs[ds_dir] = StationCatalog(ds_dir)
+    return _catalogs[ds_dir]
@@ -6,9 +6,15 @@ import urllib, urllib2
 import urlparse
 import platform, subprocess, re
 import imp
+import inspect, functools
+import threading, time
+import socket
+import Queue
 
 import sharppy.io.decoder as decoder
 import utils.frozenutils as frozenutils
+import catalog
+import avail_index
 
 HOME_DIR = os.path.join(os.path.expanduser("~"), ".sharppy", "datasources")
 
@@ -30,8 +36,12 @@ def loadDataSources(ds_dir=HOME_DIR):
         files = glob.glob(os.path.join(frozen_path, 'sharppy', 'datasources', '*.xml')) +  \
                 glob.glob(os.path.join(frozen_path, 'sharppy', 'datasources', '*.csv'))
 
+        ## Only copy the files that changed since the last start, so the
+        ## station catalog isn't rebuilt every time
         for file_name in files:
-            shutil.copy(file_name, ds_dir)
+            dest = os.path.join(ds_dir, os.path.basename(file_name))
+            if not os.path.exists(dest) or os.path.getmtime(dest) < os.path.getmtime(file_name):
+                shutil.copy2(file_name, ds_dir)
 
     files = glob.glob(os.path.join(ds_dir, '*.xml'))
     ds = {}
@@ -40,52 +50,399 @@ def loadDataSources(ds_dir=HOME_DIR):
         for src in root:
             name = src.get('name')
             try:
-                ds[name] = DataSource(src)
+                ds[name] = DataSource(src, ds_dir=ds_dir)
             except:
                 print('Unable to process %s file'%os.path.basename(ds_file))
 
     return ds
 
+## Defaults of the concurrent URL health checks: the number of hosts
+## probed at once, the timeout (s) of each probe, how long (s) pingURLs
+## waits for all of them, and how long (s) a result is kept
+PING_WORKERS = 8
+PING_TIMEOUT = 1
+PING_DEADLINE = 3
+PING_TTL = 300
+
 def _pingURL(hostname, timeout=1):
     try:
         urllib2.urlopen(hostname, timeout=timeout)
-    except urllib2.URLError:
+    except (urllib2.URLError, socket.error):
         return False
 
     return True
 
-def pingURLs(ds_dict):
+def _baseURL(url):
+    urlp = urlparse.urlparse(url)
+    return urlparse.urlunsplit((urlp.scheme, urlp.netloc, '', '', ''))
+
+def pingURLs(ds_dict, workers=PING_WORKERS, timeout=PING_TIMEOUT, deadline=PING_DEADLINE, ttl=PING_TTL):
+    '''
+        Checks whether the hosts of the data sources are reachable. The
+        hosts are probed concurrently by a pool of worker threads, and
+        the results go in the availability cache, where Outlet.isAvailable
+        finds them.
+
+        Parameters
+        ----------
+        ds_dict : dictionary
+            The data sources (see loadDataSources)
+        workers : int (default: 8)
+            The number of hosts probed at once
+        timeout : number (default: 1)
+            The timeout (s) of each probe
+        deadline : number (default: 3)
+            How long (s) to wait for all of the probes. Probes still running
+            then are reported as unreachable, but keep running in the
+            background and cache their results when they finish.
+        ttl : number (default: 300)
+            How long (s) the results are cached
+
+        Returns
+        -------
+        urls : dictionary
+            Whether each host (scheme://netloc) is reachable
+    '''
     urls = {}
 
     for ds in ds_dict.values():
         ds_urls = ds.getURLList()
         for url in ds_urls:
-            urlp = urlparse.urlparse(url)
-            base_url = urlparse.urlunsplit((urlp.scheme, urlp.netloc, '', '', ''))
-            urls[base_url] = None
+            urls[_baseURL(url)] = None
 
+    cache = getAvailabilityCache()
+    jobs = Queue.Queue()
     for url in urls.iterkeys():
-        urls[url] = _pingURL(url)
-    return urls
+        jobs.put(url)
+
+    lock = threading.Lock()
+    finished = threading.Event()
+    remaining = [ len(urls) ]
+
+    def worker():
+        while True:
+            try:
+                url = jobs.get_nowait()
+            except Queue.Empty:
+                return
+
+            try:
+                status = cache.get(('ping', url), lambda: _pingURL(url, timeout=timeout), ttl=ttl)
+            except Exception:
+                status = False
+            with lock:
+                urls[url] = status
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    finished.set()
+
+    if len(urls) == 0:
+        return urls
+
+    for idx in xrange(min(workers, len(urls))):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    finished.wait(deadline)
+    with lock:
+        return dict( (url, status is True) for url, status in urls.iteritems() )
+
+## How long (s) the remote listings of available cycles and stations are
+## kept when the outlet doesn't set its own (ttl attribute of its time
+## element, in minutes)
+AVAIL_TTL = 300
+
+## How long (s) to wait on the network for a listing that's stale in the
+## on-disk index before using the stale copy, and how long (s) that copy
+## is used before the listing is tried again
+STALE_WAIT = 2
+STALE_RETRY = 60
+
+class _Flight(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class AvailabilityCache(object):
+    '''
+        A cache of the remote availability listings (the cycles an outlet
+        has and the stations it has at a cycle) and of the host health
+        checks (see pingURLs), shared by all of the data sources. Entries
+        expire after the TTL they were stored with. When several threads
+        ask for the same listing at once, only one of them goes to the
+        network and the others wait for its result. Failed listings aren't
+        cached.
+
+        The listings are also kept in an on-disk index shared with other
+        processes (see avail_index), so a new process starts from the
+        listings fetched by the ones before it. When the index only has a
+        stale copy of a listing, the network is waited on for stale_wait
+        seconds; if it's slower than that (or fails), the stale copy is
+        used while the refresh finishes in the background.
+
+        Parameters
+        ----------
+        ttl : number (default: 300)
+        The number of seconds entries are kept when no TTL is given
+        index : AvailabilityIndex (optional)
+        The on-disk index of the listings (none if not given)
+        stale_wait : number (default: 2)
+        The number of seconds to wait for a stale listing to refresh
+
+        Attributes
+        ----------
+        hits : int
+        Lookups answered from memory
+        disk_hits : int
+        Lookups answered from the on-disk index
+        stale : int
+        Lookups answered with a stale copy from the on-disk index
+        misses : int
+        Lookups that went to the network
+        shared : int
+        Lookups that waited for the same listing requested by another thread
+    '''
+    def __init__(self, ttl=AVAIL_TTL, index=None, stale_wait=STALE_WAIT):
+        self._ttl = ttl
+        self._index = index
+        self._stale_wait = stale_wait
+        self._entries = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.shared = 0
+
+    def get(self, key, fetch, ttl=None):
+        '''
+            Looks up a listing, calling fetch() to get it if it isn't cached
+            or has expired.
+
+            Parameters
+            ----------
+            key : tuple
+            The listing, e.g. ('times', ds_name, outlet_name) or
+            ('stations', ds_name, outlet_name, cycle)
+            fetch : function
+            Gets the listing from the network
+            ttl : number (optional)
+            The number of seconds to keep the listing
+
+            Returns
+            -------
+            The listing
+        '''
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None and entry[0] > time.time():
+                self.hits += 1
+                return entry[1]
+
+            flight = self._pending.get(key, None)
+            leader = flight is None
+            if leader:
+                flight = self._pending[key] = _Flight()
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        if ttl is None:
+            ttl = self._ttl
+        try:
+            flight.value, expires, is_stale = self._load(key, fetch, ttl)
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._setEntry(key, expires, flight.value, is_stale)
+                del self._pending[key]
+            flight.done.set()
+        return flight.value
+
+    def _setEntry(self, key, expires, value, is_stale):
+        ## A stale copy never replaces a fresh listing (e.g. one stored by a
+        ## background refresh that finished first). Call with the lock held.
+        entry = self._entries.get(key, None)
+        if is_stale and entry is not None and not entry[2] and entry[0] > time.time():
+            return
+        self._entries[key] = (expires, value, is_stale)
+
+    def _fetch(self, key, fetch):
+        with self._lock:
+            self.misses += 1
+        value = fetch()
+        if self._index is not None:
+            value = self._index.store(key, value)
+        return value
+
+    def _load(self, key, fetch, ttl):
+        '''
+            Gets a listing that isn't in memory, from the on-disk index if
+            it's fresh (or final) there and from the network otherwise.
+
+            Returns
+            -------
+            value : the listing
+            expires : the time to keep it in memory until
+            is_stale : whether it's a stale copy
+        '''
+        stored = self._index.load(key) if self._index is not None else None
+        if stored is None:
+            return self._fetch(key, fetch), time.time() + ttl, False
+
+        fetched, stored_value, final = stored
+        now = time.time()
+        if final or now - fetched < ttl:
+            with self._lock:
+                self.disk_hits += 1
+            return stored_value, (now + ttl if final else fetched + ttl), False
+
+        ## Stale while revalidate: give the network stale_wait seconds,
+        ## then let the refresh land in the background
+        result = {}
+        done = threading.Event()
+
+        def refresh():
+            try:
+                result['value'] = self._fetch(key, fetch)
+            except Exception as exc:
+                result['error'] = exc
+            else:
+                with self._lock:
+                    self._setEntry(key, time.time() + ttl, result['value'], False)
+            done.set()
+
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+
+        done.wait(self._stale_wait)
+        if 'value' in result:
+            return result['value'], time.time() + ttl, False
+
+        with self._lock:
+            self.stale += 1
+        return stored_value, time.time() + min(ttl, STALE_RETRY), True
+
+    def peek(self, key):
+        '''
+            Returns a listing if it's cached and hasn't expired, or None,
+            without ever going to the network.
+        '''
+        with self._lock:
+            entry = self._entries.get(key, None)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+        return None
+
+    def invalidate(self, *prefix):
+        '''
+            Drops the entries whose keys start with the given values (e.g.
+            'stations', 'Observed'), or every entry if none are given.
+        '''
+        with self._lock:
+            for key in self._entries.keys():
+                if key[:len(prefix)] == prefix:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.hits = 0
+        self.disk_hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.shared = 0
+
+    def stats(self):
+        '''
+            Returns the number of hits (from memory and from disk), stale
+            answers, misses, shared lookups and cached listings.
+        '''
+        return {'hits':self.hits, 'disk_hits':self.disk_hits, 'stale':self.stale, 'misses':self.misses,
+            'shared':self.shared, 'size':len(self._entries)}
+
+_avail_cache = None
+
+def getAvailabilityCache():
+    '''
+        Returns the process-wide availability cache.
+    '''
+    global _avail_cache
+    if _avail_cache is None:
+        _avail_cache = AvailabilityCache(index=avail_index.getIndex())
+    return _avail_cache
 
 class Outlet(object):
-    def __init__(self, ds_name, config):
+    def __init__(self, ds_name, config, ds_dir=HOME_DIR):
         self._ds_name = ds_name
         self._name = config.get('name')
         self._url = config.get('url')
         self._format = config.get('format')
         self._time = config.find('time')
         point_csv = config.find('points')
-        self._points = self._loadCSV(os.path.join(HOME_DIR, point_csv.get("csv")))
 
-        for idx in xrange(len(self._points)):
-            self._points[idx]['lat'] = float(self._points[idx]['lat'])
-            self._points[idx]['lon'] = float(self._points[idx]['lon'])
-            self._points[idx]['elev'] = int(self._points[idx]['elev'])
+        ## The stations come from the compiled catalog as a record array;
+        ## the point dictionaries and the indexes are only made when
+        ## they're first needed.
+        self._records, self._csv_fields = catalog.getCatalog(ds_dir).get(point_csv.get("csv"))
+        self._points = None
+        self._indexes = None
 
         self._custom_avail = self._name.lower() in available.available and self._ds_name.lower() in available.available[self._name.lower()]
+        self._custom_avail_at = self._name.lower() in available.availableat and self._ds_name.lower() in available.availableat[self._name.lower()]
         self._is_available = True
 
+        ttl = self._time.get('ttl')
+        self._avail_ttl = float(ttl) * 60 if ttl is not None else None
+
+    def _listTimes(self):
+        '''
+            Gets the available cycles from the remote listing (through the
+            availability cache).
+        '''
+        func = available.available[self._name.lower()][self._ds_name.lower()]
+        return getAvailabilityCache().get(('times', self._ds_name, self._name), func, ttl=self._avail_ttl)
+
+    def _listStations(self, dt):
+        '''
+            Gets the set of station ids available at a cycle from the remote
+            listing (through the availability cache).
+        '''
+        func = available.availableat[self._name.lower()][self._ds_name.lower()]
+        return getAvailabilityCache().get(('stations', self._ds_name, self._name, dt),
+            lambda: frozenset(func(dt)), ttl=self._avail_ttl)
+
+    def _getIndex(self, field):
+        '''
+            Returns the lookup table of the points by srcid, icao, synop or
+            (lat, lon), building all of them the first time. The first point
+            in the CSV wins when several share a key; empty keys aren't
+            indexed.
+        '''
+        if self._indexes is None:
+            indexes = {}
+            for fld in [ 'srcid', 'icao', 'synop', 'coords' ]:
+                index = {}
+                for pt in self.getPoints():
+                    key = (pt['lat'], pt['lon']) if fld == 'coords' else pt.get(fld, "")
+                    if key != "" and key not in index:
+                        index[key] = pt
+                indexes[fld] = index
+            self._indexes = indexes
+        return self._indexes[field]
+
     def getForecastHours(self):
         times = []
         t = self._time
@@ -113,7 +470,7 @@ class Outlet(object):
 
         if self._custom_avail:
             try:
-                times = available.available[self._name.lower()][self._ds_name.lower()]()
+                times = self._listTimes()
                 recent = max(times)
                 self._is_available = True
             except urllib2.URLError:
@@ -161,35 +518,34 @@ class Outlet(object):
         if dt is None:
             dt = self.getMostRecentCycle()
 
-        stns_avail = self.getPoints()
+        if not self._custom_avail_at:
+            return self.getPoints()
 
-        if self._name.lower() in available.availableat and self._ds_name.lower() in available.availableat[self._name.lower()]:
-            try:
-                avail = available.availableat[self._name.lower()][self._ds_name.lower()](dt)
-                stns_avail = []
-                points = self.getPoints()
-                srcids = [ p['srcid'] for p in points ]
-
-                for stn in avail:
-                    try:
-                        idx = srcids.index(stn)
-                        stns_avail.append(points[idx])
-                    except ValueError:
-                        pass
+        avail = self.getAvailableSrcids(dt)
+        return [ p for p in self.getPoints() if p['srcid'] in avail ]
 
-                self._is_available = True
+    def getAvailableSrcids(self, dt):
+        '''
+            Returns the set of the srcids of the points that have a profile
+            at a cycle (empty if the listing can't be downloaded).
+        '''
+        if not self._custom_avail_at:
+            return self._getIndex('srcid').viewkeys()
 
-            except urllib2.URLError:
-                stns_avail = []
-                self._is_available = False
-        return stns_avail
+        try:
+            avail = self._listStations(dt)
+            self._is_available = True
+        except urllib2.URLError:
+            self._is_available = False
+            return frozenset()
+        return avail & self._getIndex('srcid').viewkeys()
 
     def getAvailableTimes(self, max_cycles=10000):
         custom_failed = False
 
         if self._custom_avail:
             try:
-                times = available.available[self._name.lower()][self._ds_name.lower()]()
+                times = self._listTimes()
                 if len(times) == 1:
                     times = self.getArchivedCycles(start=times[0], max_cycles=max_cycles)
                 self._is_available = True
@@ -208,45 +564,77 @@ class Outlet(object):
         return self._url
 
     def getDecoder(self):
-        return decoder.getDecoder(self._format)
+        dec = decoder.getDecoder(self._format)
+
+        ## Decoders that cache what they decode are told which outlet it
+        ## comes from
+        try:
+            takes_outlet = 'outlet' in inspect.getargspec(dec.__init__).args
+        except TypeError:
+            takes_outlet = False
+        if takes_outlet:
+            dec = functools.partial(dec, outlet=self._name)
+        return dec
 
     def hasProfile(self, point, cycle):
         times = self.getAvailableTimes()
         has_prof = cycle in times
 
         if has_prof:
-            stns = self.getAvailableAtTime(dt=cycle)
-            has_prof = point in stns
+            has_prof = point['srcid'] in self.getAvailableSrcids(cycle)
         return has_prof
 
     def getPoints(self):
+        if self._points is None:
+            fields = self._csv_fields
+            self._points = [ dict(zip(fields, rec)) for rec in self._records[fields].tolist() ]
         points = self._points
         return points
 
+    def getPoint(self, srcid):
+        '''
+            Returns the point with a srcid, or None if the outlet doesn't
+            have it.
+        '''
+        return self._getIndex('srcid').get(srcid, None)
+
+    def findPoint(self, field, key):
+        '''
+            Returns the point with a srcid, icao, synop or (lat, lon) coords
+            (the field), or None if the outlet doesn't have it.
+        '''
+        return self._getIndex(field).get(key, None)
+
     def getFields(self):
         return self._csv_fields
 
     def isAvailable(self):
+        ## A host that didn't answer the last health check (see pingURLs)
+        ## is unavailable; the answer is only looked up, never waited for.
+        if getAvailabilityCache().peek(('ping', _baseURL(self._url))) is False:
+            return False
         return self._is_available
 
-    def _loadCSV(self, csv_file_name):
-        csv = []
-        csv_file = open(csv_file_name, 'r')
-        self._csv_fields = [ f.lower() for f in csv_file.readline().strip().split(',') ]
-
-        for line in csv_file:
-            line_dict = dict( (f, v) for f, v in zip(self._csv_fields, line.strip().split(',')))
-            csv.append(line_dict)
-
-        csv_file.close()
-        return csv
-
 class DataSource(object):
-    def __init__(self, config):
+    def __init__(self, config, ds_dir=HOME_DIR):
         self._name = config.get('name')
         self._ensemble = config.get('ensemble').lower() == "true"
         self._observed = config.get('observed').lower() == "true"
-        self._outlets = dict( (c.get('name'), Outlet(self._name, c)) for c in config )
+        self._config = config
+        self._ds_dir = ds_dir
+        self._outlet_objs = None
+
+        ## Make sure the station files compiled, so a broken data source is
+        ## still caught while loading
+        for c in config:
+            catalog.getCatalog(ds_dir).check(c.find('points').get('csv'))
+
+    @property
+    def _outlets(self):
+        ## The outlets are built the first time the data source is used
+        if self._outlet_objs is None:
+            self._outlet_objs = dict( (c.get('name'), Outlet(self._name, c, ds_dir=self._ds_dir)) for c in self._config )
+        return self._outlet_objs
 
     def _get(self, name, outlet, flatten=True, **kwargs):
         prop = None
@@ -303,14 +691,28 @@ class DataSource(object):
         points = self._get('getAvailableAtTime', outlet, flatten=False, dt=dt)
 
         flatten_pts = []
-        flatten_coords = []
+        flatten_coords = set()
         for pt_list in points:
             for pt in pt_list:
                 if (pt['lat'], pt['lon']) not in flatten_coords:
-                    flatten_coords.append((pt['lat'], pt['lon']))
+                    flatten_coords.add((pt['lat'], pt['lon']))
                     flatten_pts.append(pt)
         return flatten_pts
 
+    def getPoint(self, srcid, outlet=None):
+        '''
+            Returns the point with a srcid from an outlet (or from the first
+            outlet that has it), or None if no outlet has it.
+        '''
+        if outlet is not None:
+            return self._outlets[outlet].getPoint(srcid)
+
+        for out in self._outlets.itervalues():
+            pt = out.getPoint(srcid)
+            if pt is not None:
+                return pt
+        return None
+
     def getDecoder(self, stn, cycle_dt, outlet=None):
         outlet = self._getOutletWithProfile(stn, cycle_dt, outlet)
         decoder = self._outlets[outlet].getDecoder()
@@ -0,0 +1,23 @@
+import os
+from datetime import datetime
+from datasources import avail_index
+
+def test_store_rereads_the_file(tmpdir):
+    path = str(tmpdir.join("availability.json"))
+    ours = avail_index.AvailabilityIndex(path)
+    theirs = avail_index.AvailabilityIndex(path)
+
+    ## Whole-second mtimes, as on filesystems with coarse timestamps
+    mtime = 1452556800
+    ours.store(('times', 'GFS', 'NCEP'), [ datetime(2016, 1, 12, 0) ])
+    os.utime(path, (mtime, mtime))
+    assert ours.load(('times', 'GFS', 'NCEP')) is not None
+
+    ## Another process writes the file within the same mtime tick
+    theirs.store(('times', 'NAM', 'NCEP'), [ datetime(2016, 1, 12, 6) ])
+    os.utime(path, (mtime, mtime))
+
+    ours.store(('times', 'RAP', 'NCEP'), [ datetime(2016, 1, 12, 12) ])
+    fresh = avail_index.AvailabilityIndex(path)
+    for name in [ 'GFS', 'NAM', 'RAP' ]:
+        assert fresh.load(('times', name, 'NCEP')) is not None
@@ -0,0 +1,47 @@
+import os
+import json
+import glob
+from datasources import catalog
+
+def _write_csv(ds_dir, name, rows):
+    csv_file = open(os.path.join(ds_dir, name), 'w')
+    csv_file.write("icao,iata,synop,name,state,country,lat,lon,elev,priority,srcid\n")
+    for icao, lat in rows:
+        csv_file.write("%s,,,,,,%.2f,-97.44,357,3,%s\n" % (icao, lat, icao.lower()))
+    csv_file.close()
+
+def _icaos(cat, name):
+    return list(cat.get(name)[0]['icao'])
+
+def test_catalog_per_directory(tmpdir):
+    cat_dir = str(tmpdir.join("catalog"))
+    ds_dirs = [ str(tmpdir.mkdir("ds1")), str(tmpdir.mkdir("ds2")) ]
+    _write_csv(ds_dirs[0], "obs.csv", [ ('KOUN', 35.22) ])
+    _write_csv(ds_dirs[1], "obs.csv", [ ('KDDC', 37.76), ('KAMA', 35.23) ])
+
+    cats = [ catalog.StationCatalog(ds_dir, catalog_dir=cat_dir) for ds_dir in ds_dirs ]
+    assert _icaos(cats[0], "obs.csv") == [ 'KOUN' ]
+    assert _icaos(cats[1], "obs.csv") == [ 'KDDC', 'KAMA' ]
+
+    ## Both catalogs stay on disk, so neither is rebuilt when loaded again
+    assert len(glob.glob(os.path.join(cat_dir, "*.json"))) == 2
+    assert len(glob.glob(os.path.join(cat_dir, "*.npy"))) == 2
+    assert glob.glob(os.path.join(cat_dir, "*.tmp*")) == []
+    again = catalog.StationCatalog(ds_dirs[0], catalog_dir=cat_dir)
+    assert _icaos(again, "obs.csv") == [ 'KOUN' ]
+
+def test_missing_records_rebuild(tmpdir):
+    cat_dir = str(tmpdir.join("catalog"))
+    ds_dir = str(tmpdir.mkdir("ds"))
+    _write_csv(ds_dir, "obs.csv", [ ('KOUN', 35.22) ])
+    catalog.StationCatalog(ds_dir, catalog_dir=cat_dir).check("obs.csv")
+
+    ## A .json naming records that aren't there (e.g. removed by hand) is
+    ## rebuilt rather than paired with other records
+    meta_name = glob.glob(os.path.join(cat_dir, "*.json"))[0]
+    meta = json.load(open(meta_name))
+    os.remove(os.path.join(cat_dir, meta['records']))
+
+    cat = catalog.StationCatalog(ds_dir, catalog_dir=cat_dir)
+    assert _icaos(cat, "obs.csv") == [ 'KOUN' ]
+    assert json.load(open(meta_name))['records'] != meta['records']
@@ -0,0 +1,64 @@
+import socket
+import threading
+import time
+import BaseHTTPServer
+import SocketServer
+from datasources import data_source
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, *args):
+        pass
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+def _serve(delay):
+    server = _Server(('127.0.0.1', 0), _Handler)
+    server.delay = delay
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+def _closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+class _Source(object):
+    def __init__(self, urls):
+        self._urls = urls
+
+    def getURLList(self, outlet=None):
+        return self._urls
+
+def test_ping_deadline(monkeypatch):
+    monkeypatch.setattr(data_source, '_avail_cache', data_source.AvailabilityCache())
+
+    fast = _serve(0.)
+    slow = _serve(3.)
+    try:
+        fast_url = 'http://127.0.0.1:%d' % fast.server_port
+        slow_url = 'http://127.0.0.1:%d' % slow.server_port
+        closed_url = 'http://127.0.0.1:%d' % _closed_port()
+        ds_dict = { 'fast':_Source([ fast_url + '/data.txt' ]), 'slow':_Source([ slow_url + '/data.txt' ]),
+            'closed':_Source([ closed_url + '/data.txt' ]) }
+
+        start = time.time()
+        urls = data_source.pingURLs(ds_dict, timeout=5, deadline=0.5)
+        elapsed = time.time() - start
+    finally:
+        fast.shutdown()
+        slow.shutdown()
+
+    ## The slow host is still being probed at the deadline
+    assert elapsed < 1.5
+    assert urls == { fast_url:True, slow_url:False, closed_url:False }
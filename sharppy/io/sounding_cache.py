@@ -0,0 +1,236 @@
+''' On-disk cache of decoded soundings '''
+import numpy as np
+import os, glob, json, time
+import uuid
+from datetime import datetime, timedelta
+
+__all__ = ['SoundingCache', 'getCache']
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".sharppy", "cache", "soundings")
+MAX_BYTES = 256 * 1024 * 1024
+
+## Soundings fetched less than FINAL_AGE after their cycle may still be
+## revised at the source (late or corrected levels), so they're fetched
+## again once they're older than the TTL (s)
+FINAL_AGE = timedelta(hours=12)
+TTL = 1800
+
+## Order of the rows in the stored column block
+COLUMNS = [ 'pres', 'hght', 'tmpc', 'dwpc', 'wdir', 'wspd' ]
+
+class SoundingCache(object):
+    '''
+        A persistent cache of decoded sounding arrays keyed by
+        (srcid, cycle datetime, outlet).
+
+        Each entry is a raw .npy block holding the pres, hght, tmpc, dwpc,
+        wdir and wspd columns (one row per field), which is memory-mapped
+        when read back, plus a small .json file with the location, latitude
+        and date, the time it was fetched and the name of its block. Every
+        write goes to a new block, and the .json is swapped in atomically
+        once the block is complete, so readers never pair metadata with the
+        wrong block. Soundings of recent cycles expire after ttl seconds,
+        until they were fetched more than FINAL_AGE after their cycle. When
+        the entries grow past max_bytes, the least recently used ones are
+        evicted.
+
+        Storing is best-effort: a cache that can't be written (read-only or
+        full disk) just doesn't keep the sounding.
+
+        Parameters
+        ----------
+        cache_dir : string (default: ~/.sharppy/cache/soundings)
+        The directory the entries are written to
+        max_bytes : int (default: 256 MB)
+        The size the cache is trimmed back to when it grows past it
+        ttl : number (default: 1800)
+        The number of seconds the soundings of recent cycles are kept
+    '''
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES, ttl=TTL):
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        ## Running estimate of the size of the entries (None until the
+        ## directory is first scanned)
+        self._size = None
+
+    def _path(self, srcid, cycle, outlet):
+        name = "%s_%s_%s" % (outlet.lower(), srcid, cycle.strftime("%Y%m%d%H%M"))
+        name = "".join( c if c.isalnum() or c in "_-" else "-" for c in name )
+        return os.path.join(self._cache_dir, name)
+
+    def _readMeta(self, path):
+        meta_file = open(path + ".json", 'r')
+        try:
+            return json.load(meta_file)
+        finally:
+            meta_file.close()
+
+    def get(self, srcid, cycle, outlet):
+        '''
+            Looks up a sounding in the cache.
+
+            Returns
+            -------
+            data : dictionary or None
+            The pres, hght, tmpc, dwpc, wdir and wspd arrays along with the
+            location, latitude and date metadata, or None on a cache miss
+            (or if the entry expired).
+        '''
+        path = self._path(srcid, cycle, outlet)
+        try:
+            meta = self._readMeta(path)
+            if self._expired(cycle, meta.get('fetched', None)):
+                return None
+
+            ## Copy-on-write, so the profile constructors can mask values
+            ## without touching the file.
+            block = np.load(os.path.join(self._cache_dir, meta['block']), mmap_mode='c')
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+        ## Mark the entry as recently used for the eviction
+        try:
+            os.utime(path + ".json", None)
+        except OSError:
+            pass
+
+        data = dict( (col, block[idx]) for idx, col in enumerate(COLUMNS) )
+        data['location'] = meta['location']
+        data['latitude'] = meta['latitude']
+        data['date'] = datetime.strptime(meta['date'], "%Y%m%d%H%M")
+        return data
+
+    def _expired(self, cycle, fetched):
+        '''
+            Whether a sounding fetched at 'fetched' (s since the epoch) has
+            to be fetched again. Entries written without a fetch time are
+            always fetched again.
+        '''
+        if fetched is None:
+            return True
+        if datetime.utcfromtimestamp(fetched) - cycle >= FINAL_AGE:
+            return False
+        return time.time() - fetched >= self._ttl
+
+    def _entry(self, path):
+        '''
+            Returns the name of an entry's block and the size of the entry,
+            or (None, 0) if there's no (readable) entry.
+        '''
+        try:
+            block_name = self._readMeta(path)['block']
+            size = os.path.getsize(path + ".json") + os.path.getsize(os.path.join(self._cache_dir, block_name))
+        except (IOError, OSError, ValueError, KeyError):
+            return None, 0
+        return block_name, size
+
+    def _remove(self, *names):
+        for name in names:
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+    def put(self, srcid, cycle, outlet, location, latitude, date, **cols):
+        '''
+            Stores a decoded sounding. The keyword arguments must hold the
+            pres, hght, tmpc, dwpc, wdir and wspd arrays.
+        '''
+        path = self._path(srcid, cycle, outlet)
+        block = np.vstack([ np.asarray(cols[col], dtype=float) for col in COLUMNS ])
+
+        ## Names no other writer (thread or process) can be using
+        stamp = uuid.uuid4().hex
+        block_name = "%s.%s.npy" % (os.path.basename(path), stamp)
+        tmp_name = "%s.%s.tmp" % (path, stamp)
+
+        meta = {'location':location, 'latitude':float(latitude), 'date':date.strftime("%Y%m%d%H%M"),
+            'fetched':time.time(), 'block':block_name}
+
+        try:
+            if not os.path.exists(self._cache_dir):
+                os.makedirs(self._cache_dir)
+
+            old_block, old_size = self._entry(path)
+
+            ## The block isn't part of the cache until the .json that
+            ## names it is swapped in
+            np.save(os.path.join(self._cache_dir, block_name), block)
+            meta_file = open(tmp_name, 'w')
+            json.dump(meta, meta_file)
+            meta_file.close()
+            if os.name == 'nt' and os.path.exists(path + ".json"):
+                os.remove(path + ".json")
+            os.rename(tmp_name, path + ".json")
+        except (IOError, OSError):
+            self._remove(tmp_name, os.path.join(self._cache_dir, block_name))
+            return
+
+        if old_block is not None and old_block != block_name:
+            self._remove(os.path.join(self._cache_dir, old_block))
+
+        ## Only scan the directory when the running size says the cache is
+        ## full (or on the first write, to get the size of what's there)
+        if self._size is None:
+            self.evict()
+            return
+        self._size += self._entry(path)[1] - old_size
+        if self._size > self._max_bytes:
+            self.evict()
+
+    def evict(self):
+        '''
+            Removes the least recently used entries until the cache fits in
+            max_bytes, and resets the running size to what's left. Blocks
+            no entry names (left by a writer that didn't finish) are removed
+            too once they're older than a minute.
+        '''
+        entries = []
+        blocks = set()
+        total = 0
+        for meta_name in glob.glob(os.path.join(self._cache_dir, "*.json")):
+            path = meta_name[:-5]
+            block_name, size = self._entry(path)
+            if block_name is None:
+                continue
+            try:
+                mtime = os.path.getmtime(meta_name)
+            except OSError:
+                continue
+            entries.append((mtime, size, path, block_name))
+            blocks.add(block_name)
+            total += size
+
+        now = time.time()
+        for npy in glob.glob(os.path.join(self._cache_dir, "*.npy")):
+            if os.path.basename(npy) in blocks:
+                continue
+            try:
+                if now - os.path.getmtime(npy) > 60:
+                    os.remove(npy)
+            except OSError:
+                pass
+
+        entries.sort()
+        for mtime, size, path, block_name in entries:
+            if total <= self._max_bytes:
+                break
+            self._remove(path + ".json", os.path.join(self._cache_dir, block_name))
+            total -= size
+        self._size = total
+
+    def clear(self):
+        self._remove(*(glob.glob(os.path.join(self._cache_dir, "*.npy")) + glob.glob(os.path.join(self._cache_dir, "*.json"))))
+        self._size = 0
+
+_cache = None
+
+def getCache():
+    '''
+        Returns the process-wide sounding cache.
+    '''
+    global _cache
+    if _cache is None:
+        _cache = SoundingCache()
+    return _cache
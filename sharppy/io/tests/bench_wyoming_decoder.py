@@ -0,0 +1,32 @@
+'''
+Times the single-pass parser of the Wyoming decoder against the old
+genfromtxt parser on a synthetic page. Run as
+
+    python -m sharppy.io.tests.bench_wyoming_decoder [levels] [repeats]
+'''
+import sys
+import timeit
+import numpy as np
+from sharppy.io import wyoming_decoder
+from sharppy.io.tests.test_wyoming_decoder import HEADER, _row, _sounding, _old_parse
+
+def _page(nlev):
+    ## A high-resolution sounding: nlev levels from 1010 hPa up to 10 hPa
+    pres = np.linspace(1010., 10., nlev)
+    hght = np.linspace(11, 31000, nlev).astype(int)
+    tmpc = np.linspace(27.2, -60., nlev)
+    lines = _sounding(87576, 'SAEZ', 12)
+    rows = [ _row((p, h, t, t - 6., 50, 5.0, 270, 20, 300.0, 330.0, 301.0)) for p, h, t in zip(pres, hght, tmpc) ]
+    return '\n'.join(HEADER + lines[:6] + rows + lines[-5:]) + '\n'
+
+def main():
+    nlev = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    text = _page(nlev)
+
+    t_old = min(timeit.repeat(lambda: _old_parse(text), number=1, repeat=repeats))
+    t_new = min(timeit.repeat(lambda: wyoming_decoder._parse_sounding(text), number=1, repeat=repeats))
+    print "%d levels: old %.2f ms, new %.2f ms (%.1fx)" % (nlev, t_old * 1e3, t_new * 1e3, t_old / t_new)
+
+if __name__ == '__main__':
+    main()
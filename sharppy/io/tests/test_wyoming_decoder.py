@@ -0,0 +1,136 @@
+import os
+import tempfile
+from StringIO import StringIO
+from datetime import datetime
+import numpy as np
+from sharppy.io import wyoming_decoder
+
+HEADER = [ '<HTML>', '<TITLE>University of Wyoming - Radiosonde Data</TITLE>', '<BODY BGCOLOR="white">', '' ]
+
+## PRES HGHT TEMP DWPT RELH MIXR DRCT SKNT THTA THTE THTV
+LEVELS = [
+    (1010., 11, 27.2, 21.2, 70, 16.0, 180, 6, 299.6, 346.7, 302.4),
+    (1000., 99, 25.8, 20.8, 74, 15.7, 190, 8, 299.0, 345.3, 301.8),
+    (925., 786, 21.4, 16.4, 73, 12.8, 220, 14, 301.4, 339.9, 303.7),
+    (850., 1510, 16.2, 9.2, 63, 8.7, 250, 19, 303.3, 330.3, 304.9),
+    (700., 3140, 7.0, -4.0, 46, 4.1, 270, 25, 310.2, 323.8, 310.9),
+    (500., 5860, -8.5, -26.5, 22, 0.7, 270, 37, 322.7, 325.4, 322.8),
+    (300., 9650, -33.1, -50.1, 17, 0.1, 265, 55, 337.7, 338.1, 337.7),
+    (200., 12380, -53.5, -66.5, 19, 0.0, 260, 60, 345.8, 345.9, 345.8),
+]
+
+def _row(vals):
+    return ''.join( ('%.1f' % v if isinstance(v, float) else '%d' % v).rjust(7) for v in vals )
+
+def _sounding(stnm, stid, hour, shift=0.):
+    lines = [ '<H2>%d %s Observations at %02dZ 12 Jan 2016</H2>' % (stnm, stid, hour), '<PRE>',
+        '-' * 77,
+        '   PRES   HGHT   TEMP   DWPT   RELH   MIXR   DRCT   SKNT   THTA   THTE   THTV',
+        '    hPa     m      C      C      %    g/kg    deg   knot     K      K      K ',
+        '-' * 77 ]
+    for lvl in LEVELS:
+        lines.append(_row((lvl[0], lvl[1], lvl[2] + shift) + lvl[3:]))
+    lines += [ '</PRE><H3>Station information and sounding indices</H3><PRE>',
+        '                         Station number: %d' % stnm,
+        '                       Observation time: 160112/%02d00' % hour,
+        '                       Station latitude: -34.81',
+        '</PRE>' ]
+    return lines
+
+def _old_parse(file_data):
+    '''
+        The page parsing of IAGDecoder._parse before the single-pass parser
+        (collapsing the spaces of every line and reading the rows with
+        genfromtxt).
+    '''
+    data = np.array([l.strip() for l in file_data.split('\n')])
+
+    finish_idx = np.where(np.char.find(data, '</H3>') > -1)[0][0]
+    time_idx = np.where(np.char.find(data, 'time') > -1)[0][0]
+    latitude_idx = np.where(np.char.find(data, 'latitude') > -1)[0][0]
+
+    location = data[4].split()[1]
+    time = datetime.strptime(data[time_idx].strip().split()[2], '%y%m%d/%H%M')
+    latitude = data[latitude_idx].strip().split()[2]
+
+    data = data[10 : finish_idx][:]
+    data_final = []
+    max = 0
+    for m in data:
+        while '  ' in m:
+            m = m.replace('  ', ' ')
+        if len(m.split(' ')) != 11:
+           continue
+        if int(float(m.split(' ')[1])) <= max:
+           continue
+        data_final.append(m)
+        max = int(float(m.split(' ')[1]))
+    full_data = '\n'.join(data_final)
+    while '  ' in full_data:
+        full_data = full_data.replace('  ', ' ')
+    p, h, T, Td, rh, mr, wdir, wspd, ta, te, tv = np.genfromtxt(StringIO(full_data.strip()), delimiter=' ',
+        comments="%", unpack=True)
+    wdir = np.array([ m if int(m) < 360 else 0. for m in wdir ])
+    return location, time, float(latitude), p, h, T, Td, wdir, wspd
+
+def _write(lines):
+    fd, name = tempfile.mkstemp(suffix='.txt')
+    os.write(fd, '\n'.join(lines) + '\n')
+    os.close(fd)
+    return name
+
+def test_single_sounding():
+    name = _write(HEADER + _sounding(87576, 'SAEZ', 12))
+    try:
+        dec = wyoming_decoder.IAGDecoder(name)
+        prof_cols = list(dec.iterProfiles())
+    finally:
+        os.remove(name)
+
+    assert len(prof_cols) == 1
+    assert prof_cols[0] is dec.getProfiles()
+    assert prof_cols[0].getMeta('loc') == 'SAEZ'
+
+def test_two_soundings():
+    lines = HEADER + _sounding(87576, 'SAEZ', 0) + _sounding(87155, 'SARE', 12, shift=1.)
+    name = _write(lines)
+    try:
+        dec = wyoming_decoder.IAGDecoder(name)
+        first = dec.getProfiles()
+        prof_cols = list(dec.iterProfiles())
+    finally:
+        os.remove(name)
+
+    ## getProfiles() still returns a single collection
+    assert first.getMeta('loc') == 'SAEZ'
+    assert [ pc.getMeta('loc') for pc in prof_cols ] == [ 'SAEZ', 'SARE' ]
+    assert [ pc.getCurrentDate() for pc in prof_cols ] == [ datetime(2016, 1, 12, 0), datetime(2016, 1, 12, 12) ]
+
+    tmpc = [ pc.getHighlightedProf().tmpc for pc in prof_cols ]
+    np.testing.assert_allclose(tmpc[1] - tmpc[0], 1.)
+    assert len(tmpc[0]) == len(LEVELS)
+
+def test_split_skips_titles_without_data():
+    text = '\n'.join(HEADER + _sounding(87576, 'SAEZ', 0) + [ "<H2>Can't get 87155 SARE Observations at 12Z 12 Jan 2016</H2>" ])
+    assert len(list(wyoming_decoder._split_soundings(text))) == 1
+
+def test_parse_matches_old_parser():
+    lines = HEADER + _sounding(87576, 'SAEZ', 12)
+    table_end = len(HEADER) + 6 + len(LEVELS)
+    ## Rows the parsers have to drop: missing columns, a height that isn't
+    ## above the levels before it, and a calm wind reported as 360
+    lines[table_end:table_end] = [
+        _row((175., 14000, -57.1, -70.1, 18, 0.0, 360, 0, 360.2, 360.3, 360.2)),
+        _row((170., 13900, -57.5, -70.5, 18, 0.0, 250, 40, 362.0, 362.1, 362.0)),
+        '  150.0  14960  -60.3' + ' ' * 35 + '    250     35  371.6',
+        _row((100., 16800, -66.9, -80.9, 13, 0.0, 270, 30, 404.6, 404.7, 404.6)),
+    ]
+    text = '\n'.join(lines) + '\n'
+
+    new = wyoming_decoder._parse_sounding(text)
+    old = _old_parse(text)
+    assert new[:3] == old[:3]
+    for new_col, old_col in zip(new[3:], old[3:]):
+        np.testing.assert_array_equal(new_col, old_col)
+    assert len(new[3]) == len(LEVELS) + 2
+    assert new[7][len(LEVELS)] == 0.
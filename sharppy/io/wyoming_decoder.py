@@ -4,79 +4,204 @@ import numpy as np
 import sharppy.sharptab.profile as profile
 import sharppy.sharptab.prof_collection as prof_collection
 from decoder import Decoder
+import sounding_cache
 
-from StringIO import StringIO
+import urlparse
 from datetime import datetime
 
 __fmtname__ = "iag"
 __classname__ = "IAGDecoder"
 
+## Layout of the Wyoming TEXT:LIST table: 11 right-justified columns,
+## 7 characters each (PRES HGHT TEMP DWPT RELH MIXR DRCT SKNT THTA THTE THTV)
+_NCOLS = 11
+_COL_WIDTH = 7
+_ROW_WIDTH = _NCOLS * _COL_WIDTH
+
+def _line_with(text, token, start=0):
+    '''
+        Returns the (stripped) line of text that holds the first occurrence
+        of token at or after start, or None if the token isn't found.
+    '''
+    idx = text.find(token, start)
+    if idx < 0:
+        return None
+    bol = text.rfind('\n', 0, idx) + 1
+    eol = text.find('\n', idx)
+    if eol < 0:
+        eol = len(text)
+    return text[bol:eol].strip()
+
+def _parse_table(lines):
+    '''
+        Splits the fixed-width rows of a TEXT:LIST table straight into
+        float columns. Only rows with all 11 columns reported are kept and,
+        as with the SPC decoder, the heights must be strictly increasing.
+
+        Parameters
+        ----------
+        lines : list of strings
+        The raw rows of the data table (no header)
+
+        Returns
+        -------
+        pres, hght, tmpc, dwpc, wdir, wspd : arrays
+    '''
+    rows = np.array([ l.rstrip('\r').ljust(_ROW_WIDTH)[:_ROW_WIDTH] for l in lines ], dtype='S%d' % _ROW_WIDTH)
+    if rows.shape[0] == 0:
+        return tuple( np.empty(0) for i in xrange(6) )
+
+    cols = rows.view('S%d' % _COL_WIDTH).reshape(-1, _NCOLS)
+    full = (np.char.strip(cols) != '').all(axis=1)
+    vals = cols[full].astype(float)
+
+    ## drop any level that doesn't sit above every level kept before it
+    hght = vals[:, 1].astype(int)
+    prev_max = np.maximum.accumulate(np.concatenate(([0], hght[:-1])))
+    vals = vals[hght > prev_max]
+
+    pres, hght, tmpc, dwpc = vals[:, 0], vals[:, 1], vals[:, 2], vals[:, 3]
+    wdir, wspd = vals[:, 6], vals[:, 7]
+    wdir = np.where(wdir < 360, wdir, 0.)
+    return pres, hght, tmpc, dwpc, wdir, wspd
+
+def _parse_sounding(text, title_idx=4):
+    '''
+        Decodes a single Wyoming TEXT:LIST sounding (the <PRE> data table
+        followed by the station information block).
+
+        Parameters
+        ----------
+        text : string
+        The text of the sounding
+        title_idx : int (default: 4)
+        Index of the line holding the <H2> title. The data table starts
+        six lines below it.
+
+        Returns
+        -------
+        location : string
+        time : datetime object
+        latitude : float
+        pres, hght, tmpc, dwpc, wdir, wspd : arrays
+    '''
+    lines = text.split('\n')
+
+    ## create the plot title and time
+    location = lines[title_idx].split()[1]
+    time_str = _line_with(text, 'time').split()[2]
+    time = datetime.strptime(time_str, '%y%m%d/%H%M')
+    latitude = _line_with(text, 'latitude').split()[2]
+    if time > datetime.utcnow():
+        # If the strptime accidently makes the sounding in the future (like with SARS archive)
+        # i.e. a 1957 sounding becomes 2057 sounding...ensure that it's a part of the 20th century
+        time = datetime.strptime('19' + time_str, '%y%m%d/%H%M')
+
+    ## the data table runs from the row after the column header up to the
+    ## line that opens the station information block
+    finish = text.find('</H3>')
+    finish_idx = text.count('\n', 0, finish) if finish >= 0 else len(lines)
+    table = _parse_table(lines[title_idx + 6:finish_idx])
+
+    return (location, time, float(latitude)) + table
+
+def _split_soundings(text):
+    '''
+        Splits a TEXT:LIST response into the text of each sounding it holds.
+        Wyoming opens every station/time with its own <H2> title.
+    '''
+    starts = []
+    idx = text.find('<H2>')
+    while idx >= 0:
+        starts.append(idx)
+        idx = text.find('<H2>', idx + 4)
+    starts.append(len(text))
+
+    for bgn, end in zip(starts[:-1], starts[1:]):
+        sounding = text[bgn:end]
+        if sounding.find('<PRE>') < 0:
+            ## A title with no data (e.g. "Can't get ... Observations")
+            continue
+        yield sounding
+
+def _cache_key(file_name, outlet=None):
+    '''
+        Gets the (srcid, cycle, outlet) cache key from a sounding URL of the
+        form ...?{srcid}_{date}{cycle}, or None if the file name doesn't
+        follow it (e.g. a local file). Without an outlet name, the host of
+        the URL stands in for it.
+    '''
+    url = urlparse.urlparse(file_name)
+    try:
+        srcid, date = url.query.rsplit('_', 1)
+        cycle = datetime.strptime(date, '%y%m%d%H')
+    except ValueError:
+        return None
+    if outlet is None:
+        outlet = url.netloc
+    return srcid, cycle, outlet
+
+def _make_collection(location, time, latitude, pres, hght, tmpc, dwpc, wdir, wspd):
+    prof = profile.create_profile(profile='raw', pres=pres, hght=hght, tmpc=tmpc, dwpc=dwpc,
+        wdir=wdir, wspd=wspd, location=location, date=time, latitude=latitude)
+
+    prof_coll = prof_collection.ProfCollection(
+        {'':[ prof ]},
+        [ time ],
+    )
+
+    prof_coll.setMeta('loc', location)
+    return prof_coll
+
 class IAGDecoder(Decoder):
-    def __init__(self, file_name):
+    '''
+        Decodes a Wyoming TEXT:LIST sounding, going through the sounding
+        cache for the URLs of a single station and cycle.
+
+        A response holding several soundings (several stations and/or
+        times, each under its own <H2> title) is decoded one sounding at a
+        time: getProfiles() returns the first one, and iterProfiles()
+        yields every one of them, decoding each as it's reached.
+
+        Parameters
+        ----------
+        file_name : string
+        The URL or file name of the sounding
+        outlet : string (optional)
+        Name of the data source outlet the sounding comes from (part of
+        the cache key; the host of the URL if not given)
+    '''
+    def __init__(self, file_name, outlet=None):
+        self._outlet = outlet
+        self._more_soundings = []
         super(IAGDecoder, self).__init__(file_name)
 
     def _parse(self):
+        key = _cache_key(self._file_name, self._outlet)
+        cache = sounding_cache.getCache()
+        if key is not None:
+            data = cache.get(*key)
+            if data is not None:
+                cols = [ data[c] for c in sounding_cache.COLUMNS ]
+                return _make_collection(data['location'], data['date'], data['latitude'], *cols)
+
         file_data = self._downloadFile()
-        ## read in the file
-        data = np.array([l.strip() for l in file_data.split('\n')])
-
-        ## necessary index points
-        start_idx = np.where( data == '<PRE>' )[0]
-        finish_idx = np.where(np.char.find(data, '</H3>') > -1)[0]
-        time_idx = np.where(np.char.find(data, 'time') > -1)[0][0]
-        latitude_idx = np.where(np.char.find(data, 'latitude') > -1)[0][0]
-
-        ## create the plot title and time
-        location = data[4].split()[1]
-        time = datetime.strptime(data[time_idx].strip().split()[2], '%y%m%d/%H%M')
-        latitude = data[latitude_idx].strip().split()[2]
-        if time > datetime.utcnow(): #If the strptime accidently makes the sounding the future:
-            # If the strptime accidently makes the sounding in the future (like with SARS archive)
-            # i.e. a 1957 sounding becomes 2057 sounding...ensure that it's a part of the 20th century
-            time = datetime.strptime('19' + data[time_idx].strip().split()[2], '%y%m%d/%H%M')
-
-		## put it all together for StringIO
-        data = data[10 : finish_idx][:]
-        data_final = []
-        max = 0
-        for m in data:
-            while '  ' in m:
-                m = m.replace('  ', ' ')
-            if len(m.split(' ')) != 11:
-               continue
-            if int(float(m.split(' ')[1])) <= max:
-               continue
-            data_final.append(m)
-            max = int(float(m.split(' ')[1]))
-        full_data = '\n'.join(data_final)
-        while '  ' in full_data:
-            full_data = full_data.replace('  ', ' ')
-        sound_data = StringIO( full_data.strip() )
-        ## read the data into arrays
-        p, h, T, Td, rh, mr, wdir, wspd, ta, te, tv = np.genfromtxt( sound_data, delimiter=' ', comments="%", unpack=True )
-        #idx = np.argsort(p, kind='mergesort')[::-1] # sort by pressure in case the pressure array is off.
-
-        pres = p #[idx]
-        hght = h #[idx]
-        tmpc = T #[idx]
-        dwpc = Td #[idx]
-        wspd = wspd #[idx]
-        wdir = wdir #[idx]
-        wdir_final = []
-        for m in wdir:
-            s = '0'
-            if int(m) < 360:
-                s = m
-            wdir_final.append(s)
-				
-        # Force latitude to be 35 N. Figure out a way to fix this later.
-        prof = profile.create_profile(profile='raw', pres=pres, hght=hght, tmpc=tmpc, dwpc=dwpc,
-            wdir=wdir_final, wspd=wspd, location=location, date=time, latitude=float(latitude))
-
-        prof_coll = prof_collection.ProfCollection(
-            {'':[ prof ]}, 
-            [ time ],
-        )
-
-        prof_coll.setMeta('loc', location)
-        return prof_coll
+        soundings = list(_split_soundings(file_data))
+        if len(soundings) > 1:
+            self._more_soundings = soundings[1:]
+            return _make_collection(*_parse_sounding(soundings[0], title_idx=0))
+
+        sounding = _parse_sounding(file_data)
+        if key is not None:
+            location, time, latitude = sounding[:3]
+            cols = dict(zip(sounding_cache.COLUMNS, sounding[3:]))
+            cache.put(*key, location=location, latitude=latitude, date=time, **cols)
+        return _make_collection(*sounding)
+
+    def iterProfiles(self):
+        '''
+            Yields a ProfCollection for every sounding in the response.
+        '''
+        yield self.getProfiles()
+        for sounding in self._more_soundings:
+            yield _make_collection(*_parse_sounding(sounding, title_idx=0))
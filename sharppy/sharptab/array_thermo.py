@@ -0,0 +1,323 @@
+''' Array Versions of the Thermodynamic Routines '''
+from __future__ import division
+import numpy as np
+import numpy.ma as ma
+import os
+import uuid
+import zipfile
+from sharppy.sharptab import thermo
+from sharppy.sharptab.constants import *
+
+__all__ = ['drylift', 'satlift', 'wetlift', 'wetbulb', 'thetae']
+__all__ += ['satlift_table', 'table_error']
+
+## Switches wetlift() between the exact solver (False) and the moist
+## adiabat lookup table (True) when it isn't told which one to use.
+USE_TABLE = False
+
+## Axes of the moist adiabat lookup table: Wobus-adjusted potential
+## temperature (C) and log of pressure (hPa). Bilinear interpolation
+## on this grid stays within about 0.02 C of the exact solver over the
+## 10000 points of table_error() (0.03 C over 100000 points), well inside
+## the 0.1 C convergence tolerance of satlift.
+TABLE_THETAM = np.arange(-100., 80.25, 0.5)
+TABLE_LOGP = np.linspace(np.log(1100.), np.log(10.), 200)
+TABLE_FILE = os.path.join(os.path.expanduser("~"), ".sharppy", "cache", "moist_adiabats.npz")
+
+## Most secant iterations satlift runs for a parcel; the ones that haven't
+## converged by then get their last estimate
+SATLIFT_MAX_ITER = 100
+
+_table = None
+
+
+def _valid(*args):
+    '''
+    Returns the arguments as plain float arrays holding only the elements
+    that are unmasked in every argument, along with the mask of those
+    elements.
+
+    '''
+    args = [ ma.asarray(a, dtype=np.float64) for a in args ]
+    valid = np.ones(args[0].shape, dtype=bool)
+    for a in args:
+        valid &= ~ma.getmaskarray(a)
+    return [ a.data[valid] for a in args ], valid
+
+def _fill(valid, values, missing):
+    '''
+    Puts the values computed for the valid elements back into a masked
+    array, masking everything else.
+
+    '''
+    out = ma.masked_all(valid.shape, dtype=np.float64)
+    out[valid] = values
+    out[out == missing] = ma.masked
+    out.set_fill_value(missing)
+    return out
+
+def drylift(p, t, td):
+    '''
+    Lifts parcels to their LCLs. Same as thermo.drylift for arrays of
+    unmasked values.
+
+    Parameters
+    ----------
+    p : array
+        Pressures of the parcels (hPa)
+    t : array
+        Temperatures of the parcels (C)
+    td : array
+        Dewpoints of the parcels (C)
+
+    Returns
+    -------
+    p2 : array
+        LCL pressures (hPa)
+    t2 : array
+        LCL temperatures (C)
+
+    '''
+    t2 = thermo.lcltemp(t, td)
+    p2 = thermo.thalvl(thermo.theta(p, t, 1000.), t2)
+    return p2, t2
+
+def satlift(p, thetam):
+    '''
+    Returns the temperatures of saturated parcels with the given
+    Wobus-adjusted potential temperatures lifted to the pressures p.
+    Every element follows the same secant iteration as thermo.satlift
+    and stops as soon as it has converged, so the results match the
+    scalar routine.
+
+    Parameters
+    ----------
+    p : array
+        Pressures to lift the parcels to (hPa)
+    thetam : array
+        Potential temperatures adjusted by the Wobus function (C)
+
+    Returns
+    -------
+    Temperatures of the parcels (C)
+
+    '''
+    p, thetam = np.broadcast_arrays(np.asarray(p, dtype=np.float64), np.asarray(thetam, dtype=np.float64))
+    if p.ndim == 0:
+        return thermo.satlift(float(p), float(thetam))
+    p, thetam = p.ravel(), thetam.ravel()
+    out = thetam.copy()
+
+    ## Non-finite inputs give NaN, like the scalar routine
+    bad = ~(np.isfinite(p) & np.isfinite(thetam))
+    out[bad] = np.nan
+
+    ## Parcels at 1000 hPa are already at their potential temperature
+    idx = np.where(~bad & (np.fabs(p - 1000.) - 0.001 > 0))[0]
+    pwrp = np.power((p[idx] / 1000.),ROCP)
+    thm = thetam[idx]
+    t1 = (thm + ZEROCNK) * pwrp - ZEROCNK
+    e1 = thermo.wobf(t1) - thermo.wobf(thm)
+    rate = np.ones(t1.shape)
+    niter = 0
+    while idx.size > 0:
+        t2 = t1 - (e1 * rate)
+        e2 = (t2 + ZEROCNK) / pwrp - ZEROCNK
+        e2 += thermo.wobf(t2) - thermo.wobf(e2) - thm
+        eor = e2 * rate
+        niter += 1
+
+        ## Hand back the parcels that have converged, along with the ones
+        ## that went non-finite (NaN) and, past the iteration cap, the rest
+        done = (np.fabs(eor) - 0.1 <= 0) | ~np.isfinite(eor)
+        if niter >= SATLIFT_MAX_ITER:
+            done[:] = True
+        out[idx[done]] = t2[done] - eor[done]
+
+        left = ~done
+        idx, pwrp, thm = idx[left], pwrp[left], thm[left]
+        t1, e1, t2, e2 = t1[left], e1[left], t2[left], e2[left]
+        rate = (t2 - t1) / (e2 - e1)
+        t1 = t2
+        e1 = e2
+    return out
+
+def _wetlift_exact(p, t, p2):
+    thta = thermo.theta(p, t, 1000.)
+    thetam = thta - thermo.wobf(thta) + thermo.wobf(t)
+    return satlift(p2, thetam)
+
+def _get_table():
+    '''
+    Returns the moist adiabat lookup table (the temperature for every
+    TABLE_LOGP x TABLE_THETAM point), loading it from TABLE_FILE or
+    building and saving it the first time it's needed.
+
+    '''
+    global _table
+    if _table is not None:
+        return _table
+
+    try:
+        data = np.load(TABLE_FILE)
+        if np.array_equal(data['thetam'], TABLE_THETAM) and np.array_equal(data['logp'], TABLE_LOGP):
+            _table = data['temp']
+            return _table
+    except (IOError, OSError, KeyError, ValueError, EOFError, zipfile.BadZipfile):
+        pass
+
+    thm, logp = np.meshgrid(TABLE_THETAM, TABLE_LOGP)
+    _table = satlift(np.exp(logp).ravel(), thm.ravel()).reshape(thm.shape)
+    try:
+        if not os.path.exists(os.path.dirname(TABLE_FILE)):
+            os.makedirs(os.path.dirname(TABLE_FILE))
+        ## Written under a name of its own and renamed into place, so other
+        ## processes never load a partly written file
+        tmp_name = "%s.%s.tmp.npz" % (TABLE_FILE[:-4], uuid.uuid4().hex)
+        np.savez(tmp_name, thetam=TABLE_THETAM, logp=TABLE_LOGP, temp=_table)
+        if os.name == 'nt' and os.path.exists(TABLE_FILE):
+            os.remove(TABLE_FILE)
+        os.rename(tmp_name, TABLE_FILE)
+    except (IOError, OSError):
+        pass
+    return _table
+
+def satlift_table(p, thetam):
+    '''
+    Same as satlift, but interpolates the moist adiabat lookup table
+    instead of iterating. Points outside of the table fall back to the
+    exact solver.
+
+    Parameters
+    ----------
+    p : number or array
+        Pressures to lift the parcels to (hPa)
+    thetam : number or array
+        Potential temperatures adjusted by the Wobus function (C)
+
+    Returns
+    -------
+    Temperatures of the parcels (C)
+
+    '''
+    table = _get_table()
+    p, thetam = np.broadcast_arrays(np.asarray(p, dtype=np.float64), np.asarray(thetam, dtype=np.float64))
+    shape = p.shape
+    p, thetam = p.ravel(), thetam.ravel()
+
+    fi = (np.log(p) - TABLE_LOGP[0]) / (TABLE_LOGP[1] - TABLE_LOGP[0])
+    fj = (thetam - TABLE_THETAM[0]) / (TABLE_THETAM[1] - TABLE_THETAM[0])
+    inside = (fi >= 0) & (fi < len(TABLE_LOGP) - 1) & (fj >= 0) & (fj < len(TABLE_THETAM) - 1)
+
+    i = np.where(inside, fi, 0).astype(int)
+    j = np.where(inside, fj, 0).astype(int)
+    fi = fi - i
+    fj = fj - j
+    out = (table[i, j] * (1 - fi) + table[i+1, j] * fi) * (1 - fj) + \
+          (table[i, j+1] * (1 - fi) + table[i+1, j+1] * fi) * fj
+
+    if not inside.all():
+        out[~inside] = satlift(p[~inside], thetam[~inside])
+    if len(shape) == 0:
+        return out[0]
+    return out.reshape(shape)
+
+def wetlift(p, t, p2, table=None):
+    '''
+    Lifts saturated parcels moist adiabatically. Takes the same arguments
+    as thermo.wetlift, but also works on arrays of unmasked values, and
+    can use the moist adiabat lookup table instead of the exact solver.
+
+    Parameters
+    ----------
+    p : number or array
+        Starting pressures (hPa)
+    t : number or array
+        Starting temperatures (C)
+    p2 : number or array
+        Pressures to lift the parcels to (hPa)
+    table : bool (optional; default = USE_TABLE)
+        Switch to choose between the exact solver (False) and the
+        lookup table (True)
+
+    Returns
+    -------
+    Temperatures of the parcels at p2 (C)
+
+    '''
+    if table is None:
+        table = USE_TABLE
+    if p is ma.masked or t is ma.masked or p2 is ma.masked:
+        return ma.masked
+
+    if not table:
+        if np.ndim(p) == 0 and np.ndim(t) == 0 and np.ndim(p2) == 0:
+            return thermo.wetlift(p, t, p2)
+        return _wetlift_exact(p, t, p2)
+
+    thta = thermo.theta(p, t, 1000.)
+    thetam = thta - thermo.wobf(thta) + thermo.wobf(t)
+    return satlift_table(p2, thetam)
+
+def table_error(n=10000):
+    '''
+    Returns the largest difference (C) between the lookup table and the
+    exact solver over n random points between 1050 and 100 hPa and
+    -60 and 40 C (Wobus-adjusted potential temperature).
+
+    '''
+    rand = np.random.RandomState(0)
+    p = np.exp(np.log(1050.) + rand.rand(n) * (np.log(100.) - np.log(1050.)))
+    thetam = -60. + rand.rand(n) * 100.
+    return np.fabs(satlift_table(p, thetam) - satlift(p, thetam)).max()
+
+def wetbulb(p, t, td, missing=MISSING):
+    '''
+    Calculates the wetbulb temperatures of whole profiles at once.
+    Elements that are masked in any of the inputs are masked in the output.
+
+    Parameters
+    ----------
+    p : array
+        Pressures (hPa)
+    t : array
+        Temperatures (C)
+    td : array
+        Dewpoints (C)
+    missing : number (default: sharppy.sharptab.constants.MISSING)
+        The fill value of the output
+
+    Returns
+    -------
+    Masked array of wetbulb temperatures (C)
+
+    '''
+    (p, t, td), valid = _valid(p, t, td)
+    p2, t2 = drylift(p, t, td)
+    return _fill(valid, _wetlift_exact(p2, t2, p), missing)
+
+def thetae(p, t, td, missing=MISSING):
+    '''
+    Calculates the equivalent potential temperatures of whole profiles at
+    once. Elements that are masked in any of the inputs are masked in the
+    output.
+
+    Parameters
+    ----------
+    p : array
+        Pressures (hPa)
+    t : array
+        Temperatures (C)
+    td : array
+        Dewpoints (C)
+    missing : number (default: sharppy.sharptab.constants.MISSING)
+        The fill value of the output
+
+    Returns
+    -------
+    Masked array of equivalent potential temperatures (C)
+
+    '''
+    (p, t, td), valid = _valid(p, t, td)
+    p2, t2 = drylift(p, t, td)
+    return _fill(valid, thermo.theta(100., _wetlift_exact(p2, t2, 100.), 1000.), missing)
@@ -0,0 +1,138 @@
+''' Dependency Graph of the Composite Indices '''
+import time
+from sharppy.sharptab import params, winds, interp, utils
+
+__all__ = ['NODES', 'Engine', 'compute']
+
+
+def _sfc_6km(prof):
+    return prof.pres[prof.sfc], interp.pres(prof, interp.to_msl(prof, 6000.))
+
+def _sfc_6km_shear(prof):
+    sfc, p6km = _sfc_6km(prof)
+    return winds.wind_shear(prof, pbot=sfc, ptop=p6km)
+
+def _mean_6km(prof):
+    sfc, p6km = _sfc_6km(prof)
+    return utils.comp2vec(*winds.mean_wind(prof, pbot=sfc, ptop=p6km))
+
+## Every parameter the engine knows about: its name (the same as the
+## ConvectiveProfile attribute that holds it), the parameters it needs
+## and the function that computes it. The function is called with the
+## profile and the values of the needed parameters as keywords named
+## after them.
+NODES = [
+    ('sfcpcl', (), lambda prof: params.parcelx(prof, flag=1)),
+    ('mupcl', (), lambda prof: params.parcelx(prof, flag=3)),
+    ('mlpcl', (), lambda prof: params.parcelx(prof, flag=4)),
+    ('dcape_trace', (), params.dcape),
+    ('dcape', ('dcape_trace',), lambda prof, dcape_trace: dcape_trace[0]),
+    ('thetae', (), lambda prof: prof.get_thetae_profile()),
+    ('pwat', (), params.precip_water),
+    ('totals_totals', (), params.t_totals),
+    ('lapserate_3km', (), lambda prof: params.lapse_rate(prof, 0., 3000., pres=False)),
+    ('sfc_6km_shear', (), _sfc_6km_shear),
+    ('mean_6km', (), _mean_6km),
+    ('tei', (), params.tei),
+    ('thetae_diff', ('thetae',), params.thetae_diff),
+    ('precip_eff', ('pwat',), params.precip_eff),
+    ('sweat', ('totals_totals',), params.sweat),
+    ('esp', ('mlpcl', 'lapserate_3km'), params.esp),
+    ('dcp', ('dcape', 'mupcl', 'sfc_6km_shear', 'mean_6km'), params.dcp),
+    ('mburst', ('sfcpcl', 'lapserate_3km', 'totals_totals', 'dcape', 'pwat', 'thetae_diff'),
+        params.mburst),
+]
+
+
+class Engine(object):
+    '''
+        Computes parameters of a profile by walking the dependency graph in
+        NODES. Each parameter is computed at most once per engine, after the
+        parameters it needs. Parameters the profile already holds are taken
+        from it instead of being computed again.
+
+        Parameters
+        ----------
+        prof : profile object
+        Profile object
+        nodes : list (default: NODES)
+        The (name, inputs, function) entries of the graph
+
+        Attributes
+        ----------
+        values : dictionary
+        The parameters resolved so far
+        timings : dictionary
+        The time (s) spent computing each parameter, not counting the
+        parameters it needs (0 for the ones taken from the profile)
+    '''
+    def __init__(self, prof, nodes=NODES):
+        self._prof = prof
+        self._nodes = dict( (name, (inputs, func)) for name, inputs, func in nodes )
+        self._resolving = set()
+        self.values = {}
+        self.timings = {}
+
+    def get(self, name):
+        '''
+            Returns a parameter, computing it (and whatever it needs) if it
+            hasn't been resolved yet.
+        '''
+        if name in self.values:
+            return self.values[name]
+        if name not in self._nodes:
+            raise ValueError("Unknown parameter '%s'" % name)
+        if name in self._resolving:
+            raise ValueError("Parameter '%s' depends on itself" % name)
+
+        ## Only look at what the profile has already computed, so a lazy
+        ## profile isn't made to compute a whole analysis group
+        if name in self._prof.__dict__:
+            value = self._prof.__dict__[name]
+            self.timings[name] = 0.
+        else:
+            inputs, func = self._nodes[name]
+            self._resolving.add(name)
+            try:
+                kwargs = dict( (inp, self.get(inp)) for inp in inputs )
+            finally:
+                self._resolving.discard(name)
+
+            start = time.time()
+            value = func(self._prof, **kwargs)
+            self.timings[name] = time.time() - start
+
+        self.values[name] = value
+        return value
+
+    def compute(self, names):
+        '''
+            Resolves several parameters.
+
+            Returns
+            -------
+            values : dictionary
+            The requested parameters by name
+        '''
+        return dict( (name, self.get(name)) for name in names )
+
+def compute(prof, names):
+    '''
+        Computes parameters of a profile through a new Engine.
+
+        Parameters
+        ----------
+        prof : profile object
+        Profile object
+        names : list of strings
+        The parameters to compute (see NODES)
+
+        Returns
+        -------
+        values : dictionary
+        The requested parameters by name
+        timings : dictionary
+        The time (s) spent computing each parameter that was resolved
+    '''
+    engine = Engine(prof)
+    return engine.compute(names), engine.timings
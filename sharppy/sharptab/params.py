@@ -2,18 +2,35 @@
 from __future__ import division
 import numpy as np
 import numpy.ma as ma
-from sharppy.sharptab import interp, utils, thermo, winds
+from sharppy.sharptab import interp, utils, thermo, winds, resample, array_thermo, parcel_cache
 from sharppy.sharptab.constants import *
 
 
 __all__ = ['DefineParcel', 'Parcel', 'inferred_temp_advection']
 __all__ += ['k_index', 't_totals', 'c_totals', 'v_totals', 'precip_water']
-__all__ += ['temp_lvl', 'max_temp', 'mean_mixratio', 'mean_theta', 'mean_thetae', 'mean_relh']
+__all__ += ['temp_lvl', 'temp_lvls', 'max_temp', 'mean_mixratio', 'mean_theta', 'mean_thetae', 'mean_relh']
 __all__ += ['lapse_rate', 'most_unstable_level', 'parcelx', 'bulk_rich']
 __all__ += ['bunkers_storm_motion', 'effective_inflow_layer']
 __all__ += ['convective_temp', 'esp', 'pbl_top', 'precip_eff', 'dcape', 'sig_severe']
 __all__ += ['dgz', 'ship', 'stp_cin', 'stp_fixed', 'scp', 'mmp', 'wndg', 'sherb', 'tei', 'cape']
-__all__ += ['mburst', 'dcp', 'ehi', 'sweat', 'hgz', 'lhp']
+__all__ += ['mburst', 'dcp', 'ehi', 'sweat', 'hgz', 'lhp', 'lift_parcels']
+
+
+def _input(prof, kwargs, name, compute):
+    '''
+        Returns an input of one of the composite indices: the keyword argument
+        if it was given, otherwise the profile attribute of the same name,
+        otherwise the value of compute(). Unlike the default of getattr(),
+        compute is only called when the value isn't available already.
+
+        '''
+    value = kwargs.get(name, None)
+    if value is not None:
+        return value
+    try:
+        return getattr(prof, name)
+    except AttributeError:
+        return compute()
 
 
 class DefineParcel(object):
@@ -269,8 +286,7 @@ def hgz(prof):
         Pressure of the top level (mb)
     '''
 
-    pbot = temp_lvl(prof, -10)
-    ptop = temp_lvl(prof, -30)
+    pbot, ptop = temp_lvls(prof, [-10., -30.])[0]
 
     if not utils.QC(pbot):
         pbot = prof.pres[prof.sfc]
@@ -301,8 +317,7 @@ def dgz(prof):
         Pressure of the top level (mb)
     '''
 
-    pbot = temp_lvl(prof, -12)
-    ptop = temp_lvl(prof, -17)
+    pbot, ptop = temp_lvls(prof, [-12., -17.])[0]
 
     if not utils.QC(pbot):
         pbot = prof.pres[prof.sfc]
@@ -411,7 +426,7 @@ def ship(prof, **kwargs):
     mumr = thermo.mixratio(mupcl.pres, mupcl.dwpc)
 
     if not frz_lvl:
-        frz_lvl = interp.hght(prof, temp_lvl(prof, 0))
+        frz_lvl = temp_lvls(prof, [0.])[1][0]
 
     if not h5_temp:
         h5_temp = interp.temp(prof, 500.)
@@ -698,8 +713,17 @@ def precip_water(prof, pbot=None, ptop=400, dp=-1, exact=False):
         p = np.concatenate([[pbot], prof.pres[ind1:ind2+1][mask], [ptop]])
     else:
         dp = -1
-        p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
-        dwpt = interp.dwpt(prof, p)
+        grid = resample.layer(prof, pbot, ptop)
+        if grid is not None:
+            ## Integrate all the way from pbot to ptop, not just between the
+            ## whole-hPa grid levels inside the layer, so thin layers aren't
+            ## cut short
+            p = np.concatenate([[pbot], grid['pres'], [ptop]])
+            dwpt = ma.concatenate([interp.dwpt(prof, np.array([pbot])), grid['dwpc'],
+                interp.dwpt(prof, np.array([ptop]))])
+        else:
+            p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
+            dwpt = interp.dwpt(prof, p)
     w = thermo.mixratio(p, dwpt)
     return (((w[:-1]+w[1:])/2 * (p[:-1]-p[1:])) * 0.00040173).sum()
 
@@ -793,6 +817,107 @@ def inferred_temp_adv(prof, lat=35):
     return temp_adv, pressure_bounds
 
 
+def _find_temp_lvls(prof, temps):
+    '''
+        Finds the first level of each of the temperatures. The profile is
+        compared against all of the temperatures in one array operation, and
+        each temperature is then resolved the same way temp_lvl always has:
+        the first level at exactly that temperature or, failing that, the
+        crossing at the first gap in the levels warmer than it.
+
+        Parameters
+        ----------
+        prof : profile object
+        Profile Object
+        temps : list of numbers
+        Temperatures being searched (C)
+
+        Returns
+        -------
+        Masked array of the first levels of the temperatures (hPa)
+
+        '''
+    temps = np.asarray(temps, dtype=np.float64)
+    nlvls = prof.tmpc.shape[0]
+    difft = prof.tmpc[np.newaxis, :] - temps[:, np.newaxis]
+    warm = ma.filled(difft >= 0, False)
+    cold = ma.filled(difft <= 0, False)
+    exact = warm & cold
+
+    # A gap follows warm level j if the next level isn't warm but one
+    # further up is
+    nxt = np.zeros(warm.shape, dtype=bool)
+    nxt[:, :-1] = warm[:, 1:]
+    above = np.logical_or.accumulate(warm[:, ::-1], axis=1)[:, ::-1]
+    later = np.zeros(warm.shape, dtype=bool)
+    later[:, :-2] = above[:, 2:]
+    gap = warm & ~nxt & later
+    nwarm = np.cumsum(warm, axis=1)
+
+    pres = ma.masked_all(temps.shape)
+    for i in xrange(len(temps)):
+        if not warm[i].any() or not cold[i].any():
+            continue
+        if exact[i].any():
+            pres[i] = prof.pres[np.argmax(exact[i])]
+            continue
+        if gap[i].any():
+            ind = nwarm[i, np.argmax(gap[i])]
+        else:
+            ind = nlvls - 1 - np.argmax(warm[i, ::-1])
+        if ind + 1 >= nlvls:
+            continue
+        pres[i] = np.power(10, np.interp(temps[i], [prof.tmpc[ind+1], prof.tmpc[ind]],
+                                [prof.logp[ind+1], prof.logp[ind]]))
+    return pres
+
+## Temperatures (C) whose levels are found together the first time any
+## temperature level of a profile is asked for
+ISOTHERMS = [0., -10., -12., -17., -20., -30.]
+
+def temp_lvls(prof, temps):
+    '''
+        Calculates the levels (hPa) and heights (m MSL) of the first occurrences
+        of several temperatures. The levels are kept on the profile, and the
+        first search also finds the ISOTHERMS used by parcelx, hgz, dgz and
+        ship, so those all share one pass through the profile.
+
+        Parameters
+        ----------
+        prof : profile object
+        Profile Object
+        temps : list of numbers
+        Temperatures being searched (C)
+
+        Returns
+        -------
+        pres : masked array
+        First levels of the temperatures (hPa)
+        hght : masked array
+        Heights of those levels (m MSL)
+
+        '''
+    lvls = prof.__dict__.get('_temp_lvls', None)
+    if lvls is None:
+        lvls = prof._temp_lvls = {}
+    temps = [ float(temp) for temp in temps ]
+
+    new = sorted(set( temp for temp in ISOTHERMS + temps if temp not in lvls ))
+    if len(new) > 0:
+        new_pres = _find_temp_lvls(prof, new)
+        new_hght = ma.masked_all(new_pres.shape)
+        valid = ~ma.getmaskarray(new_pres)
+        if valid.any():
+            new_hght[valid] = interp.hght(prof, new_pres.data[valid])
+        for temp, p, h in zip(new, new_pres, new_hght):
+            lvls[temp] = (p, h)
+
+    pres = ma.masked_all((len(temps),))
+    hght = ma.masked_all((len(temps),))
+    for i, temp in enumerate(temps):
+        pres[i], hght[i] = lvls[temp]
+    return pres, hght
+
 def temp_lvl(prof, temp):
     '''
         Calculates the level (hPa) of the first occurrence of the specified
@@ -810,23 +935,7 @@ def temp_lvl(prof, temp):
         First Level of the temperature (hPa)
         
         '''
-    difft = prof.tmpc - temp
-    ind1 = ma.where(difft >= 0)[0]
-    ind2 = ma.where(difft <= 0)[0]
-    if len(ind1) == 0 or len(ind2) == 0:
-        return ma.masked
-    inds = np.intersect1d(ind1, ind2)
-    if len(inds) > 0:
-        return prof.pres[inds][0]
-    diff1 = ind1[1:] - ind1[:-1]
-    ind = np.where(diff1 > 1)[0] + 1
-    try:
-        ind = ind.min()
-    except:
-        ind = ind1[-1]
-
-    return np.power(10, np.interp(temp, [prof.tmpc[ind+1], prof.tmpc[ind]],
-                            [prof.logp[ind+1], prof.logp[ind]]))
+    return temp_lvls(prof, [temp])[0][0]
 
 
 def max_temp(prof, mixlayer=100):
@@ -891,9 +1000,13 @@ def mean_relh(prof, pbot=None, ptop=None, dp=-1, exact=False):
         p = np.concatenate([[pbot], prof.pres[ind1:ind2+1][mask], [ptop]])
     else:
         dp = -1
-        p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
-        tmp = interp.temp(prof, p)
-        dwpt = interp.dwpt(prof, p)
+        grid = resample.layer(prof, pbot, ptop)
+        if grid is not None:
+            p, tmp, dwpt = grid['pres'], grid['tmpc'], grid['dwpc']
+        else:
+            p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
+            tmp = interp.temp(prof, p)
+            dwpt = interp.dwpt(prof, p)
     rh = thermo.relh(p, tmp, dwpt)
     return ma.average(rh, weights=p)
 
@@ -945,8 +1058,12 @@ def mean_omega(prof, pbot=None, ptop=None, dp=-1, exact=False):
         thta = tott / num
     else:
         dp = -1
-        p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
-        omeg = interp.omeg(prof, p)
+        grid = resample.layer(prof, pbot, ptop)
+        if grid is not None:
+            p, omeg = grid['pres'], grid['omeg']
+        else:
+            p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
+            omeg = interp.omeg(prof, p)
         omeg = ma.average(omeg, weights=p)
     return omeg
 
@@ -993,8 +1110,12 @@ def mean_mixratio(prof, pbot=None, ptop=None, dp=-1, exact=False):
     
     else:
         dp = -1
-        p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
-        dwpt = interp.dwpt(prof, p)
+        grid = resample.layer(prof, pbot, ptop)
+        if grid is not None:
+            p, dwpt = grid['pres'], grid['dwpc']
+        else:
+            p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
+            dwpt = interp.dwpt(prof, p)
         w = ma.average(thermo.mixratio(p, dwpt))
     return w
 
@@ -1041,13 +1162,17 @@ def mean_thetae(prof, pbot=None, ptop=None, dp=-1, exact=False):
         thtae = tott / num
     else:
         dp = -1
-        p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
-        #temp = interp.temp(prof, p)
-        #dwpt = interp.dwpt(prof, p)
-        #thetae = np.empty(p.shape)
-        #for i in np.arange(0, len(thetae), 1):
-        #   thetae[i] = thermo.thetae(p[i], temp[i], dwpt[i])
-        thetae = interp.thetae(prof, p)
+        grid = resample.layer(prof, pbot, ptop)
+        if grid is not None:
+            p, thetae = grid['pres'], grid['thetae']
+        else:
+            p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
+            #temp = interp.temp(prof, p)
+            #dwpt = interp.dwpt(prof, p)
+            #thetae = np.empty(p.shape)
+            #for i in np.arange(0, len(thetae), 1):
+            #   thetae[i] = thermo.thetae(p[i], temp[i], dwpt[i])
+            thetae = interp.thetae(prof, p)
         thtae = ma.average(thetae, weights=p)
     return thtae
 
@@ -1092,8 +1217,12 @@ def mean_theta(prof, pbot=None, ptop=None, dp=-1, exact=False):
         thta = tott / num
     else:
         dp = -1
-        p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
-        temp = interp.temp(prof, p)
+        grid = resample.layer(prof, pbot, ptop)
+        if grid is not None:
+            p, temp = grid['pres'], grid['tmpc']
+        else:
+            p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
+            temp = interp.temp(prof, p)
         theta = thermo.theta(p, temp)
         thta = ma.average(theta, weights=p)
     return thta
@@ -1177,14 +1306,40 @@ def most_unstable_level(prof, pbot=None, ptop=None, dp=-1, exact=False):
         p = np.concatenate([[pbot], p[mask], [ptop]])
     else:
         dp = -1
-        p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
-        t = interp.temp(prof, p)
-        d = interp.dwpt(prof, p)
+        grid = resample.layer(prof, pbot, ptop)
+        if grid is not None:
+            p, t, d = grid['pres'], grid['tmpc'], grid['dwpc']
+        else:
+            p = np.arange(pbot, ptop+dp, dp, dtype=type(pbot))
+            t = interp.temp(prof, p)
+            d = interp.dwpt(prof, p)
     p2, t2 = thermo.drylift(p, t, d)
     mt = thermo.wetlift(p2, t2, 1000.) # Essentially this is making the Theta-E profile, which we are already doing in the Profile object!
     ind = np.where(np.fabs(mt - np.nanmax(mt)) < TOL)[0]
     return p[ind[0]]
 
+def _log_interpolant(logp, field):
+    '''
+        Returns the (increasing) log10 pressures and the values of a field at
+        the levels where neither is missing, ready for np.interp.
+
+        '''
+    valid = ~(ma.getmaskarray(logp) | ma.getmaskarray(field))
+    return ma.getdata(logp)[valid][::-1], ma.getdata(field)[valid][::-1]
+
+def _eval_interpolant(x, xp, fp):
+    '''
+        Evaluates an interpolant built by _log_interpolant, giving a masked
+        value outside of it.
+
+        '''
+    if not utils.QC(x):
+        return ma.masked
+    val = np.interp(x, xp, fp, left=np.nan, right=np.nan)
+    if np.isnan(val):
+        return ma.masked
+    return val
+
 def parcelTraj(prof, parcel, smu=None, smv=None):
     '''
         Parcel Trajectory Routine (Storm Slinky)
@@ -1246,20 +1401,33 @@ def parcelTraj(prof, parcel, smu=None, smv=None):
     if not utils.QC(elhght):
         elhght = prof.hght[-1]
 
+    # Build the log-pressure interpolants of the environment and parcel
+    # virtual temperatures and of the winds, and the height to log-pressure
+    # table, once instead of at every time step.
+    env_logp, env_tempv = _log_interpolant(prof.logp, prof.vtmp)
+    pcl_logp, pcl_tempv = _log_interpolant(ma.log10(p_parcel), ma.asarray(t_parcel))
+    wnd_logp, wnd_u = _log_interpolant(prof.logp, prof.u)
+    wnd_logp_v, wnd_v = _log_interpolant(prof.logp, prof.v)
+    hght_logp, hght_tab = _log_interpolant(prof.logp, prof.hght)
+    hght_tab, hght_logp = hght_tab[::-1], hght_logp[::-1]
+    sfc_hght = prof.hght[prof.sfc]
+
     while z_0 < elhght:
         t_1 = delta_t + t_0 # the time step increment
+        logp_0 = np.log10(p_0)
         
         # Compute the vertical acceleration
-        env_tempv = interp.vtmp(prof, p_0) + 273.15
-        pcl_tempv = interp.generic_interp_pres(np.log10(p_0), np.log10(p_parcel.copy())[::-1], t_parcel[::-1]) + 273.15
-        accel = g * ((pcl_tempv - env_tempv) / env_tempv)
+        env_tv = _eval_interpolant(logp_0, env_logp, env_tempv) + 273.15
+        pcl_tv = _eval_interpolant(logp_0, pcl_logp, pcl_tempv) + 273.15
+        accel = g * ((pcl_tv - env_tv) / env_tv)
         
         # Compute the vertical displacement
         z_1 = (.5 * accel * np.power(t_1 - t_0, 2)) + (w_0 * (t_1 - t_0)) + z_0
         w_1 = accel * (t_1 - t_0) + w_0
         
         # Compute the parcel-relative winds
-        u, v = interp.components(prof, p_0)
+        u = _eval_interpolant(logp_0, wnd_logp, wnd_u)
+        v = _eval_interpolant(logp_0, wnd_logp_v, wnd_v)
         u_0 = utils.KTS2MS(u - smu)
         v_0 = utils.KTS2MS(v - smv)
         
@@ -1275,7 +1443,7 @@ def parcelTraj(prof, parcel, smu=None, smv=None):
         y_0 = y_1
         x_0 = x_1
         t_0 = t_1
-        p_0 = interp.pres(prof, interp.to_msl(prof, z_1))
+        p_0 = np.power(10, _eval_interpolant(z_1 + sfc_hght, hght_tab, hght_logp))
         
         # Update parcel vertical velocity
         w_0 = w_1
@@ -1285,6 +1453,31 @@ def parcelTraj(prof, parcel, smu=None, smv=None):
     theta = np.degrees(np.arctan2(pos_vector[-1][2],r))
     return pos_vector, theta
 
+def _cached_lift(lift, prof, pbot, ptop, dp, **kwargs):
+    '''
+        Runs one of the parcel lifting routines (_cape or _parcelx) through the
+        parcel cache.
+
+        '''
+    if 'lplvals' not in kwargs:
+        kwargs['lplvals'] = DefineParcel(prof, kwargs.get('flag', 5))
+    lplvals = kwargs['lplvals']
+    pres = kwargs.get('pres', lplvals.pres)
+    tmpc = kwargs.get('tmpc', lplvals.tmpc)
+    dwpc = kwargs.get('dwpc', lplvals.dwpc)
+
+    ## The flag picks the layer of the bulk Richardson number, so parcels
+    ## lifted from the same state with different flags can't share an entry
+    flag = getattr(lplvals, 'flag', None)
+
+    cache = parcel_cache.getCache()
+    key = cache.key(prof, lift.__name__, pres, tmpc, dwpc, pbot, ptop, dp, flag, kwargs.get('cinh_only', False))
+    pcl = cache.get(key, lplvals)
+    if pcl is None:
+        pcl = lift(prof, pbot=pbot, ptop=ptop, dp=dp, **kwargs)
+        cache.put(key, pcl)
+    return pcl
+
 def cape(prof, pbot=None, ptop=None, dp=-1, **kwargs):
     '''        
         Lifts the specified parcel, calculates various levels and parameters from
@@ -1328,16 +1521,32 @@ def cape(prof, pbot=None, ptop=None, dp=-1, **kwargs):
         flag values
         lplvals : lifting parcel layer object (optional)
         Contains the necessary parameters to describe a lifting parcel
+        cinh_only : bool (optional; default = False)
+        Stop lifting once the CINH is complete (above 500 hPa) and the parcel
+        is known to have positive energy. pcl.bminus is unchanged, but
+        pcl.bplus only holds the positive energy found up to that point.
         
+        Lifted parcels are kept in the process-wide parcel cache (see
+        parcel_cache), so lifting the same parcel through the same profile
+        data again returns a copy of the earlier result.
+
         Returns
         -------
         pcl : parcel object
         Parcel Object
     
     '''
-    flag = kwargs.get('flag', 5)
+    return _cached_lift(_cape, prof, pbot, ptop, dp, **kwargs)
+
+def _cape(prof, pbot=None, ptop=None, dp=-1, **kwargs):
+    '''
+        Does the lift for cape(), which looks in the parcel cache first.
+        The lplvals keyword must be given.
+
+        '''
+    cinh_only = kwargs.get('cinh_only', False)
     pcl = Parcel(pbot=pbot, ptop=ptop)
-    pcl.lplvals = kwargs.get('lplvals', DefineParcel(prof, flag))
+    pcl.lplvals = kwargs['lplvals']
     if prof.pres.compressed().shape[0] < 1: return pcl
     
     # Variables
@@ -1424,7 +1633,7 @@ def cape(prof, pbot=None, ptop=None, dp=-1, **kwargs):
     pe1 = pbot
     h1 = interp.hght(prof, pe1)
     te1 = interp.vtmp(prof, pe1)
-    tp1 = thermo.wetlift(pe2, tp2, pe1)
+    tp1 = array_thermo.wetlift(pe2, tp2, pe1)
     lyre = 0
     lyrlast = 0
     for i in xrange(lptr, prof.pres.shape[0]):
@@ -1432,7 +1641,7 @@ def cape(prof, pbot=None, ptop=None, dp=-1, **kwargs):
         pe2 = prof.pres[i]
         h2 = prof.hght[i]
         te2 = prof.vtmp[i]
-        tp2 = thermo.wetlift(pe1, tp1, pe2)
+        tp2 = array_thermo.wetlift(pe1, tp1, pe2)
         tdef1 = (thermo.virtemp(pe1, tp1, tp1) - te1) / thermo.ctok(te1)
         tdef2 = (thermo.virtemp(pe2, tp2, tp2) - te2) / thermo.ctok(te2)
         lyrlast = lyre
@@ -1450,6 +1659,12 @@ def cape(prof, pbot=None, ptop=None, dp=-1, **kwargs):
         h1 = h2
         te1 = te2
         tp1 = tp2
+        # Nothing above 500 hPa adds to the CINH, so stop early if that's all
+        # that's wanted and some positive energy has already been found
+        if cinh_only and pe2 <= 500. and totp > 0 and i < uptr:
+            pcl.bplus = totp
+            pcl.bminus = totn
+            break
         # Is this the top of the specified layer
         if i >= uptr and not utils.QC(pcl.bplus):
             pe3 = pe1
@@ -1467,7 +1682,7 @@ def cape(prof, pbot=None, ptop=None, dp=-1, **kwargs):
             pe2 = ptop
             h2 = interp.hght(prof, pe2)
             te2 = interp.vtmp(prof, pe2)
-            tp2 = thermo.wetlift(pe3, tp3, pe2)
+            tp2 = array_thermo.wetlift(pe3, tp3, pe2)
             tdef3 = (thermo.virtemp(pe3, tp3, tp3) - te3) / thermo.ctok(te3)
             tdef2 = (thermo.virtemp(pe2, tp2, tp2) - te2) / thermo.ctok(te2)
             lyrf = G * (tdef3 + tdef2) / 2. * (h2 - h3)
@@ -1477,6 +1692,155 @@ def cape(prof, pbot=None, ptop=None, dp=-1, **kwargs):
             if pcl.bplus == 0: pcl.bminus = 0.
     return pcl
 
+def lift_parcels(prof, pres, tmpc, dwpc, dp=-1):
+    '''
+        Lifts many parcels at once and calculates their B+/B- through the whole
+        profile. This gives the same values as calling cape() on each of the
+        parcels with the default layer, but the boundary layer CINH is done for
+        all of the parcels in one array operation and the moist ascent goes up
+        the profile one level at a time for all of the parcels together, instead
+        of one Python-level lift per parcel.
+
+        Parameters
+        ----------
+        prof : profile object
+        Profile Object
+        pres : array
+        Pressures of the parcels to lift (hPa)
+        tmpc : array
+        Temperatures of the parcels to lift (C)
+        dwpc : array
+        Dew Points of the parcels to lift (C)
+        dp : negative integer (optional; default = -1)
+        The pressure increment for the interpolated sounding
+
+        Returns
+        -------
+        bplus : masked array
+        CAPE of each parcel (J/kg); masked where cape() wouldn't give one
+        bminus : masked array
+        CINH of each parcel (J/kg); masked where cape() wouldn't give one
+
+    '''
+    pres = ma.asarray(pres, dtype=np.float64)
+    tmpc = ma.asarray(tmpc, dtype=np.float64)
+    dwpc = ma.asarray(dwpc, dtype=np.float64)
+    bplus = ma.masked_all(pres.shape, dtype=np.float64)
+    bminus = ma.masked_all(pres.shape, dtype=np.float64)
+    if prof.pres.compressed().shape[0] < 1: return bplus, bminus
+
+    ptop = prof.pres[prof.pres.shape[0]-1]
+    if type(interp.vtmp(prof, ptop)) == type(ma.masked): return bplus, bminus
+
+    # Only lift the parcels with a valid starting point and bottom layer
+    pbot = ma.minimum(ma.asarray(pres), prof.pres[prof.sfc])
+    ok = ~(ma.getmaskarray(pres) | ma.getmaskarray(tmpc) | ma.getmaskarray(dwpc))
+    ok &= ~ma.getmaskarray(interp.vtmp(prof, pbot))
+    idx = np.where(ok)[0]
+    if idx.size == 0: return bplus, bminus
+    pres, tmpc, dwpc, pbot = pres.data[idx], tmpc.data[idx], dwpc.data[idx], pbot.data[idx]
+
+    # Lift parcels and return LCL pres (hPa) and LCL temp (C)
+    pe2, tp2 = array_thermo.drylift(pres, tmpc, dwpc)
+    blupper = pe2
+    theta_parcel = thermo.theta(pe2, tp2, 1000.)
+    blmr = thermo.mixratio(pres, dwpc)
+
+    # ACCUMULATED CINH IN THE MIXING LAYER BELOW THE LCL
+    # Every parcel's np.arange(pbot, blupper+dp, dp) is a row of one padded
+    # 2D array; the rows are as long as np.arange would make them.
+    nlev = np.maximum(np.ceil(((blupper + dp) - pbot) / dp), 0).astype(int)
+    steps = np.arange(nlev.max()) if nlev.size else np.arange(0)
+    inlayer = steps[np.newaxis, :] < nlev[:, np.newaxis]
+    pp = pbot[:, np.newaxis] + steps[np.newaxis, :] * dp
+    pp = ma.masked_array(np.where(inlayer, pp, pbot[:, np.newaxis]), mask=~inlayer)
+    flat = pp.compressed()
+    hh = ma.masked_all(pp.shape); hh[inlayer] = interp.hght(prof, flat)
+    tmp_env_theta = ma.masked_all(pp.shape); tmp_env_theta[inlayer] = thermo.theta(flat, interp.temp(prof, flat), 1000.)
+    tmp_env_dwpt = ma.masked_all(pp.shape); tmp_env_dwpt[inlayer] = interp.dwpt(prof, flat)
+    tv_env = thermo.virtemp(pp, tmp_env_theta, tmp_env_dwpt)
+    tmp1 = thermo.virtemp(pp, theta_parcel[:, np.newaxis], thermo.temp_at_mixrat(blmr[:, np.newaxis], pp))
+    tdef = (tmp1 - tv_env) / thermo.ctok(tv_env)
+    lyre = G * (tdef[:, :-1]+tdef[:, 1:]) / 2 * (hh[:, 1:]-hh[:, :-1])
+    totn = ma.where(lyre < 0, lyre, 0.).sum(axis=1).filled(0.) if lyre.shape[1] > 0 else np.zeros(idx.size)
+    totp = np.zeros(idx.size)
+    totn = ma.asarray(totn, dtype=np.float64)
+
+    # Move the bottom layer to the top of the boundary layer
+    pbot = np.minimum(pbot, pe2)
+
+    # Check for the case where the LCL is above the
+    # upper boundary of the data (e.g. a dropsonde)
+    keep = ~(pbot < prof.pres[-1])
+    idx, pbot, pe2, tp2, totn, totp = idx[keep], pbot[keep], pe2[keep], tp2[keep], totn[keep], totp[keep]
+    if idx.size == 0: return bplus, bminus
+
+    # Find lowest observation in layer. cape() fails for parcels with no
+    # level above their bottom layer, so those stay masked.
+    above = (pbot[:, np.newaxis] > prof.pres[np.newaxis, :]).filled(False)
+    keep = above.any(axis=1)
+    idx, pbot, pe2, tp2, totn, totp = idx[keep], pbot[keep], pe2[keep], tp2[keep], totn[keep], totp[keep]
+    if idx.size == 0: return bplus, bminus
+    lptr = above[keep].argmax(axis=1)
+    uptr = ma.where(ptop < prof.pres)[0].max()
+
+    # START WITH INTERPOLATED BOTTOM LAYER
+    # Begin moist ascent from lifted parcel LCL (pe2, tp2)
+    pe1 = pbot
+    h1 = interp.hght(prof, pe1)
+    te1 = interp.vtmp(prof, pe1)
+    tp1 = array_thermo.wetlift(pe2, tp2, pe1)
+    final = np.zeros(idx.size, dtype=bool)
+    for i in xrange(lptr.min(), prof.pres.shape[0]):
+        if not utils.QC(prof.tmpc[i]): continue
+        act = np.where((lptr <= i) & ~final)[0]
+        if act.size == 0:
+            if final.all(): break
+            continue
+        pe2 = prof.pres[i]
+        h2 = prof.hght[i]
+        te2 = prof.vtmp[i]
+        tp2 = array_thermo.wetlift(pe1[act], tp1[act], pe2)
+        tdef1 = (thermo.virtemp(pe1[act], tp1[act], tp1[act]) - te1[act]) / thermo.ctok(te1[act])
+        tdef2 = (thermo.virtemp(pe2, tp2, tp2) - te2) / thermo.ctok(te2)
+        lyre = ma.asarray(G * (tdef1 + tdef2) / 2. * (h2 - h1[act]))
+
+        # Add layer energy to total positive if lyre > 0
+        pos = (lyre > 0).filled(False)
+        totp[act[pos]] += lyre[pos]
+        # Add layer energy to total negative if lyre < 0, only up to EL
+        if pe2 > 500.: totn[act[~pos]] = totn[act[~pos]] + lyre[~pos]
+
+        pe1[act] = pe2
+        h1[act] = h2
+        te1[act] = te2
+        tp1[act] = tp2
+        # Is this the top of the specified layer
+        if i >= uptr:
+            lyrf = lyre
+            bp = ma.where(pos, totp[act] - lyrf, totp[act])
+            if pe2 > 500.: bm = ma.where(pos, totn[act], totn[act] + lyrf)
+            else: bm = totn[act]
+            pe3 = pe2
+            h3 = h2
+            te3 = te2
+            tp3 = tp2
+            pe2 = ptop
+            h2 = interp.hght(prof, pe2)
+            te2 = interp.vtmp(prof, pe2)
+            tp2 = array_thermo.wetlift(pe3, tp3, pe2)
+            tdef3 = (thermo.virtemp(pe3, tp3, tp3) - te3) / thermo.ctok(te3)
+            tdef2 = (thermo.virtemp(pe2, tp2, tp2) - te2) / thermo.ctok(te2)
+            lyrf = ma.asarray(G * (tdef3 + tdef2) / 2. * (h2 - h3))
+            up = (lyrf > 0).filled(False)
+            bp = ma.where(up, bp + lyrf, bp)
+            if pe2 > 500.: bm = ma.where(up, bm, bm + lyrf)
+            bm = ma.where(bp == 0, 0., bm)
+            bplus[idx[act]] = bp
+            bminus[idx[act]] = bm
+            final[act] = True
+    return bplus, bminus
+
 def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
     '''
         Lifts the specified parcel, calculated various levels and parameters from
@@ -1509,15 +1873,26 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
         lplvals : lifting parcel layer object (optional)
         Contains the necessary parameters to describe a lifting parcel
         
+        Lifted parcels are kept in the process-wide parcel cache (see
+        parcel_cache), so lifting the same parcel through the same profile
+        data again returns a copy of the earlier result.
+
         Returns
         -------
         pcl : parcel object
         Parcel Object
         
         '''
-    flag = kwargs.get('flag', 5)
+    return _cached_lift(_parcelx, prof, pbot, ptop, dp, **kwargs)
+
+def _parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
+    '''
+        Does the lift for parcelx(), which looks in the parcel cache first.
+        The lplvals keyword must be given.
+
+        '''
     pcl = Parcel(pbot=pbot, ptop=ptop)
-    pcl.lplvals = kwargs.get('lplvals', DefineParcel(prof, flag))
+    pcl.lplvals = kwargs['lplvals']
     if prof.pres.compressed().shape[0] < 1: return pcl
     
     # Variables
@@ -1602,14 +1977,9 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
         pcl.blayer = pbot
     
     # Calculate height of various temperature levels
-    p0c = temp_lvl(prof, 0.)
-    pm10c = temp_lvl(prof, -10.)
-    pm20c = temp_lvl(prof, -20.)
-    pm30c = temp_lvl(prof, -30.)
-    hgt0c = interp.hght(prof, p0c)
-    hgtm10c = interp.hght(prof, pm10c)
-    hgtm20c = interp.hght(prof, pm20c)
-    hgtm30c = interp.hght(prof, pm30c)
+    pres_lvls, hght_lvls = temp_lvls(prof, [0., -10., -20., -30.])
+    p0c, pm10c, pm20c, pm30c = pres_lvls
+    hgt0c, hgtm10c, hgtm20c, hgtm30c = hght_lvls
     pcl.p0c = p0c
     pcl.pm10c = pm10c
     pcl.pm20c = pm20c
@@ -1633,7 +2003,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
     pe1 = pbot
     h1 = interp.hght(prof, pe1)
     te1 = interp.vtmp(prof, pe1)
-    tp1 = thermo.wetlift(pe2, tp2, pe1)
+    tp1 = array_thermo.wetlift(pe2, tp2, pe1)
     lyre = 0
     lyrlast = 0
 
@@ -1648,7 +2018,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
         h2 = prof.hght[i]
         te2 = prof.vtmp[i]
         #te2 = thermo.virtemp(prof.pres[i], prof.tmpc[i], prof.dwpc[i])
-        tp2 = thermo.wetlift(pe1, tp1, pe2)
+        tp2 = array_thermo.wetlift(pe1, tp1, pe2)
         tdef1 = (thermo.virtemp(pe1, tp1, tp1) - te1) / thermo.ctok(te1)
         tdef2 = (thermo.virtemp(pe2, tp2, tp2) - te2) / thermo.ctok(te2)
 
@@ -1698,7 +2068,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
             pe2 = ptop
             h2 = interp.hght(prof, pe2)
             te2 = interp.vtmp(prof, pe2)
-            tp2 = thermo.wetlift(pe3, tp3, pe2)
+            tp2 = array_thermo.wetlift(pe3, tp3, pe2)
             tdef3 = (thermo.virtemp(pe3, tp3, tp3) - te3) / thermo.ctok(te3)
             tdef2 = (thermo.virtemp(pe2, tp2, tp2) - te2) / thermo.ctok(te2)
             lyrf = G * (tdef3 + tdef2) / 2. * (h2 - h3)
@@ -1712,7 +2082,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
             pe3 = pelast
             h3 = interp.hght(prof, pe3)
             te3 = interp.vtmp(prof, pe3)
-            tp3 = thermo.wetlift(pe1, tp1, pe3)
+            tp3 = array_thermo.wetlift(pe1, tp1, pe3)
             lyrf = lyre
             if lyrf > 0.: pcl.bfzl = totp - lyrf
             else: pcl.bfzl = totp
@@ -1720,7 +2090,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
                 pcl.bfzl = 0
             elif utils.QC(pe2):
                 te2 = interp.vtmp(prof, pe2)
-                tp2 = thermo.wetlift(pe3, tp3, pe2)
+                tp2 = array_thermo.wetlift(pe3, tp3, pe2)
                 tdef3 = (thermo.virtemp(pe3, tp3, tp3) - te3) / \
                     thermo.ctok(te3)
                 tdef2 = (thermo.virtemp(pe2, tp2, tp2) - te2) / \
@@ -1733,7 +2103,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
             pe3 = pelast
             h3 = interp.hght(prof, pe3)
             te3 = interp.vtmp(prof, pe3)
-            tp3 = thermo.wetlift(pe1, tp1, pe3)
+            tp3 = array_thermo.wetlift(pe1, tp1, pe3)
             lyrf = lyre
             if lyrf > 0.: pcl.wm10c = totp - lyrf
             else: pcl.wm10c = totp
@@ -1741,7 +2111,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
                 pcl.wm10c = 0
             elif utils.QC(pe2):
                 te2 = interp.vtmp(prof, pe2)
-                tp2 = thermo.wetlift(pe3, tp3, pe2)
+                tp2 = array_thermo.wetlift(pe3, tp3, pe2)
                 tdef3 = (thermo.virtemp(pe3, tp3, tp3) - te3) / \
                     thermo.ctok(te3)
                 tdef2 = (thermo.virtemp(pe2, tp2, tp2) - te2) / \
@@ -1754,7 +2124,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
             pe3 = pelast
             h3 = interp.hght(prof, pe3)
             te3 = interp.vtmp(prof, pe3)
-            tp3 = thermo.wetlift(pe1, tp1, pe3)
+            tp3 = array_thermo.wetlift(pe1, tp1, pe3)
             lyrf = lyre
             if lyrf > 0.: pcl.wm20c = totp - lyrf
             else: pcl.wm20c = totp
@@ -1762,7 +2132,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
                 pcl.wm20c = 0
             elif utils.QC(pe2):
                 te2 = interp.vtmp(prof, pe2)
-                tp2 = thermo.wetlift(pe3, tp3, pe2)
+                tp2 = array_thermo.wetlift(pe3, tp3, pe2)
                 tdef3 = (thermo.virtemp(pe3, tp3, tp3) - te3) / \
                     thermo.ctok(te3)
                 tdef2 = (thermo.virtemp(pe2, tp2, tp2) - te2) / \
@@ -1775,7 +2145,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
             pe3 = pelast
             h3 = interp.hght(prof, pe3)
             te3 = interp.vtmp(prof, pe3)
-            tp3 = thermo.wetlift(pe1, tp1, pe3)
+            tp3 = array_thermo.wetlift(pe1, tp1, pe3)
             lyrf = lyre
             if lyrf > 0.: pcl.wm30c = totp - lyrf
             else: pcl.wm30c = totp
@@ -1783,7 +2153,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
                 pcl.wm30c = 0
             elif utils.QC(pe2):
                 te2 = interp.vtmp(prof, pe2)
-                tp2 = thermo.wetlift(pe3, tp3, pe2)
+                tp2 = array_thermo.wetlift(pe3, tp3, pe2)
                 tdef3 = (thermo.virtemp(pe3, tp3, tp3) - te3) / \
                     thermo.ctok(te3)
                 tdef2 = (thermo.virtemp(pe2, tp2, tp2) - te2) / \
@@ -1797,7 +2167,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
                 pe3 = pelast
                 h3 = interp.hght(prof, pe3)
                 te3 = interp.vtmp(prof, pe3)
-                tp3 = thermo.wetlift(pe1, tp1, pe3)
+                tp3 = array_thermo.wetlift(pe1, tp1, pe3)
                 lyrf = lyre
                 if lyrf > 0: pcl.b3km = totp - lyrf
                 else: pcl.b3km = totp
@@ -1805,7 +2175,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
                 pe4 = interp.pres(prof, h4)
                 if utils.QC(pe2):
                     te2 = interp.vtmp(prof, pe4)
-                    tp2 = thermo.wetlift(pe3, tp3, pe4)
+                    tp2 = array_thermo.wetlift(pe3, tp3, pe4)
                     tdef3 = (thermo.virtemp(pe3, tp3, tp3) - te3) / \
                         thermo.ctok(te3)
                     tdef2 = (thermo.virtemp(pe4, tp2, tp2) - te2) / \
@@ -1820,7 +2190,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
                 pe3 = pelast
                 h3 = interp.hght(prof, pe3)
                 te3 = interp.vtmp(prof, pe3)
-                tp3 = thermo.wetlift(pe1, tp1, pe3)
+                tp3 = array_thermo.wetlift(pe1, tp1, pe3)
                 lyrf = lyre
                 if lyrf > 0: pcl.b6km = totp - lyrf
                 else: pcl.b6km = totp
@@ -1828,7 +2198,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
                 pe4 = interp.pres(prof, h4)
                 if utils.QC(pe2):
                     te2 = interp.vtmp(prof, pe4)
-                    tp2 = thermo.wetlift(pe3, tp3, pe4)
+                    tp2 = array_thermo.wetlift(pe3, tp3, pe4)
                     tdef3 = (thermo.virtemp(pe3, tp3, tp3) - te3) / \
                         thermo.ctok(te3)
                     tdef2 = (thermo.virtemp(pe4, tp2, tp2) - te2) / \
@@ -1845,7 +2215,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
             #te3 = te1
             pe2 = pe1
             pe3 = pelast
-            if interp.vtmp(prof, pe3) < thermo.virtemp(pe3, thermo.wetlift(pe2, tp3, pe3), thermo.wetlift(pe2, tp3, pe3)):
+            if interp.vtmp(prof, pe3) < thermo.virtemp(pe3, array_thermo.wetlift(pe2, tp3, pe3), array_thermo.wetlift(pe2, tp3, pe3)):
                 # Found an LFC, store height/pres and reset EL/MPL
                 pcl.lfcpres = pe3
                 pcl.lfchght = interp.to_agl(prof, interp.hght(prof, pe3))
@@ -1853,7 +2223,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
                 pcl.elhght = ma.masked
                 pcl.mplpres = ma.masked
             else:
-                while interp.vtmp(prof, pe3) > thermo.virtemp(pe3, thermo.wetlift(pe2, tp3, pe3), thermo.wetlift(pe2, tp3, pe3)) and pe3 > 0:
+                while interp.vtmp(prof, pe3) > thermo.virtemp(pe3, array_thermo.wetlift(pe2, tp3, pe3), array_thermo.wetlift(pe2, tp3, pe3)) and pe3 > 0:
                     pe3 -= 5
                 if pe3 > 0:
                     # Found a LFC, store height/pres and reset EL/MPL
@@ -1881,7 +2251,7 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
             #te3 = te1
             pe2 = pe1
             pe3 = pelast
-            while interp.vtmp(prof, pe3) < thermo.virtemp(pe3, thermo.wetlift(pe2, tp3, pe3), thermo.wetlift(pe2, tp3, pe3)):
+            while interp.vtmp(prof, pe3) < thermo.virtemp(pe3, array_thermo.wetlift(pe2, tp3, pe3), array_thermo.wetlift(pe2, tp3, pe3)):
                 pe3 -= 5
             pcl.elpres = pe3
             pcl.elhght = interp.to_agl(prof, interp.hght(prof, pcl.elpres))
@@ -1894,13 +2264,13 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
             pe3 = pelast
             h3 = interp.hght(prof, pe3)
             te3 = interp.vtmp(prof, pe3)
-            tp3 = thermo.wetlift(pe1, tp1, pe3)
+            tp3 = array_thermo.wetlift(pe1, tp1, pe3)
             totx = tote - lyre
             pe2 = pelast
             while totx > 0:
                 pe2 -= 1
                 te2 = interp.vtmp(prof, pe2)
-                tp2 = thermo.wetlift(pe3, tp3, pe2)
+                tp2 = array_thermo.wetlift(pe3, tp3, pe2)
                 h2 = interp.hght(prof, pe2)
                 tdef3 = (thermo.virtemp(pe3, tp3, tp3) - te3) / \
                     thermo.ctok(te3)
@@ -1917,13 +2287,13 @@ def parcelx(prof, pbot=None, ptop=None, dp=-1, **kwargs):
         # 500 hPa Lifted Index
         if prof.pres[i] <= 500. and not utils.QC(pcl.li5):
             a = interp.vtmp(prof, 500.)
-            b = thermo.wetlift(pe1, tp1, 500.)
+            b = array_thermo.wetlift(pe1, tp1, 500.)
             pcl.li5 = a - thermo.virtemp(500, b, b)
         
         # 300 hPa Lifted Index
         if prof.pres[i] <= 300. and not utils.QC(pcl.li3):
             a = interp.vtmp(prof, 300.)
-            b = thermo.wetlift(pe1, tp1, 300.)
+            b = array_thermo.wetlift(pe1, tp1, 300.)
             pcl.li3 = a - thermo.virtemp(300, b, b)
     
 #    pcl.bminus = cinh_old
@@ -2053,23 +2423,23 @@ def effective_inflow_layer(prof, ecape=100, ecinh=-250, **kwargs):
     ptop = ma.masked
     if mucape != 0:
         if mucape >= ecape and mucinh > ecinh:
-            # Begin at surface and search upward for effective surface
-            for i in xrange(prof.sfc, prof.top):
-                pcl = cape(prof, pres=prof.pres[i], tmpc=prof.tmpc[i], dwpc=prof.dwpc[i])
-                if pcl.bplus >= ecape and pcl.bminus > ecinh:
-                    pbot = prof.pres[i]
-                    break
+            # Lift the parcels of every level from the surface up at once
+            bplus, bminus = lift_parcels(prof, prof.pres[prof.sfc:prof.top],
+                prof.tmpc[prof.sfc:prof.top], prof.dwpc[prof.sfc:prof.top])
+            inflow = (bplus >= ecape).filled(False) & (bminus > ecinh).filled(False)
+            outflow = (bplus < ecape).filled(False) | (bminus <= ecinh).filled(False)
 
-            if not utils.QC(pbot): 
+            # Begin at surface and search upward for effective surface
+            if not inflow.any():
                 return ma.masked, ma.masked
+            bptr = prof.sfc + inflow.argmax()
+            pbot = prof.pres[bptr]
 
-            bptr = i
             # Keep searching upward for the effective top
             for i in xrange(bptr+1, prof.top):
                 if not prof.dwpc[i] or not prof.tmpc[i]:
                     continue
-                pcl = cape(prof, pres=prof.pres[i], tmpc=prof.tmpc[i], dwpc=prof.dwpc[i])
-                if pcl.bplus < ecape or pcl.bminus <= ecinh: #Is this a potential "top"?
+                if outflow[i - prof.sfc]: #Is this a potential "top"?
                     j = 1
                     while not utils.QC(prof.dwpc[i-j]) and not utils.QC(prof.tmpc[i-j]):
                         j += 1
@@ -2153,8 +2523,10 @@ def bunkers_storm_motion(prof, **kwargs):
 def convective_temp(prof, **kwargs):
     '''
         Computes the convective temperature, assuming no change in the moisture
-        profile. Parcels are iteratively lifted until only mincinh is left as a
-        cap. The first guess is the observed surface temperature.
+        profile. The temperature that leaves only mincinh as a cap is found by
+        bisection between the first guess (the observed surface temperature)
+        and the first guess + 25 C. Each probe only lifts the parcel far enough
+        to get its CINH.
         
         Parameters
         ----------
@@ -2168,6 +2540,8 @@ def convective_temp(prof, **kwargs):
         Temperature of parcel to lift (C)
         dwpc : number (optional)
         Dew Point of parcel to lift (C)
+        tol : number (optional; default 0.1)
+        Tolerance of the convective temperature (C)
         
         Returns
         -------
@@ -2175,25 +2549,36 @@ def convective_temp(prof, **kwargs):
         
         '''
     mincinh = kwargs.get('mincinh', 0.)
+    tol = kwargs.get('tol', 0.1)
     mmr = mean_mixratio(prof)
     pres = kwargs.get('pres', prof.pres[prof.sfc])
     tmpc = kwargs.get('tmpc', prof.tmpc[prof.sfc])
     dwpc = kwargs.get('dwpc', thermo.temp_at_mixrat(mmr, pres))
     
     # Do a quick search to fine whether to continue. If you need to heat
-    # up more than 25C, don't compute.
-    pcl = cape(prof, flag=5, pres=pres, tmpc=tmpc+25., dwpc=dwpc)
-    if pcl.bplus == 0. or pcl.bminus < mincinh: return ma.masked
+    # up more than 25C, don't compute. The first guess is lifted along
+    # with it.
     excess = dwpc - tmpc
+    tmpc_25 = tmpc + 25.
     if excess > 0: tmpc = tmpc + excess + 4.
-    pcl = cape(prof, flag=5, pres=pres, tmpc=tmpc, dwpc=dwpc)
-    if pcl.bplus == 0.: pcl.bminus = ma.masked
-    while pcl.bminus < mincinh:
-        if pcl.bminus < -100: tmpc += 2.
-        else: tmpc += 0.5
-        pcl = cape(prof, flag=5, pres=pres, tmpc=tmpc, dwpc=dwpc)
-        if pcl.bplus == 0.: pcl.bminus = ma.masked
-    return tmpc
+    bplus, bminus = lift_parcels(prof, [pres, pres], [tmpc_25, tmpc], [dwpc, dwpc])
+    if bplus[0] == 0. or bminus[0] < mincinh: return ma.masked
+
+    # A parcel with no positive energy ends the search the same way as one
+    # that's been heated past the cap.
+    def capped(bplus, bminus):
+        if bplus == 0.: return False
+        return bool(bminus < mincinh)
+
+    lo = tmpc
+    if not capped(bplus[1], bminus[1]): return lo
+    hi = max(tmpc_25, lo + tol)
+    while hi - lo > tol:
+        mid = (lo + hi) / 2.
+        pcl = cape(prof, flag=5, pres=pres, tmpc=mid, dwpc=dwpc, cinh_only=True)
+        if capped(pcl.bplus, pcl.bminus): lo = mid
+        else: hi = mid
+    return hi
 
 def tei(prof):
     '''
@@ -2243,6 +2628,7 @@ def esp(prof, **kwargs):
         ----------
         prof : Profile object
         mlpcl : Mixed-Layer Parcel object (optional)
+        lapserate_3km : 0-3 km lapse rate (optional; C/km)
 
         Returns
         -------
@@ -2257,7 +2643,7 @@ def esp(prof, **kwargs):
             mlpcl = parcelx(prof, flag=4)
     mlcape = mlpcl.b3km
     
-    lr03 = prof.lapserate_3km # C/km
+    lr03 = _input(prof, kwargs, 'lapserate_3km', lambda: lapse_rate(prof, 0., 3000., pres=False)) # C/km
     if lr03 < 7. or mlpcl.bplus < 250.:
         return 0
     esp = (mlcape / 50.) * ((lr03 - 7.0) / (1.0))
@@ -2320,14 +2706,10 @@ def sherb(prof, **kwargs):
             # or doesn't exist in the Profile object we need to calculate it, but we need mupcl
             if ebottom is None or etop is None:
                 #only calculate ebottom and etop if they're not supplied by the kwargs
-                if not hasattr(prof, 'mupcl') or not kwargs.get('mupcl', None):
-                    # If the mupcl attribute doesn't exist in the Profile
-                    # or the mupcl hasn't been passed as an argument
-                    # compute the mupcl
-                    mulplvals = DefineParcel(prof, flag=3, pres=300)
-                    mupcl = cape(prof, lplvals=mulplvals)
-                else:
-                    mupcl = prof.mupcl
+                # Use the mupcl passed as an argument or kept in the Profile,
+                # and only compute it if there's neither
+                mupcl = _input(prof, kwargs, 'mupcl',
+                    lambda: cape(prof, lplvals=DefineParcel(prof, flag=3, pres=300)))
            
                 # Calculate the effective inflow layer
                 ebottom, etop = effective_inflow_layer( prof, mupcl=mupcl )
@@ -2556,14 +2938,19 @@ def dcape(prof):
     tmpc = prof.tmpc[~mask]
     idx = np.where(pres >= sfc_pres - 400.)[0]
 
-    # Find the minimum average theta-e in a 100 mb layer
-    mine = 1000.0
+    # Find the minimum average theta-e in a 100 mb layer. The means of all
+    # of the layers come from the prefix sums of the 1 hPa grid at once.
+    means = resample.layer_means(prof, pres[idx], pres[idx]-100., 'thetae')
+    if means is None:
+        means = ma.masked_all(idx.shape)
+        for j, i in enumerate(idx):
+            means[j] = mean_thetae(prof, pbot=pres[i], ptop=pres[i]-100.)
+    else:
+        # As in mean_thetae, a layer with no temperature at its top is missing
+        means[ma.getmaskarray(interp.temp(prof, pres[idx]-100.))] = ma.masked
     minp = -999.0
-    for i in idx:
-        thta_e_mean = mean_thetae(prof, pbot=pres[i], ptop=pres[i]-100.)
-        if utils.QC(thta_e_mean) and thta_e_mean < mine:
-            minp = pres[i] - 50.
-            mine = thta_e_mean
+    if means.count() > 0:
+        minp = pres[idx][ma.argmin(means)] - 50.
 
     upper = minp
     uptr = np.where(pres >= upper)[0]
@@ -2571,45 +2958,24 @@ def dcape(prof):
     
     # Define parcel starting point
     tp1 = thermo.wetbulb(upper, interp.temp(prof, upper), interp.dwpt(prof, upper))
-    pe1 = upper
-    te1 = interp.temp(prof, pe1)
-    h1 = interp.hght(prof, pe1)
-    tote = 0
-    lyre = 0
-
-    # To keep track of the parcel trace from the downdraft
-    ttrace = [tp1] 
-    ptrace = [upper]
-
-    # Lower the parcel to the surface moist adiabatically and compute
-    # total energy (DCAPE)
-    iter_ranges = xrange(uptr, -1, -1)
-    ttraces = ma.zeros(len(iter_ranges))
-    ptraces = ma.zeros(len(iter_ranges))
-    ttraces[:] = ptraces[:] = ma.masked
-    for i in iter_ranges:
-        pe2 = pres[i]
-        te2 = tmpc[i]
-        h2 = hght[i]
-        tp2 = thermo.wetlift(pe1, tp1, pe2)
-
-        if utils.QC(te1) and utils.QC(te2):
-            tdef1 = (tp1 - te1) / (thermo.ctok(te1))
-            tdef2 = (tp2 - te2) / (thermo.ctok(te2))
-            lyrlast = lyre
-            lyre = 9.8 * (tdef1 + tdef2) / 2.0 * (h2 - h1)
-            tote += lyre
 
-        ttraces[i] = tp2
-        ptraces[i] = pe2
+    # Lower the parcel to the surface moist adiabatically, level to level
+    # (each step starts from the last one, as the downdraft trace always
+    # has), then compute the total energy (DCAPE) over the whole trace
+    ptrace = ma.concatenate(([upper], pres[uptr::-1]))
+    ttrace = ma.masked_all(ptrace.shape)
+    ttrace[0] = tp1
+    for k in xrange(1, len(ptrace)):
+        ttrace[k] = thermo.wetlift(ptrace[k-1], ttrace[k-1], ptrace[k])
+    te = ma.concatenate(([interp.temp(prof, upper)], tmpc[uptr::-1]))
+    h = ma.concatenate(([interp.hght(prof, upper)], hght[uptr::-1]))
 
-        pe1 = pe2
-        te1 = te2
-        h1 = h2
-        tp1 = tp2
-    drtemp = tp2 # Downrush temp in Celsius
+    tdef = (ttrace - te) / thermo.ctok(te)
+    lyre = 9.8 * (tdef[:-1] + tdef[1:]) / 2.0 * (h[1:] - h[:-1])
+    tote = lyre.sum() if lyre.count() > 0 else 0
+    drtemp = ttrace[-1] # Downrush temp in Celsius
 
-    return tote, ma.concatenate((ttrace, ttraces[::-1])), ma.concatenate((ptrace, ptraces[::-1]))
+    return tote, ttrace, ptrace
 
 def precip_eff(prof, **kwargs):
     '''
@@ -2640,14 +3006,9 @@ def precip_eff(prof, **kwargs):
 
     '''
     
-    pw = kwargs.get('pwat', None)
     pbot = kwargs.get('pbot', 1000)
     ptop = kwargs.get('ptop', 700)
-
-    if pw is None or not hasattr(prof, 'pwat'):
-        pw = precip_water(prof)
-    else:
-        pw = prof.pwat
+    pw = _input(prof, kwargs, 'pwat', lambda: precip_water(prof))
 
     mean_rh = mean_relh(prof, pbot=pbot, ptop=ptop) / 100.
 
@@ -2684,7 +3045,7 @@ def pbl_top(prof):
 
     return prof.pres[level]
 
-def dcp(prof):
+def dcp(prof, **kwargs):
     '''
         Derecho Composite Parameter
 
@@ -2707,6 +3068,10 @@ def dcp(prof):
         Parameters
         ----------
         prof : Profile object
+        dcape : (optional) DCAPE (J/kg)
+        mupcl : (optional) Most-Unstable Parcel object
+        sfc_6km_shear : (optional) 0-6 km shear components (kts)
+        mean_6km : (optional) 0-6 km mean wind direction and speed (kts)
 
         Returns
         -------
@@ -2716,10 +3081,10 @@ def dcp(prof):
     '''
     sfc = prof.pres[prof.sfc]
     p6km = interp.pres(prof, interp.to_msl(prof, 6000.))
-    dcape_val = getattr(prof, 'dcape', dcape( prof )[0])
-    mupcl = getattr(prof, 'mupcl', parcelx(prof, flag=1))
-    sfc_6km_shear = getattr(prof, 'sfc_6km_shear', winds.wind_shear(prof, pbot=sfc, ptop=p6km))
-    mean_6km = getattr(prof, 'mean_6km', utils.comp2vec(*winds.mean_wind(prof, pbot=sfc, ptop=p6km)))
+    dcape_val = _input(prof, kwargs, 'dcape', lambda: dcape( prof )[0])
+    mupcl = _input(prof, kwargs, 'mupcl', lambda: parcelx(prof, flag=1))
+    sfc_6km_shear = _input(prof, kwargs, 'sfc_6km_shear', lambda: winds.wind_shear(prof, pbot=sfc, ptop=p6km))
+    mean_6km = _input(prof, kwargs, 'mean_6km', lambda: utils.comp2vec(*winds.mean_wind(prof, pbot=sfc, ptop=p6km)))
     mag_shear = utils.mag(sfc_6km_shear[0], sfc_6km_shear[1])
     mag_mean_wind = mean_6km[1]
 
@@ -2728,7 +3093,7 @@ def dcp(prof):
     return dcp
 
 
-def mburst(prof):
+def mburst(prof, **kwargs):
     '''
         Microburst Composite Index
 
@@ -2749,6 +3114,12 @@ def mburst(prof):
         Parameters
         ----------
         prof : Profile object
+        sfcpcl : (optional) Surface-Based Parcel object
+        lapserate_3km : (optional) 0-3 km lapse rate (C/km)
+        totals_totals : (optional) Total Totals Index
+        dcape : (optional) DCAPE (J/kg)
+        pwat : (optional) precipitable water vapor (inch)
+        thetae_diff : (optional) Theta-E difference in the lowest 3 km (K)
 
         Returns
         -------
@@ -2756,12 +3127,14 @@ def mburst(prof):
             Microburst Composite (unitless)
     '''
 
-    sbpcl = getattr(prof, 'sfcpcl', parcelx(prof, flag=1))
-    lr03 = getattr(prof, 'lapserate_3km', lapse_rate( prof, 0., 3000., pres=False ))
-    tt = getattr(prof, 'totals_totals', t_totals( prof ))
-    dcape_val = getattr(prof, 'dcape', dcape( prof )[0])
-    pwat = getattr(prof, 'pwat', precip_water( prof ))
-    tei_val = thetae_diff(prof)
+    sbpcl = _input(prof, kwargs, 'sfcpcl', lambda: parcelx(prof, flag=1))
+    lr03 = _input(prof, kwargs, 'lapserate_3km', lambda: lapse_rate( prof, 0., 3000., pres=False ))
+    tt = _input(prof, kwargs, 'totals_totals', lambda: t_totals( prof ))
+    dcape_val = _input(prof, kwargs, 'dcape', lambda: dcape( prof )[0])
+    pwat = _input(prof, kwargs, 'pwat', lambda: precip_water( prof ))
+    tei_val = kwargs.get('thetae_diff', None)
+    if tei_val is None:
+        tei_val = thetae_diff(prof)
 
     sfc_thetae = thermo.thetae(sbpcl.lplvals.pres, sbpcl.lplvals.tmpc, sbpcl.lplvals.dwpc)
 
@@ -2895,7 +3268,7 @@ def ehi(prof, pcl, hbot, htop, stu=0, stv=0):
 
     return ehi
 
-def sweat(prof):
+def sweat(prof, **kwargs):
     '''
         SWEAT Index
 
@@ -2911,6 +3284,7 @@ def sweat(prof):
         Parameters
         ----------
         prof : Profile object
+        totals_totals : (optional) Total Totals Index
 
         Returns
         -------
@@ -2921,7 +3295,7 @@ def sweat(prof):
     td850 = interp.dwpt(prof, 850)
     vec850 = interp.vec(prof, 850)
     vec500 = interp.vec(prof, 500)
-    tt = getattr(prof, 'totals_totals', t_totals( prof ))
+    tt = _input(prof, kwargs, 'totals_totals', lambda: t_totals( prof ))
 
     if td850 > 0:
         term1 = 12. * td850
@@ -2945,7 +3319,7 @@ def sweat(prof):
     return sweat
 
 
-def thetae_diff(prof):
+def thetae_diff(prof, **kwargs):
     '''
         thetae_diff()
 
@@ -2958,13 +3332,14 @@ def thetae_diff(prof):
         Parameters
         ----------
         prof : Profile object
+        thetae : (optional) Theta-E profile (K)
 
         Returns
         -------
         thetae_diff : the Theta-E difference between the max and min values (K)
     '''
 
-    thetae = getattr(prof, 'thetae', prof.get_thetae_profile())
+    thetae = _input(prof, kwargs, 'thetae', lambda: prof.get_thetae_profile())
     idx = np.where(interp.to_agl(prof, prof.hght) <= 3000)[0]
     maxe_idx = np.ma.argmax(thetae[idx])
     mine_idx = np.ma.argmin(thetae[idx])
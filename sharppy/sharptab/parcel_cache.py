@@ -0,0 +1,143 @@
+''' Cache of Lifted Parcels '''
+import copy
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import numpy.ma as ma
+from sharppy.sharptab import utils
+
+__all__ = ['ParcelCache', 'getCache', 'fingerprint']
+
+MAX_ENTRIES = 256
+
+## Profile arrays that the parcel lifting routines read
+FIELDS = [ 'pres', 'hght', 'tmpc', 'dwpc', 'u', 'v' ]
+
+
+def fingerprint(prof):
+    '''
+        Returns a digest of the profile arrays a lifted parcel depends on
+        (values and masks). It's recomputed on every lookup, so a profile
+        that's been edited in place or made by Profile.copy with new data
+        never matches parcels lifted through the old data.
+
+        Parameters
+        ----------
+        prof : profile object
+        Profile object
+
+        Returns
+        -------
+        fingerprint : string
+    '''
+    digest = hashlib.md5()
+    for field in FIELDS:
+        arr = prof.__dict__.get(field, None)
+        if arr is None:
+            digest.update(field + ':none')
+            continue
+        arr = ma.asarray(arr, dtype=np.float64)
+        digest.update(field)
+        digest.update(np.ascontiguousarray(ma.getdata(arr)).tobytes())
+        digest.update(np.ascontiguousarray(ma.getmaskarray(arr)).tobytes())
+    return digest.hexdigest()
+
+def _detach(pcl):
+    '''
+        Returns a deep copy of a parcel (trace arrays included) that shares
+        only its lplvals with the original.
+    '''
+    if pcl is ma.masked:
+        return pcl
+    lplvals = pcl.__dict__.get('lplvals', None)
+    memo = {} if lplvals is None else {id(lplvals):lplvals}
+    return copy.deepcopy(pcl, memo)
+
+def _val(val):
+    if val is None or not utils.QC(val):
+        return None
+    return float(val)
+
+class ParcelCache(object):
+    '''
+        A least recently used cache of lifted parcels keyed by the profile
+        fingerprint, the lifting routine and the lifting state (pres, tmpc,
+        dwpc, pbot, ptop, dp and any other options of the routine).
+
+        Parameters
+        ----------
+        max_entries : int (default: 256)
+        The number of parcels kept before the least recently used ones are
+        dropped
+    '''
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, prof, routine, pres, tmpc, dwpc, pbot, ptop, dp, *options):
+        '''
+            Builds the cache key of a lift.
+        '''
+        return (fingerprint(prof), routine, _val(pres), _val(tmpc), _val(dwpc),
+            _val(pbot), _val(ptop), dp) + options
+
+    def get(self, key, lplvals=None):
+        '''
+            Looks up a lifted parcel.
+
+            Returns
+            -------
+            pcl : parcel object or None
+            A deep copy of the cached parcel (so callers can change it and
+            its arrays freely), with its lplvals set to the ones given, or
+            None on a cache miss.
+        '''
+        try:
+            pcl = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries[key] = pcl
+        self.hits += 1
+
+        if pcl is ma.masked:
+            return pcl
+        pcl = _detach(pcl)
+        if lplvals is not None:
+            pcl.lplvals = lplvals
+        return pcl
+
+    def put(self, key, pcl):
+        '''
+            Stores a lifted parcel, dropping the least recently used ones
+            if the cache is full. The cache keeps its own deep copy, so the
+            caller can go on changing the parcel it passed in.
+        '''
+        self._entries.pop(key, None)
+        self._entries[key] = _detach(pcl)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        '''
+            Returns the number of hits, misses and cached parcels.
+        '''
+        return {'hits':self.hits, 'misses':self.misses, 'size':len(self._entries)}
+
+_cache = None
+
+def getCache():
+    '''
+        Returns the process-wide parcel cache.
+    '''
+    global _cache
+    if _cache is None:
+        _cache = ParcelCache()
+    return _cache
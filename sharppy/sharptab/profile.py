@@ -4,7 +4,8 @@ import numpy as np
 import numpy.ma as ma
 import getpass
 from datetime import datetime
-from sharppy.sharptab import utils, winds, params, interp, thermo, watch_type, fire
+from sharppy.sharptab import utils, winds, params, interp, thermo, watch_type, fire, array_thermo
+from sharppy.sharptab import param_graph
 import sharppy.io.qc_tools as qc_tools
 from sharppy.databases.sars import hail, supercell
 from sharppy.databases.pwv import pwv_climo
@@ -149,6 +150,10 @@ class Profile(object):
         else:   
             new_kwargs.update({'wspd':prof.wspd, 'wdir':prof.wdir})
 
+        ## A lazy profile copies to a lazy profile
+        if prof.__dict__.get('lazy', False):
+            new_kwargs['lazy'] = True
+
         new_kwargs.update(kwargs)
         return cls(**new_kwargs)
 
@@ -357,13 +362,7 @@ class BasicProfile(Profile):
             -------
             Array of wet bulb profile
             '''
-        
-        wetbulb = ma.empty(self.pres.shape[0])
-        for i in range(len(self.v)):
-            wetbulb[i] = thermo.wetbulb( self.pres[i], self.tmpc[i], self.dwpc[i] )
-        wetbulb[wetbulb == self.missing] = ma.masked
-        wetbulb.set_fill_value(self.missing)
-        return wetbulb
+        return array_thermo.wetbulb(self.pres, self.tmpc, self.dwpc, missing=self.missing)
     
     def get_theta_profile(self):
         '''
@@ -377,9 +376,7 @@ class BasicProfile(Profile):
             -------
             Array of theta profile
             '''
-        theta = ma.empty(self.pres.shape[0])
-        for i in range(len(self.v)):
-            theta[i] = thermo.theta(self.pres[i], self.tmpc[i])
+        theta = ma.masked_array(thermo.theta(self.pres, self.tmpc), dtype=np.float64)
         theta[theta == self.missing] = ma.masked
         theta.set_fill_value(self.missing)
         theta = thermo.ctok(theta)
@@ -397,9 +394,7 @@ class BasicProfile(Profile):
             -------
             Array of theta-e profile
             '''
-        thetae = ma.empty(self.pres.shape[0])
-        for i in range(len(self.v)):
-            thetae[i] = thermo.ctok( thermo.thetae(self.pres[i], self.tmpc[i], self.dwpc[i]) )
+        thetae = thermo.ctok( array_thermo.thetae(self.pres, self.tmpc, self.dwpc, missing=self.missing) )
         thetae[thetae == self.missing] = ma.masked
         thetae.set_fill_value(self.missing)
         return thetae
@@ -414,6 +409,42 @@ class ConvectiveProfile(BasicProfile):
     This class inherits from the Profile object.
 
     '''
+
+    ## The attributes set by each analysis group and the groups that have
+    ## to be computed before it. The order of the list is the order the
+    ## groups are computed in when the profile isn't lazy.
+    _analysis_groups = [
+        ('get_fire', (), ('fosberg', 'ppbl_top', 'sfc_rh', 'rh01km', 'pblrh', 'meanwind01km',
+            'meanwindpbl', 'pblmaxwind', 'bplus_fire')),
+        ('get_precip', (), ('dgz_pbot', 'dgz_ptop', 'dgz_meanrh', 'dgz_pw', 'dgz_meanq',
+            'dgz_meanomeg', 'oprh', 'plevel', 'phase', 'tmp', 'st', 'tpos', 'tneg', 'ttop', 'tbot',
+            'wpos', 'wneg', 'wtop', 'wbot', 'precip_type')),
+        ('get_parcels', (), ('mupcl', 'sfcpcl', 'fcstpcl', 'mlpcl', 'usrpcl', 'ebottom', 'etop',
+            'ebotm', 'etopm', 'effpcl')),
+        ('get_thermo', (), ('k_idx', 'pwat', 'lapserate_3km', 'lapserate_3_6km', 'lapserate_850_500',
+            'lapserate_700_500', 'convT', 'maxT', 'mean_mixr', 'low_rh', 'mid_rh', 'totals_totals',
+            'inf_temp_adv')),
+        ('get_kinematics', ('get_parcels',), ('wind1km', 'wind6km', 'sfc_1km_shear', 'sfc_3km_shear',
+            'sfc_6km_shear', 'sfc_8km_shear', 'sfc_9km_shear', 'lcl_el_shear', 'mean_1km', 'mean_3km',
+            'mean_6km', 'mean_8km', 'mean_lcl_el', 'srwind', 'eff_shear', 'ebwd', 'ebwspd', 'mean_eff',
+            'mean_ebw', 'srw_eff', 'srw_ebw', 'right_esrh', 'left_esrh', 'critical_angle', 'srw_1km',
+            'srw_3km', 'srw_6km', 'srw_8km', 'srw_4_5km', 'srw_lcl_el', 'srw_0_2km', 'srw_4_6km',
+            'srw_9_11km', 'upshear_downshear', 'srh1km', 'srh3km')),
+        ('get_severe', ('get_parcels', 'get_kinematics'), ('stp_fixed', 'stp_cin', 'right_scp',
+            'left_scp')),
+        ('get_sars', ('get_parcels', 'get_kinematics'), ('ship', 'hail_database', 'supercell_database',
+            'matches', 'supercell_matches')),
+        ('get_PWV_loc', ('get_thermo',), ('pwv_flag',)),
+        ('get_traj', ('get_parcels', 'get_kinematics'), ('slinky_traj', 'updraft_tilt')),
+        ('get_indices', ('get_parcels', 'get_thermo', 'get_kinematics'), ('tei', 'esp', 'mmp', 'wndg',
+            'sig_severe', 'dcape', 'dpcl_ttrace', 'dpcl_ptrace', 'drush', 'mburst',
+            'index_timings')),
+        ('get_watch', ('get_precip', 'get_parcels', 'get_thermo', 'get_kinematics', 'get_severe',
+            'get_sars', 'get_PWV_loc', 'get_indices'), ('watch_type', 'watch_type_color')),
+    ]
+    _group_deps = dict( (group, deps) for group, deps, attrs in _analysis_groups )
+    _attr_groups = dict( (attr, group) for group, deps, attrs in _analysis_groups for attr in attrs )
+
     def __init__(self, **kwargs):
         '''
         Create the sounding data object
@@ -458,14 +489,26 @@ class ConvectiveProfile(BasicProfile):
 
         omeg : array_like
         List of the vertical velocity in pressure coordinates with height (Pascals/second)
+
+        lazy : boolean (default: False)
+        If True, none of the indices are computed up front. Each group of
+        attributes (parcels, kinematics, etc.) is computed the first time
+        one of its attributes is read, after the groups it depends on.
             
         Returns
         -------
         A profile object
         '''
+        self._computed = set()
+        self._computing = set()
+        self.lazy = kwargs.get('lazy', False)
+
         ## call the constructor for Profile
         super(ConvectiveProfile, self).__init__(**kwargs)
 
+        if self.lazy:
+            return
+
         # Generate the fire weather paramters
         self.get_fire()
 
@@ -499,6 +542,41 @@ class ConvectiveProfile(BasicProfile):
         ## get the possible watch type
         self.get_watch()
 
+    def __getattr__(self, name):
+        '''
+        Computes the analysis group that sets the attribute the first time
+        it's read on a lazy profile. This is only called when the regular
+        attribute lookup fails.
+        '''
+        group = ConvectiveProfile._attr_groups.get(name, None)
+        if group is None or not self.__dict__.get('lazy', False) or group in self.__dict__['_computing']:
+            ## Unknown attribute, or one whose group is being computed right
+            ## now (the params routines fall back to computing it themselves).
+            raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+        self._compute(group)
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+    def _compute(self, group):
+        '''
+        Computes an analysis group (e.g. 'get_kinematics') and the groups it
+        depends on, unless they've been computed already.
+        '''
+        if group in self._computed or group in self._computing:
+            return
+
+        self._computing.add(group)
+        try:
+            for dep in ConvectiveProfile._group_deps[group]:
+                self._compute(dep)
+            getattr(self, group)()
+        finally:
+            self._computing.discard(group)
+        self._computed.add(group)
+
     def get_fire(self):
         '''
         Function to generate different indices and information
@@ -652,19 +730,27 @@ class ConvectiveProfile(BasicProfile):
         ## 1km and 6km winds
         self.wind1km = interp.vec(self, p1km)
         self.wind6km = interp.vec(self, p6km)
-        ## calcluate wind shear
-        self.sfc_1km_shear = winds.wind_shear(self, pbot=sfc, ptop=p1km)
-        self.sfc_3km_shear = winds.wind_shear(self, pbot=sfc, ptop=p3km)
-        self.sfc_6km_shear = winds.wind_shear(self, pbot=sfc, ptop=p6km)
-        self.sfc_8km_shear = winds.wind_shear(self, pbot=sfc, ptop=p8km)
-        self.sfc_9km_shear = winds.wind_shear(self, pbot=sfc, ptop=p9km)
+        ## calcluate wind shear (interpolate all of the layer bounds at once)
+        ubnd, vbnd = interp.components(self, np.array([sfc, p1km, p3km, p6km, p8km, p9km]))
+        self.sfc_1km_shear = ubnd[1] - ubnd[0], vbnd[1] - vbnd[0]
+        self.sfc_3km_shear = ubnd[2] - ubnd[0], vbnd[2] - vbnd[0]
+        self.sfc_6km_shear = ubnd[3] - ubnd[0], vbnd[3] - vbnd[0]
+        self.sfc_8km_shear = ubnd[4] - ubnd[0], vbnd[4] - vbnd[0]
+        self.sfc_9km_shear = ubnd[5] - ubnd[0], vbnd[5] - vbnd[0]
         self.lcl_el_shear = winds.wind_shear(self, pbot=self.mupcl.lclpres, ptop=self.mupcl.elpres)
-        ## calculate mean wind
-        self.mean_1km = utils.comp2vec(*winds.mean_wind(self, pbot=sfc, ptop=p1km))
-        self.mean_3km = utils.comp2vec(*winds.mean_wind(self, pbot=sfc, ptop=p3km))
-        self.mean_6km = utils.comp2vec(*winds.mean_wind(self, pbot=sfc, ptop=p6km))
-        self.mean_8km = utils.comp2vec(*winds.mean_wind(self, pbot=sfc, ptop=p8km))
-        self.mean_lcl_el = utils.comp2vec(*winds.mean_wind(self, pbot=self.mupcl.lclpres, ptop=self.mupcl.elpres))
+        ## calculate mean wind (constant time per layer from the prefix sums
+        ## of the 1 hPa grid, see winds.mean_wind); the storm-relative means
+        ## below only shift these by the storm motion.
+        mean_1km = winds.mean_wind(self, pbot=sfc, ptop=p1km)
+        mean_3km = winds.mean_wind(self, pbot=sfc, ptop=p3km)
+        mean_6km = winds.mean_wind(self, pbot=sfc, ptop=p6km)
+        mean_8km = winds.mean_wind(self, pbot=sfc, ptop=p8km)
+        mean_lcl_el = winds.mean_wind(self, pbot=self.mupcl.lclpres, ptop=self.mupcl.elpres)
+        self.mean_1km = utils.comp2vec(*mean_1km)
+        self.mean_3km = utils.comp2vec(*mean_3km)
+        self.mean_6km = utils.comp2vec(*mean_6km)
+        self.mean_8km = utils.comp2vec(*mean_8km)
+        self.mean_lcl_el = utils.comp2vec(*mean_lcl_el)
         ## parameters that depend on the presence of an effective inflow layer
         if self.etop is ma.masked or self.ebottom is ma.masked:
             self.etopm = ma.masked; self.ebotm = ma.masked
@@ -691,18 +777,19 @@ class ConvectiveProfile(BasicProfile):
             self.ebwd = winds.wind_shear(self, pbot=self.ebottom, ptop=elh)
             self.ebwspd = utils.mag( self.ebwd[0], self.ebwd[1] )
             ## calculate the mean sr wind
-            self.srw_eff = winds.sr_wind(self, pbot=self.ebottom, ptop=self.etop, stu=self.srwind[0], stv=self.srwind[1] )
-            self.srw_ebw = winds.sr_wind(self, pbot=self.ebottom, ptop=elh, stu=self.srwind[0], stv=self.srwind[1] )
+            self.srw_eff = self.mean_eff[0] - self.srwind[0], self.mean_eff[1] - self.srwind[1]
+            self.srw_ebw = self.mean_ebw[0] - self.srwind[0], self.mean_ebw[1] - self.srwind[1]
             self.right_esrh = winds.helicity(self, self.ebotm, self.etopm, stu=self.srwind[0], stv=self.srwind[1])
             self.left_esrh = winds.helicity(self, self.ebotm, self.etopm, stu=self.srwind[2], stv=self.srwind[3])
             self.critical_angle = winds.critical_angle(self, stu=self.srwind[0], stv=self.srwind[1])
         ## calculate mean srw
-        self.srw_1km = utils.comp2vec(*winds.sr_wind(self, pbot=sfc, ptop=p1km, stu=self.srwind[0], stv=self.srwind[1] ))
-        self.srw_3km = utils.comp2vec(*winds.sr_wind(self, pbot=sfc, ptop=p3km, stu=self.srwind[0], stv=self.srwind[1] ))
-        self.srw_6km = utils.comp2vec(*winds.sr_wind(self, pbot=sfc, ptop=p6km, stu=self.srwind[0], stv=self.srwind[1] ))
-        self.srw_8km = utils.comp2vec(*winds.sr_wind(self, pbot=sfc, ptop=p8km, stu=self.srwind[0], stv=self.srwind[1] ))
-        self.srw_4_5km = utils.comp2vec(*winds.sr_wind(self, pbot=p4km, ptop=p5km, stu=self.srwind[0], stv=self.srwind[1] ))
-        self.srw_lcl_el = utils.comp2vec(*winds.sr_wind(self, pbot=self.mupcl.lclpres, ptop=self.mupcl.elpres, stu=self.srwind[0], stv=self.srwind[1] ))
+        stu, stv = self.srwind[0], self.srwind[1]
+        self.srw_1km = utils.comp2vec(mean_1km[0] - stu, mean_1km[1] - stv)
+        self.srw_3km = utils.comp2vec(mean_3km[0] - stu, mean_3km[1] - stv)
+        self.srw_6km = utils.comp2vec(mean_6km[0] - stu, mean_6km[1] - stv)
+        self.srw_8km = utils.comp2vec(mean_8km[0] - stu, mean_8km[1] - stv)
+        self.srw_4_5km = utils.comp2vec(*winds.sr_wind(self, pbot=p4km, ptop=p5km, stu=stu, stv=stv ))
+        self.srw_lcl_el = utils.comp2vec(mean_lcl_el[0] - stu, mean_lcl_el[1] - stv)
         # This is for the red, blue, and purple bars that appear on the SR Winds vs. Height plot
         self.srw_0_2km = winds.sr_wind(self, pbot=sfc, ptop=interp.pres(self, interp.to_msl(self, 2000.)), stu=self.srwind[0], stv=self.srwind[1])
         self.srw_4_6km = winds.sr_wind(self, pbot=interp.pres(self, interp.to_msl(self, 4000.)), ptop=p6km, stu=self.srwind[0], stv=self.srwind[1])
@@ -928,11 +1015,15 @@ class ConvectiveProfile(BasicProfile):
         -------
         None
         '''
-        self.tei = params.tei(self)
-        self.esp = params.esp(self)
+        ## The composites go through the parameter graph, so each of their
+        ## inputs is taken from the profile or computed once
+        engine = param_graph.Engine(self)
+        self.tei = engine.get('tei')
+        self.esp = engine.get('esp')
         self.mmp = params.mmp(self)
         self.wndg = params.wndg(self)
         self.sig_severe = params.sig_severe(self)
-        self.dcape, self.dpcl_ttrace, self.dpcl_ptrace = params.dcape(self)
+        self.dcape, self.dpcl_ttrace, self.dpcl_ptrace = engine.get('dcape_trace')
         self.drush = thermo.ctof(self.dpcl_ttrace[-1])
-        self.mburst = params.mburst(self)
+        self.mburst = engine.get('mburst')
+        self.index_timings = engine.timings
@@ -0,0 +1,218 @@
+''' Shared 1 hPa Resampling of Profiles '''
+from __future__ import division
+import numpy as np
+import numpy.ma as ma
+from sharppy.sharptab import interp, utils
+
+__all__ = ['get_grid', 'layer', 'get_sums', 'layer_mean', 'layer_means']
+
+
+def get_grid(prof):
+    '''
+    Returns the profile resampled every 1 hPa (on whole hPa values) from
+    the surface to the top of the sounding. The grid is built the first
+    time it's asked for and kept on the profile, so the layer routines
+    in params and winds all slice the same arrays instead of
+    interpolating the profile again for every layer.
+
+    Parameters
+    ----------
+    prof : profile object
+        Profile object
+
+    Returns
+    -------
+    grid : dictionary or None
+        The pres, hght, tmpc, dwpc, u, v, omeg and thetae arrays of the
+        grid (pressure decreasing with index), or None if the profile
+        can't be interpolated (i.e. isn't a BasicProfile).
+
+    '''
+    grid = prof.__dict__.get('_grid', None)
+    if grid is not None or 'logp' not in prof.__dict__:
+        return grid
+
+    pbot = np.floor(prof.pres[prof.sfc])
+    ptop = np.ceil(prof.pres[prof.top])
+    p = np.arange(pbot, ptop - 1, -1, dtype=np.float64)
+
+    grid = {'pres':p}
+    grid['hght'] = interp.hght(prof, p)
+    grid['tmpc'] = interp.temp(prof, p)
+    grid['dwpc'] = interp.dwpt(prof, p)
+    grid['u'], grid['v'] = interp.components(prof, p)
+    ## Observed soundings carry no omega (all masked), and interp.omeg
+    ## gives a single masked value rather than an array for them
+    omeg = prof.__dict__.get('omeg', None)
+    if omeg is not None and ma.count(omeg) > 0:
+        grid['omeg'] = interp.omeg(prof, p)
+    else:
+        grid['omeg'] = ma.masked_all(p.shape)
+    grid['thetae'] = interp.thetae(prof, p)
+    prof._grid = grid
+    return grid
+
+def _bounds(prof, pbot, ptop):
+    '''
+    Returns the grid and the [idx1, idx2) index range of the grid levels
+    within a layer, or None if there's no grid or the layer holds less
+    than two grid levels.
+
+    '''
+    if not utils.QC(pbot) or not utils.QC(ptop):
+        return None
+    grid = get_grid(prof)
+    if grid is None:
+        return None
+
+    ## The grid pressures decrease with index, so search on -pres
+    neg_p = -grid['pres']
+    idx1 = np.searchsorted(neg_p, -pbot, side='left')
+    idx2 = np.searchsorted(neg_p, -ptop, side='right')
+    if idx2 - idx1 < 2:
+        return None
+    return grid, idx1, idx2
+
+def layer(prof, pbot, ptop):
+    '''
+    Returns the levels of the 1 hPa grid (see get_grid) that fall within
+    a layer.
+
+    Parameters
+    ----------
+    prof : profile object
+        Profile object
+    pbot : number
+        Pressure of the bottom of the layer (hPa)
+    ptop : number
+        Pressure of the top of the layer (hPa)
+
+    Returns
+    -------
+    grid : dictionary or None
+        Slices of the grid arrays from pbot to ptop, or None if there's no
+        grid or the layer holds less than two grid levels (the caller
+        should then interpolate the profile itself).
+
+    '''
+    bounds = _bounds(prof, pbot, ptop)
+    if bounds is None:
+        return None
+    grid, idx1, idx2 = bounds
+    return dict( (key, val[idx1:idx2]) for key, val in grid.iteritems() )
+
+def get_sums(prof, field):
+    '''
+    Returns the running (prefix) sums of the pressure weights and of the
+    pressure-weighted values of a grid field. Masked levels get no weight.
+    The sums are built once per field and kept on the profile.
+
+    Parameters
+    ----------
+    prof : profile object
+        Profile object
+    field : string
+        Name of the grid field (e.g. 'u')
+
+    Returns
+    -------
+    cum_p : array
+        cum_p[i] is the sum of the weights of grid levels 0 to i-1
+    cum_fp : array
+        cum_fp[i] is the sum of the weighted values of grid levels 0 to i-1
+
+    '''
+    sums = prof.__dict__.get('_grid_sums', None)
+    if sums is None:
+        sums = prof._grid_sums = {}
+    if field not in sums:
+        grid = get_grid(prof)
+        p = grid['pres']
+        val = grid[field]
+        valid = ~ma.getmaskarray(val)
+        wgt = np.where(valid, p, 0.)
+        wval = np.where(valid, ma.getdata(val) * p, 0.)
+        sums[field] = (np.concatenate(([0.], np.cumsum(wgt))), np.concatenate(([0.], np.cumsum(wval))))
+    return sums[field]
+
+def layer_mean(prof, pbot, ptop, field):
+    '''
+    Returns the pressure-weighted mean of a grid field through a layer
+    from the prefix sums (see get_sums), i.e. in constant time for any
+    layer once the sums exist. This is the same as ma.average over the
+    grid levels of the layer with the pressures as weights. When pbot
+    isn't a whole hPa, the levels are shifted from the ones interpolating
+    every 1 hPa up from pbot would give, and the means differ by less
+    than the change of the field over 1 hPa in the layer.
+
+    Parameters
+    ----------
+    prof : profile object
+        Profile object
+    pbot : number
+        Pressure of the bottom of the layer (hPa)
+    ptop : number
+        Pressure of the top of the layer (hPa)
+    field : string
+        Name of the grid field (e.g. 'u')
+
+    Returns
+    -------
+    mean : number or None
+        The layer mean (masked if every level of the layer is masked), or
+        None if there's no grid or the layer holds less than two grid
+        levels.
+
+    '''
+    bounds = _bounds(prof, pbot, ptop)
+    if bounds is None:
+        return None
+    grid, idx1, idx2 = bounds
+    cum_p, cum_fp = get_sums(prof, field)
+    wsum = cum_p[idx2] - cum_p[idx1]
+    if wsum <= 0:
+        return ma.masked
+    return (cum_fp[idx2] - cum_fp[idx1]) / wsum
+
+def layer_means(prof, pbot, ptop, field):
+    '''
+    Same as layer_mean, but for many layers at once (e.g. a window sliding
+    up the profile). All of the layers are looked up on the grid and
+    differenced from the prefix sums in single array operations.
+
+    Parameters
+    ----------
+    prof : profile object
+        Profile object
+    pbot : array
+        Pressures of the bottoms of the layers (hPa)
+    ptop : array
+        Pressures of the tops of the layers (hPa)
+    field : string
+        Name of the grid field (e.g. 'thetae')
+
+    Returns
+    -------
+    means : masked array or None
+        The layer means, masked for layers with masked bounds, with less
+        than two grid levels or with every level masked, or None if there's
+        no grid.
+
+    '''
+    grid = get_grid(prof)
+    if grid is None:
+        return None
+    pbot = ma.asarray(pbot, dtype=np.float64)
+    ptop = ma.asarray(ptop, dtype=np.float64)
+    bad = ma.getmaskarray(pbot) | ma.getmaskarray(ptop)
+    pbot, ptop = ma.getdata(pbot), ma.getdata(ptop)
+    bad |= np.isnan(pbot) | np.isnan(ptop)
+
+    neg_p = -grid['pres']
+    idx1 = np.searchsorted(neg_p, -pbot, side='left')
+    idx2 = np.searchsorted(neg_p, -ptop, side='right')
+    cum_p, cum_fp = get_sums(prof, field)
+    wsum = cum_p[idx2] - cum_p[idx1]
+    bad |= (idx2 - idx1 < 2) | (wsum <= 0)
+    wsum[bad] = 1.
+    return ma.masked_array((cum_fp[idx2] - cum_fp[idx1]) / wsum, mask=bad)
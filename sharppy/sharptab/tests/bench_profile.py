@@ -0,0 +1,46 @@
+'''
+Times building a ConvectiveProfile with the array_thermo wetbulb, theta
+and theta-e profiles against the per-level loops they replaced, on a
+synthetic profile. Run as
+
+    python -m sharppy.sharptab.tests.bench_profile [levels] [repeats]
+'''
+import sys
+import timeit
+import numpy as np
+import sharppy.sharptab.profile as profile
+from sharppy.sharptab.tests.test_array_thermo import _loop_wetbulb, _loop_theta, _loop_thetae
+
+def _kwargs(nlev):
+    pres = np.linspace(1000., 100., nlev)
+    hght = np.cumsum(np.concatenate(([110.], -np.diff(np.log(pres)) * 8000.)))
+    tmpc = np.maximum(28. - 0.0065 * hght, -70.)
+    dwpc = tmpc - np.linspace(2., 30., nlev)
+    wdir = np.linspace(160., 270., nlev)
+    wspd = np.linspace(10., 70., nlev)
+    return dict(profile='convective', pres=pres, hght=hght, tmpc=tmpc, dwpc=dwpc, wdir=wdir, wspd=wspd)
+
+def _time(kwargs, repeats):
+    return min(timeit.repeat(lambda: profile.create_profile(**kwargs), number=1, repeat=repeats))
+
+def main():
+    nlev = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    kwargs = _kwargs(nlev)
+
+    t_new = _time(kwargs, repeats)
+
+    Basic = profile.BasicProfile
+    methods = (Basic.get_wetbulb_profile, Basic.get_theta_profile, Basic.get_thetae_profile)
+    Basic.get_wetbulb_profile = _loop_wetbulb
+    Basic.get_theta_profile = _loop_theta
+    Basic.get_thetae_profile = _loop_thetae
+    try:
+        t_old = _time(kwargs, repeats)
+    finally:
+        Basic.get_wetbulb_profile, Basic.get_theta_profile, Basic.get_thetae_profile = methods
+
+    print "%d levels: per-level loops %.1f ms, array_thermo %.1f ms (%.1fx)" % (nlev, t_old * 1e3, t_new * 1e3, t_old / t_new)
+
+if __name__ == '__main__':
+    main()
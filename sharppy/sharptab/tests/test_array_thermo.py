@@ -0,0 +1,75 @@
+import os
+import numpy as np
+import numpy.ma as ma
+import sharppy.sharptab.profile as profile
+from sharppy.sharptab import array_thermo, thermo
+
+pres = np.array([1000., 925., 850., 700., 500., 400., 300., 250., 200., 150., 100.])
+hght = np.array([110., 780., 1490., 3080., 5720., 7330., 9280., 10450., 11860., 13640., 16200.])
+tmpc = np.array([28., 22., 17., 8., -8., -18., -33., -42., -53., -60., -66.])
+dwpc = np.array([20., 17., 11., -1., -22., -32., -45., -53., -62., -9999., -9999.])
+wdir = np.array([160., 180., 200., 230., 250., 255., 260., 260., 265., 270., 270.])
+wspd = np.array([10., 20., 25., 30., 40., 50., 60., 65., 70., 60., 40.])
+
+## The per-level loops BasicProfile used before array_thermo
+def _loop_wetbulb(prof):
+    wetbulb = ma.empty(prof.pres.shape[0])
+    for i in range(len(prof.v)):
+        wetbulb[i] = thermo.wetbulb( prof.pres[i], prof.tmpc[i], prof.dwpc[i] )
+    wetbulb[wetbulb == prof.missing] = ma.masked
+    wetbulb.set_fill_value(prof.missing)
+    return wetbulb
+
+def _loop_theta(prof):
+    theta = ma.empty(prof.pres.shape[0])
+    for i in range(len(prof.v)):
+        theta[i] = thermo.theta(prof.pres[i], prof.tmpc[i])
+    theta[theta == prof.missing] = ma.masked
+    theta.set_fill_value(prof.missing)
+    theta = thermo.ctok(theta)
+    return theta
+
+def _loop_thetae(prof):
+    thetae = ma.empty(prof.pres.shape[0])
+    for i in range(len(prof.v)):
+        thetae[i] = thermo.ctok( thermo.thetae(prof.pres[i], prof.tmpc[i], prof.dwpc[i]) )
+    thetae[thetae == prof.missing] = ma.masked
+    thetae.set_fill_value(prof.missing)
+    return thetae
+
+
+def test_table_error():
+    assert array_thermo.table_error() < 0.1
+
+def test_wetlift_table():
+    p = np.array([1000., 850., 700., 500., 300.])
+    t = np.array([25., 18., 10., -5., -30.])
+    exact = array_thermo.wetlift(p, t, p - 100., table=False)
+    approx = array_thermo.wetlift(p, t, p - 100., table=True)
+    np.testing.assert_allclose(approx, exact, atol=0.1)
+    for i in range(len(p)):
+        np.testing.assert_allclose(exact[i], thermo.wetlift(p[i], t[i], p[i] - 100.), atol=1e-6)
+
+def test_bad_table_file(tmpdir, monkeypatch):
+    ## A partly written (or otherwise broken) table file is rebuilt
+    table_file = str(tmpdir.join("moist_adiabats.npz"))
+    with open(table_file, 'wb') as f:
+        f.write("PK\x03\x04 not a whole zip file")
+    monkeypatch.setattr(array_thermo, 'TABLE_FILE', table_file)
+    monkeypatch.setattr(array_thermo, '_table', None)
+
+    table = array_thermo._get_table()
+    assert table.shape == (len(array_thermo.TABLE_LOGP), len(array_thermo.TABLE_THETAM))
+    assert os.listdir(str(tmpdir)) == [ "moist_adiabats.npz" ]
+
+    monkeypatch.setattr(array_thermo, '_table', None)
+    np.testing.assert_array_equal(array_thermo._get_table(), table)
+
+def test_profiles_match_loops():
+    prof = profile.create_profile(profile='default', pres=pres, hght=hght, tmpc=tmpc,
+        dwpc=dwpc, wdir=wdir, wspd=wspd, missing=-9999.)
+    for new, old in [ (prof.wetbulb, _loop_wetbulb(prof)), (prof.theta, _loop_theta(prof)),
+            (prof.thetae, _loop_thetae(prof)) ]:
+        np.testing.assert_array_equal(ma.getmaskarray(new), ma.getmaskarray(old))
+        np.testing.assert_allclose(new.compressed(), old.compressed(), atol=1e-6)
+        assert new.fill_value == old.fill_value
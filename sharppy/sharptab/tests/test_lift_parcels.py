@@ -0,0 +1,46 @@
+import numpy as np
+import numpy.ma as ma
+import sharppy.sharptab.profile as profile
+from sharppy.sharptab import params, utils
+
+pres = np.array([1000., 925., 850., 700., 500., 400., 300., 250., 200., 150., 100.])
+hght = np.array([110., 780., 1490., 3080., 5720., 7330., 9280., 10450., 11860., 13640., 16200.])
+tmpc = np.array([28., 22., 17., 8., -8., -18., -33., -42., -53., -60., -66.])
+dwpc = np.array([20., 17., 11., -1., -22., -32., -45., -53., -62., -70., -80.])
+wdir = np.array([160., 180., 200., 230., 250., 255., 260., 260., 265., 270., 270.])
+wspd = np.array([10., 20., 25., 30., 40., 50., 60., 65., 70., 60., 40.])
+
+
+def _prof():
+    return profile.create_profile(profile='default', pres=pres, hght=hght, tmpc=tmpc,
+        dwpc=dwpc, wdir=wdir, wspd=wspd)
+
+def test_matches_cape():
+    prof = _prof()
+    ## Parcels at the profile levels and between them, and warmer/moister
+    ## ones (as convective_temp makes)
+    src_p = np.array([1000., 987.5, 925., 880., 850., 700., 612.3, 500.])
+    src_t = np.array([28., 27.1, 22., 19.1, 17., 8., 1.4, -8.])
+    src_d = np.array([20., 19.6, 17., 13.5, 11., -1., -9.8, -22.])
+    src_p = np.concatenate((src_p, [1000., 1000.]))
+    src_t = np.concatenate((src_t, [31., 34.]))
+    src_d = np.concatenate((src_d, [20., 22.]))
+
+    bplus, bminus = params.lift_parcels(prof, src_p, src_t, src_d)
+    for i in range(len(src_p)):
+        pcl = params.cape(prof, pres=src_p[i], tmpc=src_t[i], dwpc=src_d[i])
+        if not utils.QC(pcl.bplus):
+            assert bplus[i] is ma.masked
+            continue
+        np.testing.assert_allclose(bplus[i], pcl.bplus, rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(bminus[i], pcl.bminus, rtol=1e-6, atol=1e-6)
+
+def test_masked_parcels():
+    prof = _prof()
+    ## Parcels with a missing value, and a parcel at the top of the profile
+    ## (no level above it to lift through), come back masked
+    bplus, bminus = params.lift_parcels(prof, ma.masked_array([1000., 850., 100.], mask=[False, True, False]),
+        [28., 17., -66.], [20., 11., -66.])
+    assert bplus[0] is not ma.masked
+    assert bplus[1] is ma.masked and bminus[1] is ma.masked
+    assert bplus[2] is ma.masked and bminus[2] is ma.masked
@@ -0,0 +1,49 @@
+import numpy as np
+import numpy.ma as ma
+import sharppy.sharptab.profile as profile
+from sharppy.sharptab import params, parcel_cache, utils
+
+pres = np.array([1000., 925., 850., 700., 500., 400., 300., 250., 200., 150., 100.])
+hght = np.array([110., 780., 1490., 3080., 5720., 7330., 9280., 10450., 11860., 13640., 16200.])
+tmpc = np.array([28., 22., 17., 8., -8., -18., -33., -42., -53., -60., -66.])
+dwpc = np.array([20., 17., 11., -1., -22., -32., -45., -53., -62., -70., -80.])
+wdir = np.array([160., 180., 200., 230., 250., 255., 260., 260., 265., 270., 270.])
+wspd = np.array([10., 20., 25., 30., 40., 50., 60., 65., 70., 60., 40.])
+
+
+def _prof():
+    return profile.create_profile(profile='default', pres=pres, hght=hght, tmpc=tmpc,
+        dwpc=dwpc, wdir=wdir, wspd=wspd)
+
+def _same(a, b):
+    if not utils.QC(a) or not utils.QC(b):
+        return not utils.QC(a) and not utils.QC(b)
+    return np.isclose(a, b)
+
+def test_flag_in_key():
+    prof = _prof()
+    parcel_cache.getCache().clear()
+
+    ## A surface-based user parcel has the same state as the surface parcel,
+    ## but its bulk Richardson number is taken over a different layer
+    sfc = params.DefineParcel(prof, flag=1)
+    user = params.DefineParcel(prof, flag=5, pres=prof.pres[prof.sfc])
+    assert sfc.pres == user.pres and sfc.tmpc == user.tmpc and sfc.dwpc == user.dwpc
+
+    sfcpcl = params.parcelx(prof, lplvals=sfc)
+    userpcl = params.parcelx(prof, lplvals=user)
+    assert not _same(sfcpcl.brnshear, userpcl.brnshear)
+
+    exact = params._parcelx(prof, lplvals=user)
+    assert _same(userpcl.brnshear, exact.brnshear)
+    assert _same(userpcl.brn, exact.brn)
+
+def test_hit_is_a_copy():
+    prof = _prof()
+    parcel_cache.getCache().clear()
+
+    pcl = params.parcelx(prof, flag=1)
+    pcl.ttrace[0] = -999.
+    again = params.parcelx(prof, flag=1)
+    assert again.ttrace[0] != -999.
+    assert parcel_cache.getCache().stats()['hits'] == 1
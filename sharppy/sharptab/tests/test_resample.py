@@ -0,0 +1,47 @@
+import numpy as np
+import numpy.ma as ma
+import sharppy.sharptab.profile as profile
+from sharppy.sharptab import params, resample
+
+## An observed-style sounding: no omega, as the IAG/Wyoming decoders build them
+pres = np.array([1000., 925., 850., 700., 500., 400., 300., 250., 200., 150., 100.])
+hght = np.array([110., 780., 1490., 3080., 5720., 7330., 9280., 10450., 11860., 13640., 16200.])
+tmpc = np.array([28., 22., 17., 8., -8., -18., -33., -42., -53., -60., -66.])
+dwpc = np.array([20., 17., 11., -1., -22., -32., -45., -53., -62., -70., -80.])
+wdir = np.array([160., 180., 200., 230., 250., 255., 260., 260., 265., 270., 270.])
+wspd = np.array([10., 20., 25., 30., 40., 50., 60., 65., 70., 60., 40.])
+
+
+def _prof(**kwargs):
+    return profile.create_profile(profile='default', pres=pres, hght=hght, tmpc=tmpc,
+        dwpc=dwpc, wdir=wdir, wspd=wspd, **kwargs)
+
+def test_grid_without_omeg():
+    prof = _prof()
+    grid = resample.get_grid(prof)
+    assert grid['omeg'].shape == grid['pres'].shape
+    assert ma.count(grid['omeg']) == 0
+
+    layer = resample.layer(prof, 850., 500.)
+    assert layer['omeg'].shape == layer['pres'].shape
+
+def test_layer_means_without_omeg():
+    prof = _prof()
+    assert params.mean_omega(prof, pbot=850., ptop=500.) == prof.missing
+    assert 0 < params.mean_relh(prof, pbot=850., ptop=500.) < 100
+    np.testing.assert_allclose(params.precip_water(prof), params.precip_water(prof, exact=True), rtol=0.01)
+
+def test_convective_profile_without_omeg():
+    prof = profile.create_profile(profile='convective', pres=pres, hght=hght, tmpc=tmpc,
+        dwpc=dwpc, wdir=wdir, wspd=wspd)
+    assert prof.pwat > 0
+    assert 0 < prof.dgz_meanrh < 100
+
+def test_layer_mean_matches_grid_average():
+    prof = _prof()
+    grid = resample.get_grid(prof)
+    for pbot, ptop in [ (1000., 850.), (987.3, 612.8), (850., 500.), (701.5, 250.2) ]:
+        sel = (grid['pres'] <= pbot) & (grid['pres'] >= ptop)
+        for field in [ 'u', 'v', 'tmpc' ]:
+            exact = ma.average(grid[field][sel], weights=grid['pres'][sel])
+            np.testing.assert_allclose(resample.layer_mean(prof, pbot, ptop, field), exact, rtol=1e-10)
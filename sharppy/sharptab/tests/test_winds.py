@@ -0,0 +1,68 @@
+import numpy as np
+import numpy.ma as ma
+import sharppy.sharptab.profile as profile
+from sharppy.sharptab import interp, resample, winds
+
+pres = np.array([1000., 925., 850., 700., 500., 400., 300., 250., 200., 150., 100.])
+hght = np.array([110., 780., 1490., 3080., 5720., 7330., 9280., 10450., 11860., 13640., 16200.])
+tmpc = np.array([28., 22., 17., 8., -8., -18., -33., -42., -53., -60., -66.])
+dwpc = np.array([20., 17., 11., -1., -22., -32., -45., -53., -62., -70., -80.])
+wdir = np.array([160., 180., 200., 230., 250., 255., 260., 260., 265., 270., 270.])
+## The 700 hPa wind is missing
+wspd = np.array([10., 20., 25., -9999., 40., 50., 60., 65., 70., 60., 40.])
+
+## Layers with fractional bounds, as the effective inflow layer and the
+## parcel levels give them
+LAYERS = [ (1000., 850.), (987.3, 612.8), (850., 500.), (701.5, 250.2), (612.4, 598.9) ]
+
+
+def _prof():
+    return profile.create_profile(profile='default', pres=pres, hght=hght, tmpc=tmpc,
+        dwpc=dwpc, wdir=wdir, wspd=wspd, missing=-9999.)
+
+def _old_mean_wind(prof, pbot, ptop, stu=0, stv=0):
+    '''
+        mean_wind as it was before the 1 hPa grid: interpolate every 1 hPa
+        from pbot and average with the pressures as weights. Also returns
+        the largest change of the wind over 1 hPa in the layer, which
+        bounds the difference from averaging on whole hPa levels instead.
+    '''
+    ps = np.arange(pbot, ptop - 1, -1)
+    u, v = interp.components(prof, ps)
+    tol = max(np.abs(np.diff(u)).max(), np.abs(np.diff(v)).max())
+    return ma.average(u, weights=ps) - stu, ma.average(v, weights=ps) - stv, tol
+
+def test_profile_has_masked_wind():
+    prof = _prof()
+    assert ma.count_masked(prof.u) == 1
+
+def test_mean_wind():
+    prof = _prof()
+    for pbot, ptop in LAYERS:
+        mnu, mnv = winds.mean_wind(prof, pbot=pbot, ptop=ptop)
+        oldu, oldv, tol = _old_mean_wind(prof, pbot, ptop)
+        np.testing.assert_allclose(mnu, oldu, atol=tol)
+        np.testing.assert_allclose(mnv, oldv, atol=tol)
+
+def test_sr_wind():
+    prof = _prof()
+    stu, stv = 7.5, -3.2
+    for pbot, ptop in LAYERS:
+        sru, srv = winds.sr_wind(prof, pbot=pbot, ptop=ptop, stu=stu, stv=stv)
+        oldu, oldv, tol = _old_mean_wind(prof, pbot, ptop, stu=stu, stv=stv)
+        np.testing.assert_allclose(sru, oldu, atol=tol)
+        np.testing.assert_allclose(srv, oldv, atol=tol)
+
+def test_mean_wind_dp():
+    ## Other pressure increments still interpolate the profile
+    prof = _prof()
+    ps = np.arange(850., 500. - 5, -5)
+    u, v = interp.components(prof, ps)
+    mnu, mnv = winds.mean_wind(prof, pbot=850., ptop=500., dp=-5)
+    np.testing.assert_allclose(mnu, ma.average(u, weights=ps))
+    np.testing.assert_allclose(mnv, ma.average(v, weights=ps))
+
+def test_layer_mean_outside_grid():
+    prof = _prof()
+    assert resample.layer_mean(prof, 1000., 999.5, 'u') is None
+    assert resample.layer_mean(prof, ma.masked, 500., 'u') is None
@@ -1,6 +1,7 @@
-from sharppy.sharptab import thermo, utils, interp, params, constants
+from sharppy.sharptab import thermo, utils, interp, params, constants, array_thermo
 import sharppy.sharptab as tab
 import numpy as np
+import numpy.ma as ma
 
 ## Routines implemented in Python by Greg Blumberg - CIMMS and Kelton Halbert (OU SoM)
 ## wblumberg@ou.edu, greg.blumberg@noaa.gov, kelton.halbert@noaa.gov, keltonhalbert@ou.edu
@@ -31,6 +32,94 @@ def wind_chill(prof):
                  0.4275 * (sfc_temp) * (sfc_wspd**0.16)
     return wind_chill
 
+def _layer_table(prof):
+    '''
+        Returns the values at the observed levels that init_phase and the
+        posneg routines work from: the temperature and dewpoint interpolated
+        to the levels, the wet-bulb temperature, the relative humidity and
+        the height AGL. The table is built once and kept on the profile.
+
+        Parameters
+        ----------
+        prof : Profile object
+
+        Returns
+        -------
+        table : dictionary of arrays
+    '''
+    table = prof.__dict__.get('_precip_layers', None)
+    if table is None:
+        tmpc = interp.temp(prof, prof.pres)
+        dwpc = interp.dwpt(prof, prof.pres)
+        table = {'tmpc':tmpc, 'dwpc':dwpc}
+        table['wetbulb'] = array_thermo.wetbulb(prof.pres, tmpc, dwpc, missing=prof.missing)
+        table['relh'] = thermo.relh(prof.pres, prof.tmpc, prof.dwpc)
+        table['hght_agl'] = interp.to_agl(prof, prof.hght)
+        prof._precip_layers = table
+    return table
+
+def _posneg(prof, upper, te_upper, te):
+    '''
+        Integrates the positive and negative areas of a temperature profile
+        (the temperature or the wet-bulb temperature) from the precipitation
+        source down to the surface. The areas are only counted from the top
+        of the first warm layer down, and only if a cold layer is found below
+        it.
+
+        Parameters
+        ----------
+        prof : Profile object
+        upper : the pressure level the precipitation originates from (mb)
+        te_upper : the temperature at upper (C)
+        te : the temperatures at the observed levels (C)
+
+        Returns
+        -------
+        pos, neg, top, bot : see posneg_temperature()
+    '''
+    lptr = prof.get_sfc()
+
+    # Find the level where the pressure is just greater than the upper pressure
+    idxs = np.where(prof.pres > upper)[0]
+    if len(idxs) == 0:
+        uptr = 0
+    else:
+        uptr = idxs[-1]
+
+    # The levels from the top layer down to the surface
+    lvls = np.arange(uptr, lptr-1, -1)
+    if len(lvls) == 0:
+        return 0, 0, 0, 0
+    pres = ma.concatenate(([upper], prof.pres[lvls]))
+    hght = ma.concatenate(([interp.hght(prof, upper)], prof.hght[lvls]))
+    te = ma.concatenate(([te_upper], te[lvls]))
+
+    tdef = (0 - te) / thermo.ctok(te)
+    lyre = 9.8 * (tdef[:-1] + tdef[1:]) / 2.0 * (hght[1:] - hght[:-1])
+
+    # Find the first warm level, then the first cold level below it
+    warm = ma.filled(te[1:] > 0, False)
+    cold = ma.filled(te[1:] < 0, False)
+    if not warm.any():
+        return 0, 0, 0, 0
+    iwarm = np.argmax(warm)
+    cold[:iwarm] = False
+    if not cold.any():
+        return 0, 0, 0, 0
+    icold = np.argmax(cold)
+
+    # Sum the layers from the top of the warm layer down. Any layer that
+    # isn't positive (including missing ones) counts as negative.
+    lyre = lyre[iwarm:]
+    is_pos = ma.filled(lyre > 0, False)
+    pos = ma.getdata(lyre[is_pos]).sum()
+    neg = lyre[~is_pos]
+    if ma.getmaskarray(neg).any():
+        neg = ma.masked
+    else:
+        neg = ma.getdata(neg).sum()
+    return pos, neg, pres[iwarm+1], pres[icold+1]
+
 def init_phase(prof):
     '''
         Inital Precipitation Phase
@@ -71,7 +160,8 @@ def init_phase(prof):
     # use them to determine level where precipitation will develop.
     avail = np.ma.where(prof.omeg < .1)[0]
 
-    hght_agl = interp.to_agl(prof, prof.hght)
+    table = _layer_table(prof)
+    hght_agl = table['hght_agl']
     if len(avail) < 5:
         # No VVELS...must look for saturated level 
         # Find the highest near-saturated 50mb layer below 5km agl
@@ -85,7 +175,7 @@ def init_phase(prof):
                                     (prof.omeg <= 0))[0]
 
     # Compute the RH at the top and bottom of 50 mb layers
-    rh = thermo.relh(prof.pres, prof.tmpc, prof.dwpc)[below_5km_idx]
+    rh = table['relh'][below_5km_idx]
     sats = np.ma.where(rh > 80)[0]
     new_pres = prof.pres[below_5km_idx][sats] + 50.
     new_temp = interp.temp(prof, new_pres)
@@ -155,13 +245,9 @@ def posneg_temperature(prof, start=-1):
     if utils.QC(interp.temp(prof, 500)) == False and utils.QC(interp.temp(prof, 850)) == False:
         return np.masked, np.masked, np.masked, np.masked
 
-    # Find lowest obs in layer
-    lower = prof.pres[prof.get_sfc()]
-    lptr  = prof.get_sfc()
-
     # Find the highest obs in the layer
     if start == -1:
-        lvl, phase, st = init_phase(prof)
+        lvl = init_phase(prof)[0]
         if lvl > 0:
             upper = lvl
         else:
@@ -169,68 +255,7 @@ def posneg_temperature(prof, start=-1):
     else:
         upper = start
 
-    # Find the level where the pressure is just greater than the upper pressure
-    idxs = np.where(prof.pres > upper)[0]
-    if len(idxs) == 0:
-        uptr = 0
-    else:
-        uptr = idxs[-1]
-
-    # Start with the top layer
-    pe1 = upper;
-    h1 =  interp.hght(prof, pe1)
-    te1 = interp.temp(prof, pe1)
-    tp1 = 0
-
-    warmlayer = coldlayer = lyre = totp = totn = tote = ptop = pbot = lyrlast = 0
-
-    for i in np.arange(uptr, lptr-1, -1):
-        pe2 = prof.pres[i]
-        h2 = prof.hght[i]
-        te2 = interp.temp(prof, pe2)
-        tp2 = 0
-        tdef1 = (0 - te1) / thermo.ctok(te1);
-        tdef2 = (0 - te2) / thermo.ctok(te2);
-        lyrlast = lyre;
-        lyre = 9.8 * (tdef1 + tdef2) / 2.0 * (h2 - h1);
-
-        # Has a warm layer been found yet?
-        if te2 > 0:
-            if warmlayer == 0:
-                warmlayer = 1
-                ptop = pe2
-
-        # Has a cold layer been found yet?
-        if te2 < 0:
-            if warmlayer == 1 and coldlayer == 0:
-                coldlayer = 1
-                pbot = pe2
-
-        if warmlayer > 0:
-            if lyre > 0:
-                totp += lyre
-            else:
-                totn += lyre
-            tote += lyre
-
-        pelast = pe1
-        pe1 = pe2
-        h1 = h2
-        te1 = te2
-        tp1 = tp2
-    
-    if warmlayer == 1 and coldlayer == 1:
-        pos = totp
-        neg = totn
-        top = ptop
-        bot = pbot
-    else:
-        neg = 0
-        pos = 0
-        bot = 0
-        top = 0
-
-    return pos, neg, top, bot
+    return _posneg(prof, upper, interp.temp(prof, upper), _layer_table(prof)['tmpc'])
 
 
 def posneg_wetbulb(prof, start=-1):
@@ -266,13 +291,9 @@ def posneg_wetbulb(prof, start=-1):
     if utils.QC(interp.temp(prof, 500)) == False and utils.QC(interp.temp(prof, 850)) == False:
         return np.masked, np.masked, np.masked, np.masked
 
-    # Find lowest obs in layer
-    lower = prof.pres[prof.get_sfc()]
-    lptr  = prof.get_sfc()
-
     # Find the highest obs in the layer
     if start == -1:
-        lvl, phase, st = init_phase(prof)
+        lvl = init_phase(prof)[0]
         if lvl > 0:
             upper = lvl
         else:
@@ -280,68 +301,8 @@ def posneg_wetbulb(prof, start=-1):
     else:
         upper = start
 
-    # Find the level where the pressure is just greater than the upper pressure
-    idxs = np.where(prof.pres > upper)[0]
-    if len(idxs) == 0:
-        uptr = 0
-    else:
-        uptr = idxs[-1]
-
-    # Start with the upper layer
-    pe1 = upper;
-    h1 =  interp.hght(prof, pe1);
-    te1 = thermo.wetbulb(pe1, interp.temp(prof, pe1), interp.dwpt(prof, pe1))
-    tp1 = 0
-
-    warmlayer = coldlayer = lyre = totp = totn = tote = ptop = pbot = lyrlast = 0
-
-    for i in np.arange(uptr, lptr-1, -1):
-        pe2 = prof.pres[i]
-        h2 = prof.hght[i]
-        te2 = thermo.wetbulb(pe2, interp.temp(prof, pe2), interp.dwpt(prof, pe2))
-        tp2 = 0
-        tdef1 = (0 - te1) / thermo.ctok(te1);
-        tdef2 = (0 - te2) / thermo.ctok(te2);
-        lyrlast = lyre;
-        lyre = 9.8 * (tdef1 + tdef2) / 2.0 * (h2 - h1);
-
-        # Has a warm layer been found yet?
-        if te2 > 0:
-            if warmlayer == 0:
-                warmlayer = 1
-                ptop = pe2
-
-        # Has a cold layer been found yet?
-        if te2 < 0:
-            if warmlayer == 1 and coldlayer == 0:
-                coldlayer = 1
-                pbot = pe2
-
-        if warmlayer > 0:
-            if lyre > 0:
-                totp += lyre
-            else:
-                totn += lyre
-            tote += lyre
-
-        pelast = pe1
-        pe1 = pe2
-        h1 = h2
-        te1 = te2
-        tp1 = tp2
-    
-    if warmlayer == 1 and coldlayer == 1:
-        pos = totp
-        neg = totn
-        top = ptop
-        bot = pbot
-    else:
-        neg = 0
-        pos = 0
-        bot = 0
-        top = 0
-
-    return pos, neg, top, bot
+    te_upper = thermo.wetbulb(upper, interp.temp(prof, upper), interp.dwpt(prof, upper))
+    return _posneg(prof, upper, te_upper, _layer_table(prof)['wetbulb'])
 
 def best_guess_precip(prof, init_phase, init_lvl, init_temp, tpos, tneg):
     '''
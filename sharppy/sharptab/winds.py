@@ -2,12 +2,12 @@
 from __future__ import division
 import numpy as np
 import numpy.ma as ma
-from sharppy.sharptab import interp, utils
+from sharppy.sharptab import interp, utils, resample
 from sharppy.sharptab.constants import *
 import warnings
 
 __all__ = ['mean_wind', 'mean_wind_npw', 'mean_wind_old', 'mean_wind_npw_old']
-__all__ += ['sr_wind', 'sr_wind_npw', 'wind_shear', 'helicity', 'max_wind']
+__all__ += ['sr_wind', 'sr_wind_npw', 'wind_shear', 'helicity', 'helicity_coeffs', 'helicity_grid', 'max_wind']
 __all__ += ['non_parcel_bunkers_motion', 'corfidi_mcs_motion', 'mbe_vectors']
 __all__ += ['non_parcel_bunkers_motion_experimental', 'critical_angle']
 
@@ -42,6 +42,12 @@ def mean_wind(prof, pbot=850, ptop=250, dp=-1, stu=0, stv=0):
 
     '''
     if dp > 0: dp = -dp
+    if dp == -1:
+        ## constant time from the prefix sums of the shared 1 hPa grid
+        mnu = resample.layer_mean(prof, pbot, ptop, 'u')
+        if mnu is not None:
+            mnv = resample.layer_mean(prof, pbot, ptop, 'v')
+            return mnu-stu, mnv-stv
     ps = np.arange(pbot, ptop+dp, dp)
     u, v = interp.components(prof, ps)
     # u -= stu; v -= stv
@@ -278,11 +284,13 @@ def non_parcel_bunkers_motion(prof):
     return rstu, rstv, lstu, lstv
 
 
-def helicity(prof, lower, upper, stu=0, stv=0, dp=-1, exact=True):
+def helicity_coeffs(prof, lower, upper, dp=-1, exact=True):
     '''
-    Calculates the relative helicity (m2/s2) of a layer from lower to upper.
-    If storm-motion vector is supplied, storm-relative helicity, both
-    positve and negative, is returned.
+    Calculates the storm-motion independent coefficients of the helicity
+    of each sublayer from lower to upper. The helicity of a sublayer is
+    affine in the storm motion, so once these are known the (storm-relative)
+    helicity for any storm motion is a few multiply-adds. The coefficients
+    are kept on the profile for each layer.
 
     Parameters
     ----------
@@ -292,10 +300,6 @@ def helicity(prof, lower, upper, stu=0, stv=0, dp=-1, exact=True):
         Bottom level of layer (m, AGL)
     upper : number
         Top level of layer (m, AGL)
-    stu : number (optional; default = 0)
-        U-component of storm-motion
-    stv : number (optional; default = 0)
-        V-component of storm-motion
     dp : negative integer (optional; default -1)
         The pressure increment for the interpolated sounding
     exact : bool (optional; default = True)
@@ -304,21 +308,28 @@ def helicity(prof, lower, upper, stu=0, stv=0, dp=-1, exact=True):
 
     Returns
     -------
-    phel+nhel : number
-        Combined Helicity (m2/s2)
-    phel : number
-        Positive Helicity (m2/s2)
-    nhel : number
-        Negative Helicity (m2/s2)
+    a, b, c : arrays or None
+        For a storm motion (su, sv) in m/s, the helicity of sublayer i
+        is a[i] + su * b[i] + sv * c[i] (m2/s2). None if the layer isn't
+        within the profile.
 
     '''
+    cache = None
+    if utils.QC(lower) and utils.QC(upper):
+        key = (float(lower), float(upper), dp, exact)
+        cache = prof.__dict__.get('_srh_coeffs', None)
+        if cache is None:
+            cache = prof._srh_coeffs = {}
+        if key in cache:
+            return cache[key]
+
     if lower != upper:
         lower = interp.to_msl(prof, lower)
         upper = interp.to_msl(prof, upper)
         plower = interp.pres(prof, lower)
         pupper = interp.pres(prof, upper)
         if np.isnan(plower) or np.isnan(pupper):
-            return np.ma.masked, np.ma.masked, np.ma.masked
+            return None
         if exact:
             ind1 = np.where(plower >= prof.pres)[0].min()
             ind2 = np.where(pupper <= prof.pres)[0].max()
@@ -329,14 +340,106 @@ def helicity(prof, lower, upper, stu=0, stv=0, dp=-1, exact=True):
         else:
             ps = np.arange(plower, pupper+dp, dp)
             u, v = interp.components(prof, ps)
-        sru = utils.KTS2MS(u - stu)
-        srv = utils.KTS2MS(v - stv)
-        layers = (sru[1:] * srv[:-1]) - (sru[:-1] * srv[1:])
-        phel = layers[layers > 0].sum()
-        nhel = layers[layers < 0].sum()
+        u = utils.KTS2MS(u)
+        v = utils.KTS2MS(v)
+        ## (u1 - su) * (v0 - sv) - (u0 - su) * (v1 - sv), expanded in su and sv
+        coeffs = (u[1:] * v[:-1]) - (u[:-1] * v[1:]), v[1:] - v[:-1], u[:-1] - u[1:]
     else:
-        phel = nhel = 0
+        coeffs = np.zeros(0), np.zeros(0), np.zeros(0)
+
+    if cache is not None:
+        cache[key] = coeffs
+    return coeffs
+
+
+def helicity(prof, lower, upper, stu=0, stv=0, dp=-1, exact=True):
+    '''
+    Calculates the relative helicity (m2/s2) of a layer from lower to upper.
+    If storm-motion vector is supplied, storm-relative helicity, both
+    positve and negative, is returned.
+
+    Parameters
+    ----------
+    prof : profile object
+        Profile Object
+    lower : number
+        Bottom level of layer (m, AGL)
+    upper : number
+        Top level of layer (m, AGL)
+    stu : number (optional; default = 0)
+        U-component of storm-motion
+    stv : number (optional; default = 0)
+        V-component of storm-motion
+    dp : negative integer (optional; default -1)
+        The pressure increment for the interpolated sounding
+    exact : bool (optional; default = True)
+        Switch to choose between using the exact data (slower) or using
+        interpolated sounding at 'dp' pressure levels (faster)
+
+    Returns
+    -------
+    phel+nhel : number
+        Combined Helicity (m2/s2)
+    phel : number
+        Positive Helicity (m2/s2)
+    nhel : number
+        Negative Helicity (m2/s2)
+
+    '''
+    coeffs = helicity_coeffs(prof, lower, upper, dp=dp, exact=exact)
+    if coeffs is None:
+        return np.ma.masked, np.ma.masked, np.ma.masked
+    a, b, c = coeffs
+    layers = a + utils.KTS2MS(stu) * b + utils.KTS2MS(stv) * c
+    phel = layers[layers > 0].sum()
+    nhel = layers[layers < 0].sum()
+    return phel+nhel, phel, nhel
+
+
+def helicity_grid(prof, lower, upper, stu, stv, dp=-1, exact=True):
+    '''
+    Calculates the storm-relative helicity (m2/s2) of a layer from lower
+    to upper for a whole set of storm motions at once (e.g. every point
+    of a hodograph).
 
+    Parameters
+    ----------
+    prof : profile object
+        Profile Object
+    lower : number
+        Bottom level of layer (m, AGL)
+    upper : number
+        Top level of layer (m, AGL)
+    stu : array
+        U-components of the storm motions
+    stv : array
+        V-components of the storm motions (same shape as stu)
+    dp : negative integer (optional; default -1)
+        The pressure increment for the interpolated sounding
+    exact : bool (optional; default = True)
+        Switch to choose between using the exact data (slower) or using
+        interpolated sounding at 'dp' pressure levels (faster)
+
+    Returns
+    -------
+    phel+nhel : array
+        Combined Helicity (m2/s2) for each storm motion
+    phel : array
+        Positive Helicity (m2/s2) for each storm motion
+    nhel : array
+        Negative Helicity (m2/s2) for each storm motion
+
+    '''
+    stu = utils.KTS2MS(np.asarray(stu, dtype=np.float64))
+    stv = utils.KTS2MS(np.asarray(stv, dtype=np.float64))
+    coeffs = helicity_coeffs(prof, lower, upper, dp=dp, exact=exact)
+    if coeffs is None:
+        masked = ma.masked_all(stu.shape)
+        return masked, masked.copy(), masked.copy()
+    a, b, c = coeffs
+    layers = a + stu[..., np.newaxis] * b + stv[..., np.newaxis] * c
+    phel = np.where(layers > 0, layers, 0.).sum(axis=-1)
+    nhel = np.where(layers < 0, layers, 0.).sum(axis=-1)
     return phel+nhel, phel, nhel
 
 
@@ -20,6 +20,35 @@ from PIL import Image
 import PIL.ImageOps 
 
 
+## Where saveimageauto puts the images and the summary indices when the
+## config doesn't say otherwise
+AUTO_IMG_DIR = "C:\\Sitios web\\pronosticoextendido.net\\api\\datos\\radiosondeos"
+AUTO_SUMMARY_FILE = "C:\\sondeos.txt"
+
+def productName(prof_col):
+    """
+    Returns the name of the products of a profile collection (<station>-<run>).
+    """
+    estacion = prof_col.getMeta('id').lower()
+    salida = prof_col.getMeta('run').strftime("%d%m%Y%Hz")
+    return estacion + "-" + salida
+
+def summaryFields(prof_col):
+    """
+    Returns the summary indices of the highlighted profile of a collection
+    as strings: station, run, watch type, SHIP, SCP, STP (CIN) and MUCAPE.
+    """
+    prof = prof_col.getHighlightedProf()
+    estacion = prof_col.getMeta('id').lower()
+    salida = prof_col.getMeta('run').strftime("%d%m%Y%Hz")
+    vigilancia = prof.watch_type
+    granizo = tab.utils.FLOAT2STR(prof.ship, 1)
+    superceldas = tab.utils.FLOAT2STR(prof.right_scp, 1)
+    tornados = tab.utils.FLOAT2STR(prof.stp_cin, 1)
+    mucape = tab.utils.INT2STR(prof.mupcl.bplus)
+    return [estacion, salida, vigilancia, granizo, superceldas, tornados, mucape]
+
+
 class SPCWidget(QWidget):
     """
     This will create the full SPC window, handle the organization
@@ -203,16 +232,29 @@ class SPCWidget(QWidget):
             pixmap.save(file_name, 'PNG', 100)
             self.config.set('paths', 'save_img', os.path.dirname(file_name))
 
-    def saveimageauto(self):
-        pixmap = QPixmap.grabWidget(self)
-        estacion = self.prof_collections[self.pc_idx].getMeta('id').lower()
-        salida = self.prof_collections[self.pc_idx].getMeta('run').strftime("%d%m%Y%Hz")
-        vigilancia = self.prof_collections[self.pc_idx].getHighlightedProf().watch_type
-        granizo = tab.utils.FLOAT2STR(self.prof_collections[self.pc_idx].getHighlightedProf().ship, 1)
-        superceldas = tab.utils.FLOAT2STR(self.prof_collections[self.pc_idx].getHighlightedProf().right_scp, 1)
-        tornados = tab.utils.FLOAT2STR(self.prof_collections[self.pc_idx].getHighlightedProf().stp_cin, 1)
-        mucape = tab.utils.INT2STR(self.prof_collections[self.pc_idx].getHighlightedProf().mupcl.bplus)
-        pixmap.save("C:\\Sitios web\\pronosticoextendido.net\\api\\datos\\radiosondeos\\" + estacion + "-" + salida + ".png", 'PNG', 10)
+    def renderImage(self):
+        """
+        Renders the widget into an image, whether or not it's on screen.
+        """
+        image = QImage(self.size(), QImage.Format_ARGB32)
+        image.fill(0)
+        self.render(image)
+        return image
+
+    def saveimageauto(self, img_dir=None, summary_file=None):
+        """
+        Saves the image of the profile being shown as <station>-<run>.png
+        and appends its summary indices to the summary file. The locations
+        come from the 'auto_img' and 'auto_summary' options of the 'paths'
+        section of the config when they aren't given.
+        """
+        if img_dir is None:
+            img_dir = self.config.get('paths', 'auto_img') if self.config.has_option('paths', 'auto_img') else AUTO_IMG_DIR
+        if summary_file is None:
+            summary_file = self.config.get('paths', 'auto_summary') if self.config.has_option('paths', 'auto_summary') else AUTO_SUMMARY_FILE
+
+        prof_col = self.prof_collections[self.pc_idx]
+        self.renderImage().save(os.path.join(img_dir, productName(prof_col) + ".png"), 'PNG', 10)
         #pixmap.save(ruta, 'PNG', 10)
         #image = Image.open(ruta)
         #r,g,b,a = image.split()
@@ -221,8 +263,8 @@ class SPCWidget(QWidget):
         #r2,g2,b2 = inverted_image.split()
         #final_transparent_image = Image.merge('RGBA', (r2,g2,b2,a))		
         #final_transparent_image.save(ruta)
-        with open('C:\\sondeos.txt', 'a') as f:
-            f.write(estacion + ',' + salida + ',' + vigilancia + ',' + granizo + ',' + superceldas + ',' + tornados + ',' + mucape + '\n')
+        with open(summary_file, 'a') as f:
+            f.write(','.join(summaryFields(prof_col)) + '\n')
 		
     def savetext(self):
         path = self.config.get('paths', 'save_txt')
@@ -0,0 +1,275 @@
+''' Batch Generation of the Sounding Products Without the GUI '''
+from PySide.QtCore import *
+from PySide.QtGui import *
+from sharppy.viz.SPCWindow import SPCWidget, productName, summaryFields
+from sharppy.io.wyoming_decoder import IAGDecoder
+from ConfigParser import RawConfigParser
+from datetime import datetime
+import os
+import sys
+import time
+
+__all__ = ['BatchProducts', 'main']
+
+DATA_SOURCE = "Observed IAG"
+OUTLET = "IAG"
+SUMMARY_FILE = "sondeos.txt"
+IMG_SIZE = (1180, 800)
+IMG_QUALITY = 10
+
+
+class BatchProducts(object):
+    '''
+        Renders the SPC window products (the image and the summary indices)
+        of many soundings. A single SPC widget is built, kept off screen,
+        and reused for every sounding; each image is rendered straight into
+        an image buffer, so no window is shown and no event loop runs.
+
+        Parameters
+        ----------
+        out_dir : string
+        Directory to write the images and the summary file to
+        config : ConfigParser (optional)
+        The configuration of the SPC widget (insets, parcel types, ...)
+        data_source : string (default: "Observed IAG")
+        Name of the data source to get the soundings from
+        outlet : string (default: "IAG")
+        Name of the outlet of the data source
+
+        Attributes
+        ----------
+        rows : list
+        The summary indices of the soundings rendered so far (one row per
+        product)
+        failures : list
+        The (station, cycle, error) of the jobs that couldn't be rendered
+    '''
+    def __init__(self, out_dir, config=None, data_source=DATA_SOURCE, outlet=OUTLET):
+        ## The data sources live outside of the sharppy package (like the
+        ## GUI scripts that use them)
+        from datasources import data_source as ds
+
+        self._app = QApplication.instance()
+        if self._app is None:
+            self._app = QApplication([ sys.argv[0] ])
+
+        if config is None:
+            config = RawConfigParser()
+        if not config.has_section('paths'):
+            config.add_section('paths')
+
+        self.out_dir = out_dir
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+
+        self._data_source = ds.loadDataSources()[data_source]
+        self._outlet = outlet
+
+        self._widget = SPCWidget(cfg=config)
+        self._widget.setAttribute(Qt.WA_DontShowOnScreen, True)
+        self._widget.resize(*IMG_SIZE)
+        self._widget.show()
+
+        self._shown = None
+        self._serial = 0
+        self._row_idx = {}
+        self.rows = []
+        self.failures = []
+
+    def load(self, stn, cycle):
+        '''
+            Gets the profile collection of a sounding from the data source.
+
+            Parameters
+            ----------
+            stn : string
+            The station id (srcid) of the sounding
+            cycle : datetime
+            The time of the sounding
+
+            Returns
+            -------
+            prof_col : ProfCollection
+        '''
+        point = {'srcid':stn}
+        url = self._data_source.getURL(point, cycle, outlet=self._outlet)
+        decoder = self._data_source.getDecoder(point, cycle, outlet=self._outlet)
+
+        prof_col = decoder(url).getProfiles()
+        return self._setMeta(prof_col, stn, cycle)
+
+    def loadPage(self, url):
+        '''
+            Gets the profile collections of every sounding in a Wyoming
+            TEXT:LIST response holding several stations and/or times, so
+            they all come from a single request.
+
+            Parameters
+            ----------
+            url : string
+            The URL (or file name) of the response
+
+            Returns
+            -------
+            A generator of ProfCollections, decoded one at a time
+        '''
+        for prof_col in IAGDecoder(url, outlet=self._outlet).iterProfiles():
+            yield self._setMeta(prof_col, prof_col.getMeta('loc'), prof_col.getCurrentDate())
+
+    def _setMeta(self, prof_col, stn, cycle):
+        prof_col.setMeta('id', stn)
+        prof_col.setMeta('run', cycle)
+        prof_col.setMeta('model', self._data_source.getName())
+        prof_col.setMeta('observed', self._data_source.isObserved())
+        prof_col.setMeta('auto', False)
+        return prof_col
+
+    def render(self, prof_col):
+        '''
+            Writes the image of a profile collection and keeps its summary
+            indices.
+
+            Returns
+            -------
+            row : list
+            The summary indices (see SPCWindow.summaryFields)
+        '''
+        name = productName(prof_col)
+
+        ## Every collection gets its own id in the widget, so a product
+        ## rendered twice never leaves two collections of the same name
+        self._serial += 1
+        prof_id = "%s #%d" % (name, self._serial)
+
+        ## The widget can't be left without a collection, so the one shown
+        ## before is only dropped once the new one is rendered, and the new
+        ## one is dropped if it can't be
+        rendered = False
+        try:
+            self._widget.addProfileCollection(prof_col, prof_id, focus=True)
+            image = self._widget.renderImage()
+            if not image.save(os.path.join(self.out_dir, name + ".png"), 'PNG', IMG_QUALITY):
+                raise IOError("Unable to write the image of %s" % name)
+            row = summaryFields(prof_col)
+            rendered = True
+        finally:
+            if rendered:
+                self._drop(self._shown)
+                self._shown = prof_id
+            else:
+                self._drop(prof_id)
+
+        ## A product rendered again replaces its summary row
+        if name in self._row_idx:
+            self.rows[self._row_idx[name]] = row
+        else:
+            self._row_idx[name] = len(self.rows)
+            self.rows.append(row)
+        return row
+
+    def _drop(self, prof_id):
+        '''
+            Removes a collection from the widget, if it's there.
+        '''
+        if prof_id not in self._widget.prof_ids:
+            return
+        try:
+            self._widget.rmProfileCollection(prof_id)
+        except IndexError:
+            ## That was the only collection, so there's nothing left to show
+            pass
+
+    def run(self, jobs, pages=[]):
+        '''
+            Renders the products of a list of soundings and writes their
+            summary indices. Jobs that fail (e.g. a missing sounding) are
+            kept in failures and skipped.
+
+            Parameters
+            ----------
+            jobs : list
+            The (station, cycle) of every sounding
+            pages : list (optional)
+            URLs of TEXT:LIST responses with several soundings each, all
+            of which are rendered
+
+            Returns
+            -------
+            rate : number
+            The number of soundings rendered per second
+        '''
+        start = time.time()
+        count = 0
+        for stn, cycle in jobs:
+            try:
+                self.render(self.load(stn, cycle))
+            except Exception as exc:
+                self.failures.append((stn, cycle, str(exc)))
+                continue
+            count += 1
+
+        for url in pages:
+            try:
+                for prof_col in self.loadPage(url):
+                    try:
+                        self.render(prof_col)
+                    except Exception as exc:
+                        self.failures.append((prof_col.getMeta('id'), prof_col.getMeta('run'), str(exc)))
+                        continue
+                    count += 1
+            except Exception as exc:
+                self.failures.append((url, None, str(exc)))
+        elapsed = time.time() - start
+
+        self.writeSummary()
+        if elapsed <= 0:
+            return 0.
+        return count / elapsed
+
+    def writeSummary(self, file_name=SUMMARY_FILE):
+        '''
+            Writes the summary indices of the soundings rendered so far to
+            a file in the output directory, all at once.
+        '''
+        with open(os.path.join(self.out_dir, file_name), 'w') as f:
+            f.write(''.join( ','.join(row) + '\n' for row in self.rows ))
+
+def _parseJob(job):
+    stn, cycle = job.split(',')
+    return stn.strip(), datetime.strptime(cycle.strip(), '%Y%m%d%H')
+
+def main(argv=None):
+    '''
+        Command line entry point. Each argument is a STATION,YYYYMMDDHH job,
+        or @file to read the jobs from a file (one per line). Responses
+        holding several soundings are given with --page.
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(description="Render the SPC window products of many soundings.")
+    parser.add_argument('jobs', nargs='*', help="STATION,YYYYMMDDHH jobs, or @file with one job per line")
+    parser.add_argument('--page', action='append', default=[], help="URL of a TEXT:LIST response with several soundings")
+    parser.add_argument('-o', '--out-dir', default=os.getcwd(), help="Directory to write the products to")
+    parser.add_argument('--data-source', default=DATA_SOURCE, help="Data source of the soundings")
+    parser.add_argument('--outlet', default=OUTLET, help="Outlet of the data source")
+    args = parser.parse_args(argv)
+
+    jobs = []
+    for job in args.jobs:
+        if job.startswith('@'):
+            with open(job[1:]) as f:
+                jobs.extend( _parseJob(line) for line in f if line.strip() )
+        else:
+            jobs.append(_parseJob(job))
+
+    batch = BatchProducts(args.out_dir, data_source=args.data_source, outlet=args.outlet)
+    rate = batch.run(jobs, pages=args.page)
+
+    for stn, cycle, exc in batch.failures:
+        if cycle is None:
+            print "Couldn't render %s: %s" % (stn, exc)
+        else:
+            print "Couldn't render %s %s: %s" % (stn, cycle.strftime('%Y%m%d%H'), exc)
+    print "%d soundings rendered, %d failed (%.2f soundings/s)" % (len(batch.rows), len(batch.failures), rate)
+
+if __name__ == "__main__":
+    main()
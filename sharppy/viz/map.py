@@ -299,6 +299,7 @@ class MapWidget(QtGui.QWidget):
         self.stn_lats = np.array([])
         self.stn_lons = np.array([])
         self.stn_ids = []
+        self.stn_idxs = {}
         self.stn_names = []
 
         self.default_width, self.default_height = self.width(), self.height()
@@ -378,6 +379,7 @@ class MapWidget(QtGui.QWidget):
             self.stn_lats = np.array([ p['lat'] for p in self.points ])
             self.stn_lons = np.array([ p['lon'] for p in self.points ])
             self.stn_ids = [ p['srcid'] for p in self.points ]
+            self.stn_idxs = dict( (stn_id, idx) for idx, stn_id in reversed(list(enumerate(self.stn_ids))) )
             self.stn_names = []
             for p in self.points:
                 if p['icao'] != "":
@@ -409,6 +411,16 @@ class MapWidget(QtGui.QWidget):
         else:
             self.async.post(getPoints, update)
 
+    def getPoint(self, srcid):
+        """
+        Returns the station with a srcid among the ones shown on the map,
+        or None if it isn't shown.
+        """
+        idx = self.stn_idxs.get(srcid, None)
+        if idx is None:
+            return None
+        return self.points[idx]
+
     def setProjection(self, proj):
         self.mapper.setProjection(proj)
         self.resetViewport()
@@ -161,8 +161,10 @@ class backgroundSkewT(QtGui.QWidget):
         pen.setStyle(QtCore.Qt.SolidLine)
         qp.setPen(pen)
         dp = -10
-        for p in xrange(int(self.pmax), int(self.pmin)+dp, dp):
-            t = tab.thermo.wetlift(1000., tw, p)
+        pres = np.arange(int(self.pmax), int(self.pmin)+dp, dp)
+        ## lift the whole adiabat at once
+        tmpc = tab.array_thermo.wetlift(1000., tw, pres)
+        for p, t in zip(pres, tmpc):
             x = self.tmpc_to_pix(t, p)
             y = self.pres_to_pix(p)
             if p == self.pmax: